@@ -0,0 +1,8 @@
+"""
+Throughput and memory benchmarks for the LandXML <-> GDB converters.
+
+synthetic_data.py writes reproducible LandXML files and GDBs of any size, and
+run_benchmarks.py times the converters on them. Run from the repository root:
+
+    python -m benchmarks.run_benchmarks --sizes 10000 100000
+"""
@@ -0,0 +1,292 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import functools
+import platform
+import datetime
+import tempfile
+import subprocess
+import multiprocessing
+import concurrent.futures
+from benchmarks.synthetic_data import write_synthetic_landxml, write_synthetic_gdb
+
+DEFAULT_SIZES = [10000, 100000]
+DEFAULT_OUTPUT_PATH = "benchmark_results.json"
+RESULTS_VERSION = 1
+
+def _discard_status(message):
+    pass
+
+def peak_rss_bytes():
+    """Peak resident set size of the current process in bytes, or None if it cannot be read."""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+        return peak if sys.platform == 'darwin' else peak * 1024
+    try:
+        import psutil # Windows: peak working set
+        return psutil.Process().memory_info().peak_wset
+    except (ImportError, AttributeError):
+        return None
+
+# --- Benchmarks ---
+# Each benchmark has a prepare step, run once per size in this process to write (or reuse)
+# its synthetic input, and a run step that is timed in a fresh worker process. The run step
+# returns the number of points converted and the path of its output.
+
+def _prepare_landxml_to_gdb(inputs_dir, size, seed, status_callback):
+    xml_path = os.path.join(inputs_dir, f"synthetic_{size}_s{seed}.xml")
+    if not os.path.exists(xml_path):
+        status_callback(f"Generating {xml_path}...")
+        write_synthetic_landxml(xml_path, size, seed)
+    return xml_path
+
+def _run_landxml_to_points(input_path, output_dir, status_callback, output_format='gdb'):
+    from transform import create_gdb_from_landxml
+    from output_formats import output_path_for
+    output_path = output_path_for(output_dir, "synthetic", output_format)
+    points = create_gdb_from_landxml(input_path, output_path, layer_name="SurveyPoints",
+                                     status_callback=status_callback, raise_errors=True, output_format=output_format)
+    return points, output_path
+
+def _prepare_gdb_to_landxml(inputs_dir, size, seed, status_callback):
+    # run_conversion takes a directory of GDBs, so each GDB gets a directory of its own.
+    gdb_dir = os.path.join(inputs_dir, f"synthetic_{size}_s{seed}_gdbs")
+    gdb_path = os.path.join(gdb_dir, "synthetic.gdb")
+    if not os.path.exists(gdb_path):
+        status_callback(f"Generating {gdb_path}...")
+        os.makedirs(gdb_dir, exist_ok=True)
+        write_synthetic_gdb(gdb_path, size, seed, status_callback)
+    return gdb_dir
+
+def _run_gdb_to_landxml(input_path, output_dir, status_callback, compression=None):
+    from transform_opposite import run_conversion
+    from progress_events import FILE_FINISHED
+    finished = []
+
+    def keep_finished(event):
+        if event.kind == FILE_FINISHED:
+            finished.append(event.data)
+
+    run_conversion(input_path, output_dir, status_callback=status_callback, force=True, progress_callback=keep_finished,
+                   compression=compression)
+    # The manifest run_conversion keeps in output_dir is not part of the output measured.
+    (gdb_finished,) = finished
+    return gdb_finished['points_written'], gdb_finished['output_path']
+
+BENCHMARKS = {
+    'landxml_to_gdb': (_prepare_landxml_to_gdb, functools.partial(_run_landxml_to_points, output_format='gdb')),
+    'landxml_to_gpkg': (_prepare_landxml_to_gdb, functools.partial(_run_landxml_to_points, output_format='gpkg')),
+    'landxml_to_fgb': (_prepare_landxml_to_gdb, functools.partial(_run_landxml_to_points, output_format='fgb')),
+    'landxml_to_parquet': (_prepare_landxml_to_gdb, functools.partial(_run_landxml_to_points, output_format='parquet')),
+    'gdb_to_landxml': (_prepare_gdb_to_landxml, _run_gdb_to_landxml),
+    'gdb_to_landxml_gzip': (_prepare_gdb_to_landxml, functools.partial(_run_gdb_to_landxml, compression='gzip')),
+    'gdb_to_landxml_zstd': (_prepare_gdb_to_landxml, functools.partial(_run_gdb_to_landxml, compression='zstd')),
+}
+
+def benchmark_available(benchmark_name):
+    """Whether the optional packages a benchmark needs (pyarrow for GeoParquet, zstandard for zstd) are installed."""
+    from output_formats import format_available
+    from compressed_files import compression_available
+    run = BENCHMARKS[benchmark_name][1]
+    if not isinstance(run, functools.partial):
+        return True
+    if 'output_format' in run.keywords:
+        return format_available(run.keywords['output_format'])
+    return compression_available(run.keywords['compression'])
+
+def _measure(benchmark_name, input_path, output_dir, verbose, xml_parser=None):
+    """Runs one benchmark in this (fresh) process and returns its timings and peak memory."""
+    from proj_lib_setup import import_fiona
+    import landxml_parsers
+    landxml_parsers.PARSER_BACKEND = xml_parser
+    status_callback = print if verbose else _discard_status
+    import_start = time.perf_counter()
+    import_fiona(status_callback)
+    import_seconds = time.perf_counter() - import_start
+
+    _, run = BENCHMARKS[benchmark_name]
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    points, output_path = run(input_path, output_dir, status_callback)
+    seconds = time.perf_counter() - start
+    cpu_seconds = time.process_time() - cpu_start
+    return {
+        'points': points,
+        'seconds': seconds,
+        'cpu_seconds': cpu_seconds,
+        'import_seconds': import_seconds,
+        'peak_rss_bytes': peak_rss_bytes(),
+        'output_bytes': _size_bytes(output_path),
+    }
+
+def _size_bytes(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(dir_path, file_name))
+               for dir_path, _, file_names in os.walk(path) for file_name in file_names)
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment_info(xml_parser=None):
+    """Describes the machine and library versions a set of results was measured with."""
+    from proj_lib_setup import import_fiona
+    from landxml_parsers import resolve_parser_backend
+    fiona = import_fiona(_discard_status)
+    try:
+        import lxml.etree
+        lxml_version = lxml.etree.__version__
+    except ImportError:
+        lxml_version = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'fiona': fiona.__version__,
+        'gdal': fiona.__gdal_version__,
+        'lxml': lxml_version,
+        'xml_parser': resolve_parser_backend(xml_parser),
+        'git_commit': _git_commit(),
+    }
+
+def run_benchmarks(benchmark_names, sizes, work_dir, repeat=1, seed=0, status_callback=print, verbose=False, xml_parser=None):
+    """
+    Times each benchmark at each size.
+
+    Every measurement runs in a new process so its peak RSS covers that conversion
+    only. With repeat > 1 the fastest run is reported and every duration is kept.
+
+    Args:
+        benchmark_names (list): Keys of BENCHMARKS to run.
+        sizes (list): Numbers of CgPoints to benchmark with.
+        work_dir (str): Directory for the synthetic inputs (reused when already there)
+                        and the outputs.
+        repeat (int): Number of times each case is run.
+        seed (int): Random seed of the synthetic data.
+        status_callback (function): Function to call for status updates.
+        verbose (bool): Also show the converters' own status messages.
+        xml_parser (str): LandXML parser backend ('lxml' or 'stdlib'); None picks lxml
+                          when it is installed (see landxml_parsers.py).
+
+    Returns:
+        list: One result dict per benchmark and size.
+    """
+    inputs_dir = os.path.join(work_dir, "inputs")
+    os.makedirs(inputs_dir, exist_ok=True)
+    # spawn rather than fork: a forked worker would start with this process's memory.
+    spawn_context = multiprocessing.get_context('spawn')
+    from landxml_parsers import resolve_parser_backend
+    status_callback(f"LandXML parser backend: {resolve_parser_backend(xml_parser)}")
+    results = []
+    for benchmark_name in benchmark_names:
+        if not benchmark_available(benchmark_name):
+            status_callback(f"Skipping {benchmark_name}: its optional packages are not installed.")
+            continue
+        prepare, _ = BENCHMARKS[benchmark_name]
+        for size in sizes:
+            input_path = prepare(inputs_dir, size, seed, status_callback)
+            runs = []
+            for run_index in range(repeat):
+                output_dir = os.path.join(work_dir, "outputs", f"{benchmark_name}_{size}_{run_index}")
+                shutil.rmtree(output_dir, ignore_errors=True)
+                os.makedirs(output_dir)
+                with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=spawn_context) as executor:
+                    runs.append(executor.submit(_measure, benchmark_name, input_path, output_dir, verbose, xml_parser).result())
+                shutil.rmtree(output_dir, ignore_errors=True)
+
+            best = min(runs, key=lambda run: run['seconds'])
+            result = {
+                'benchmark': benchmark_name,
+                'size': size,
+                'points': best['points'],
+                'input_bytes': _size_bytes(input_path),
+                'output_bytes': best['output_bytes'],
+                'seconds': best['seconds'],
+                'cpu_seconds': best['cpu_seconds'],
+                'points_per_second': best['points'] / best['seconds'] if best['seconds'] > 0 else None,
+                'import_seconds': best['import_seconds'],
+                'peak_rss_bytes': max((run['peak_rss_bytes'] or 0) for run in runs) or None,
+                'all_seconds': [run['seconds'] for run in runs],
+            }
+            results.append(result)
+            peak_rss_text = f"{result['peak_rss_bytes'] / 2**20:.0f} MB" if result['peak_rss_bytes'] else "n/a"
+            status_callback(f"{benchmark_name:>19} {size:>10,} pts: {result['seconds']:8.2f} s  "
+                            f"{result['points_per_second'] or 0:12,.0f} pts/s  peak RSS {peak_rss_text}")
+    return results
+
+def compare_results(results, baseline_results, max_slowdown, status_callback=print):
+    """
+    Compares points/sec with an earlier results file for every benchmark and size in both.
+
+    Returns:
+        bool: True if no case got slower than max_slowdown (0.1 = 10 % fewer points/sec).
+    """
+    baseline_by_case = {(result['benchmark'], result['size']): result for result in baseline_results}
+    passed = True
+    for result in results:
+        baseline = baseline_by_case.get((result['benchmark'], result['size']))
+        if not baseline or not baseline.get('points_per_second') or not result['points_per_second']:
+            continue
+        ratio = result['points_per_second'] / baseline['points_per_second']
+        regressed = ratio < 1 - max_slowdown
+        passed = passed and not regressed
+        status_callback(f"{result['benchmark']:>19} {result['size']:>10,} pts: {ratio:6.2f}x baseline points/sec"
+                        f"{'  REGRESSION' if regressed else ''}")
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the LandXML <-> GDB converters on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help=f"Numbers of CgPoints to benchmark with (default: {' '.join(map(str, DEFAULT_SIZES))})")
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS),
+                        help="Benchmarks to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case; the fastest is reported (default: 1)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the synthetic data (default: 0)")
+    parser.add_argument("--work-dir",
+                        help="Directory for synthetic inputs and outputs. Inputs already there are reused (default: a temporary directory)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_PATH, help=f"JSON results file (default: {DEFAULT_OUTPUT_PATH})")
+    parser.add_argument("--baseline", help="Earlier JSON results file to compare points/sec against")
+    parser.add_argument("--max-slowdown", type=float, default=0.1,
+                        help="With --baseline: exit with status 1 if any case is this much slower (default: 0.1 = 10%%)")
+    parser.add_argument("--verbose", action="store_true", help="Show the converters' status messages")
+    parser.add_argument("--xml-parser", choices=["lxml", "stdlib"],
+                        help="LandXML parser backend of the landxml_to_* benchmarks (default: lxml when installed)")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="xml_gdb_benchmark_")
+    try:
+        results = run_benchmarks(args.benchmarks, args.sizes, work_dir, args.repeat, args.seed, verbose=args.verbose,
+                                 xml_parser=args.xml_parser)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'version': RESULTS_VERSION,
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'seed': args.seed,
+        'environment': environment_info(args.xml_parser),
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline_report = json.load(f)
+        if not compare_results(results, baseline_report.get('results', []), args.max_slowdown):
+            sys.exit(1)
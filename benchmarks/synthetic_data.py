@@ -0,0 +1,172 @@
+import os
+import shutil
+import random
+import argparse
+import datetime
+from proj_lib_setup import import_fiona
+from transform_opposite import LandXMLStreamWriter, XML_WRITE_BUFFER_SIZE, write_landxml_preamble
+
+# Synthetic data lies around the centre of the Dutch RD grid (EPSG:28992), which is what
+# write_landxml_preamble declares as the coordinate system.
+CENTRE_EASTING = 155000.0
+CENTRE_NORTHING = 463000.0
+EXTENT = 20000.0
+
+SYNTHETIC_CRS = 'EPSG:28992'
+# Features handed to fiona per writerecords() call.
+GDB_WRITE_BATCH_SIZE = 10000
+
+POINT_CODES = ["BM", "TREE", "FENCE", "KERB", "MH", "LP", "WALL"]
+
+# Share of the requested points written to each GDB layer, and the number of CgPoints
+# every feature of that layer turns into (closing ring vertices are not extracted).
+GDB_LAYERS = [
+    # (layer name, share of points, CgPoints per feature)
+    ('SurveyPoints', 0.5, 1),
+    ('Breaklines', 0.25, 4),
+    ('Parcels', 0.25, 4),
+]
+
+GDB_LAYER_SCHEMAS = {
+    'SurveyPoints': {
+        'geometry': 'Point',
+        'properties': {'name': 'str', 'code': 'str', 'description': 'str', 'pntRef': 'str',
+                       'solutionType': 'str', 'surveyMethod': 'str', 'surveyOrder': 'str', 'class': 'str'},
+    },
+    'Breaklines': {
+        'geometry': '3D LineString',
+        'properties': {'name': 'str', 'code': 'str'},
+    },
+    'Parcels': {
+        'geometry': 'Polygon',
+        'properties': {'name': 'str', 'latitude': 'float'},
+    },
+}
+
+def _random_position(rng):
+    return (CENTRE_EASTING + rng.uniform(-EXTENT, EXTENT),
+            CENTRE_NORTHING + rng.uniform(-EXTENT, EXTENT),
+            rng.uniform(-5.0, 30.0))
+
+def write_synthetic_landxml(xml_path, point_count, seed=0):
+    """
+    Writes a LandXML file with point_count CgPoints, laid out like the files this
+    project reads and writes.
+
+    Args:
+        xml_path (str): Path of the LandXML file to create.
+        point_count (int): Number of CgPoints.
+        seed (int): Random seed; the same seed and size always give the same points.
+
+    Returns:
+        int: Number of CgPoints written.
+    """
+    rng = random.Random(seed)
+    # A fixed date keeps generated files identical between runs.
+    timestamp = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    timestamp_iso = timestamp.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    with open(xml_path, 'w', encoding='utf-8', newline='\n', buffering=XML_WRITE_BUFFER_SIZE) as f:
+        writer = LandXMLStreamWriter(f)
+        write_landxml_preamble(writer, "synthetic", timestamp.strftime("%Y-%m-%d"), timestamp.strftime("%H:%M:%S"), timestamp_iso)
+        for oid in range(1, point_count + 1):
+            easting, northing, elevation = _random_position(rng)
+            writer.write_cgpoint({
+                "name": f"P{oid}", "oID": str(oid), "code": rng.choice(POINT_CODES),
+                "desc": f"Synthetic point {oid}", "role": "surveyed", "timeStamp": timestamp_iso,
+                "pointGeometry": "point", "pntRef": "", "solutionType": "fixed",
+                "surveyMethod": "GNSS", "surveyOrder": "", "class": "default",
+                "latitude": "0.0000000000", "longitude": "0.0000000000", "ellipsoidHeight": f"{elevation:.3f}"
+            }, f"{northing:.3f} {easting:.3f} {elevation:.3f}")
+        writer.close_all()
+    return point_count
+
+def _point_records(rng, feature_count):
+    for index in range(feature_count):
+        easting, northing, _ = _random_position(rng)
+        yield {
+            'geometry': {'type': 'Point', 'coordinates': (easting, northing)},
+            'properties': {
+                'name': f"SP{index}", 'code': rng.choice(POINT_CODES),
+                'description': f"Survey point {index}", 'pntRef': "", 'solutionType': "fixed",
+                'surveyMethod': "GNSS", 'surveyOrder': "1", 'class': "default",
+            },
+        }
+
+def _line_records(rng, feature_count):
+    for index in range(feature_count):
+        easting, northing, elevation = _random_position(rng)
+        coordinates = []
+        for _ in range(4):
+            coordinates.append((easting, northing, elevation))
+            easting += rng.uniform(-25.0, 25.0)
+            northing += rng.uniform(-25.0, 25.0)
+            elevation += rng.uniform(-0.5, 0.5)
+        yield {
+            'geometry': {'type': 'LineString', 'coordinates': coordinates},
+            'properties': {'name': f"BL{index}", 'code': rng.choice(POINT_CODES)},
+        }
+
+def _polygon_records(rng, feature_count):
+    for index in range(feature_count):
+        easting, northing, _ = _random_position(rng)
+        width = rng.uniform(5.0, 50.0)
+        depth = rng.uniform(5.0, 50.0)
+        ring = [(easting, northing), (easting + width, northing), (easting + width, northing + depth),
+                (easting, northing + depth), (easting, northing)]
+        yield {
+            'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+            'properties': {'name': f"Parcel{index}", 'latitude': 52.0 + index * 1e-6},
+        }
+
+_RECORD_GENERATORS = {
+    'SurveyPoints': _point_records,
+    'Breaklines': _line_records,
+    'Parcels': _polygon_records,
+}
+
+def write_synthetic_gdb(gdb_path, point_count, seed=0, status_callback=print):
+    """
+    Writes a File Geodatabase with a Point, a 3D LineString and a Polygon layer that
+    transform_opposite turns into roughly point_count CgPoints.
+
+    Args:
+        gdb_path (str): Path of the .gdb folder to create (replaced if it exists).
+        point_count (int): Number of CgPoints the GDB should produce.
+        seed (int): Random seed; the same seed and size always give the same features.
+        status_callback (function): Function to call for status updates.
+
+    Returns:
+        int: Number of CgPoints the GDB converts into.
+    """
+    fiona = import_fiona(status_callback)
+    if os.path.exists(gdb_path):
+        shutil.rmtree(gdb_path)
+    rng = random.Random(seed)
+    cgpoint_count = 0
+    for layer_name, share, points_per_feature in GDB_LAYERS:
+        feature_count = max(1, round(point_count * share / points_per_feature))
+        with fiona.open(gdb_path, 'w', driver='OpenFileGDB', crs=SYNTHETIC_CRS, layer=layer_name,
+                        schema=GDB_LAYER_SCHEMAS[layer_name]) as layer:
+            records = _RECORD_GENERATORS[layer_name](rng, feature_count)
+            while True:
+                batch = [record for _, record in zip(range(GDB_WRITE_BATCH_SIZE), records)]
+                if not batch:
+                    break
+                layer.writerecords(batch)
+        cgpoint_count += feature_count * points_per_feature
+    return cgpoint_count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic LandXML file or GDB for benchmarking.")
+    parser.add_argument("kind", choices=["landxml", "gdb"], help="Kind of input to generate")
+    parser.add_argument("output_path", help="LandXML file or .gdb folder to create")
+    parser.add_argument("points", type=int, help="Number of CgPoints the input should contain or produce")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    args = parser.parse_args()
+
+    if args.kind == "landxml":
+        written = write_synthetic_landxml(args.output_path, args.points, args.seed)
+    else:
+        written = write_synthetic_gdb(args.output_path, args.points, args.seed)
+    print(f"Wrote {args.output_path} ({written} CgPoints).")
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+
+# Stored in the output directory of a batch run.
+MANIFEST_FILENAME = ".conversion_manifest.json"
+MANIFEST_VERSION = 1
+
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def _iter_input_files(input_path):
+    """Yields (relative_path, absolute_path) for a file, or for every file of a directory (e.g. a .gdb) in sorted order."""
+    if not os.path.isdir(input_path):
+        yield os.path.basename(input_path), input_path
+        return
+    for dir_path, dir_names, file_names in os.walk(input_path):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            absolute_path = os.path.join(dir_path, file_name)
+            yield os.path.relpath(absolute_path, input_path).replace(os.sep, '/'), absolute_path
+
+def input_stat(input_path):
+    """
+    Returns (size, mtime_ns) of an input. For a directory these are the total size and
+    the newest modification time of the files inside it.
+    """
+    total_size = 0
+    newest_mtime_ns = 0
+    for _, absolute_path in _iter_input_files(input_path):
+        stat_result = os.stat(absolute_path)
+        total_size += stat_result.st_size
+        newest_mtime_ns = max(newest_mtime_ns, stat_result.st_mtime_ns)
+    return total_size, newest_mtime_ns
+
+def content_hash(input_path):
+    """SHA-256 of a file's content, or of the names and contents of all files in a directory."""
+    digest = hashlib.sha256()
+    for relative_path, absolute_path in _iter_input_files(input_path):
+        digest.update(relative_path.encode('utf-8') + b'\0')
+        with open(absolute_path, 'rb') as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+class ConversionManifest:
+    """
+    Remembers which inputs a batch run has already converted into an output directory.
+
+    Entries are keyed by output path, so one input converted into several outputs (e.g. a
+    GeoPackage and a FlatGeobuf) has an entry for each. Each entry records the input path,
+    its size, mtime and content hash, and the converter settings. An output is up to date
+    when it still exists, was converted from the same input with the same settings and the
+    input is unchanged: same size and mtime, or the same content hash if only the mtime
+    moved. The hash is only computed in that last case and when recording a conversion.
+    """
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, MANIFEST_FILENAME)
+        self.entries = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.entries = data.get('entries', {})
+        except (OSError, ValueError):
+            pass # Missing or unreadable manifest: everything is converted again.
+        self._dirty = False
+
+    @staticmethod
+    def _key(output_path):
+        return os.path.abspath(output_path)
+
+    def is_up_to_date(self, input_path, output_path, settings):
+        entry = self.entries.get(self._key(output_path))
+        if entry is None or entry.get('settings') != settings or entry.get('input') != os.path.abspath(input_path):
+            return False
+        if not os.path.exists(output_path):
+            return False
+        try:
+            size, mtime_ns = input_stat(input_path)
+        except OSError:
+            return False
+        if size != entry.get('size'):
+            return False
+        if mtime_ns == entry.get('mtime_ns'):
+            return True
+        if content_hash(input_path) != entry.get('sha256'):
+            return False
+        # Touched but not modified: remember the new mtime so the hash is skipped next time.
+        entry['mtime_ns'] = mtime_ns
+        self._dirty = True
+        return True
+
+    def get(self, output_path):
+        return self.entries.get(self._key(output_path))
+
+    def record(self, input_path, output_path, settings, points_written):
+        size, mtime_ns = input_stat(input_path)
+        self.entries[self._key(output_path)] = {
+            'input': os.path.abspath(input_path),
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'sha256': content_hash(input_path),
+            'settings': settings,
+            'output': os.path.abspath(output_path),
+            'points_written': points_written,
+        }
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'entries': self.entries}, f, indent=1, sort_keys=True)
+        os.replace(temporary_path, self.path)
+        self._dirty = False
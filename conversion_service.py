@@ -0,0 +1,588 @@
+import argparse
+import collections
+import concurrent.futures
+import datetime
+import http.server
+import itertools
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+import urllib.parse
+from compressed_files import COMPRESSIONS
+from output_formats import DEFAULT_OUTPUT_FORMAT, OUTPUT_FORMATS
+from process_pool import WarmProcessPool
+from progress_events import FILE_FINISHED, RUN_FINISHED
+from watch_folder import DIRECTIONS, GDB_TO_LANDXML, LANDXML_TO_GDB, load_converter_libraries
+import transform
+import transform_opposite
+
+# --- Conversion service ---
+# A local HTTP service for automation that submits many small jobs. Each command-line run pays
+# for starting Python and importing fiona/GDAL (and finding PROJ) before converting anything;
+# the service's worker processes do that once when it starts and then take job after job.
+# Jobs are JSON documents POSTed to /jobs. They wait in a queue, run in submission order on
+# the next free worker, and their state, result and status messages are returned as JSON.
+#
+#   POST   /jobs             Submit a job; answers 202 with the job (its "id" included).
+#   GET    /jobs             All jobs the service remembers, without their logs.
+#   GET    /jobs/<id>        One job with its log; ?wait=SECONDS waits for it to finish.
+#   DELETE /jobs/<id>        Cancel a job that is still queued.
+#   GET    /status           Workers, queue length and job counts.
+#
+# The service listens on 127.0.0.1 or on a Unix socket, and converts whatever local paths it
+# is given with the rights of the user running it: do not expose it to other machines.
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+# Parameters of each job type: name -> (accepted JSON types, required). Paths may be
+# relative to the service's working directory.
+JOB_PARAMETERS = {
+    LANDXML_TO_GDB: {        # transform.create_gdb_from_landxml
+        'input': (str, True),
+        'output': (str, True),
+        'layer_name': (str, False),
+        'output_format': (str, False),
+        'profile': (bool, False),
+        'cprofile': (bool, False),
+    },
+    GDB_TO_LANDXML: {        # transform_opposite.run_conversion
+        'input_dir': (str, True),
+        'output_dir': (str, True),
+        'force': (bool, False),
+        'layer_workers': (int, False),
+        'compression': (str, False),
+        'vertex_tolerance': ((int, float), False),
+        'max_points_per_file': (int, False),
+        'max_bytes_per_file': (int, False),
+        'bbox': (list, False),
+        'layers': (list, False),
+        'exclude_layers': (list, False),
+        'where': (str, False),
+        'profile': (bool, False),
+        'cprofile': (bool, False),
+    },
+}
+_PATH_PARAMETERS = ('input', 'output', 'input_dir', 'output_dir')
+_FILTER_PARAMETERS = ('bbox', 'layers', 'exclude_layers', 'where')
+
+# Status messages kept per job (the last ones), and finished jobs kept by the service.
+MAX_LOG_LINES = 500
+MAX_FINISHED_JOBS = 1000
+# Longest ?wait= honoured, and the largest request body accepted.
+MAX_WAIT_SECONDS = 300.0
+MAX_REQUEST_BYTES = 1024 * 1024
+# How often the dispatcher checks on running jobs when it is not woken up earlier.
+TICK_SECONDS = 0.5
+
+
+def _now_iso():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='milliseconds')
+
+def validate_job(job_spec):
+    """
+    Checks a submitted job and returns (job type, parameters), with the paths made absolute
+    and the defaults filled in.
+
+    Raises:
+        ValueError: If the job is not a JSON object of a known type with valid parameters.
+    """
+    if not isinstance(job_spec, dict):
+        raise ValueError("a job must be a JSON object")
+    job_type = job_spec.get('type')
+    if job_type not in JOB_PARAMETERS:
+        raise ValueError(f"unknown job type {job_type!r}, expected one of {list(DIRECTIONS)}")
+    parameters = {name: value for name, value in job_spec.items() if name != 'type'}
+    allowed = JOB_PARAMETERS[job_type]
+    unknown = sorted(set(parameters) - set(allowed))
+    if unknown:
+        raise ValueError(f"unknown parameter(s) for {job_type}: {unknown}, expected some of {sorted(allowed)}")
+    for name, (types, required) in allowed.items():
+        value = parameters.get(name)
+        if value is None:
+            if required:
+                raise ValueError(f"{job_type} needs the parameter '{name}'")
+            parameters.pop(name, None)
+            continue
+        # bool is an int in Python, but not a valid number of points or a tolerance.
+        if not isinstance(value, types) or (isinstance(value, bool) and types is not bool):
+            raise ValueError(f"parameter '{name}' has the wrong type: {value!r}")
+    for name in _PATH_PARAMETERS:
+        if name in parameters:
+            parameters[name] = os.path.abspath(parameters[name])
+    if job_type == LANDXML_TO_GDB and not os.path.isfile(parameters['input']):
+        raise ValueError(f"input file not found: {parameters['input']}")
+    if job_type == GDB_TO_LANDXML and not os.path.isdir(parameters['input_dir']):
+        raise ValueError(f"input_dir is not a directory: {parameters['input_dir']}")
+
+    if job_type == LANDXML_TO_GDB:
+        parameters.setdefault('layer_name', "SurveyPoints")
+        parameters.setdefault('output_format', DEFAULT_OUTPUT_FORMAT)
+        if parameters['output_format'] not in OUTPUT_FORMATS:
+            raise ValueError(f"unknown output_format '{parameters['output_format']}', expected one of {list(OUTPUT_FORMATS)}")
+    else:
+        if parameters.get('compression') is not None and parameters['compression'] not in COMPRESSIONS:
+            raise ValueError(f"unknown compression '{parameters['compression']}', expected one of {list(COMPRESSIONS)}")
+        for name in ('layer_workers', 'max_points_per_file', 'max_bytes_per_file'):
+            if name in parameters and parameters[name] < 1:
+                raise ValueError(f"parameter '{name}' must be at least 1")
+        if parameters.get('vertex_tolerance', 0) < 0:
+            raise ValueError("parameter 'vertex_tolerance' must not be negative")
+        if 'bbox' in parameters and not all(isinstance(value, (int, float)) and not isinstance(value, bool)
+                                            for value in parameters['bbox']):
+            raise ValueError(f"parameter 'bbox' must be a list of 4 numbers, got {parameters['bbox']!r}")
+        for name in ('layers', 'exclude_layers'):
+            if name in parameters and not all(isinstance(pattern, str) for pattern in parameters[name]):
+                raise ValueError(f"parameter '{name}' must be a list of layer name patterns (strings), got {parameters[name]!r}")
+        _extraction_filter(parameters) # Raises ValueError for a bbox that is not (xmin, ymin, xmax, ymax)
+    return job_type, parameters
+
+def _extraction_filter(parameters):
+    if not any(name in parameters for name in _FILTER_PARAMETERS):
+        return None
+    return transform_opposite.ExtractionFilter(parameters.get('bbox'), parameters.get('layers'),
+                                               parameters.get('exclude_layers'), parameters.get('where'))
+
+# --- Jobs, run in the worker processes ---
+# A job's status messages are collected in the worker and returned with its result, so the
+# messages of jobs running side by side do not get mixed up.
+
+def run_job(job_type, parameters, status_callback=print):
+    """
+    Worker entry point: runs one validated job. Its status messages go to the job's log,
+    not to status_callback (the service's console).
+
+    Returns:
+        dict: {'result': ..., 'error': None or the error message, 'log': the last
+              MAX_LOG_LINES status messages}. The result of LANDXML_TO_GDB is
+              {'points_written'}; that of GDB_TO_LANDXML is {'converted', 'skipped',
+              'failed', 'files'}, with the fields of one FILE_FINISHED event per GDB
+              converted ('failed' also counts GDBs without points).
+    """
+    log = collections.deque(maxlen=MAX_LOG_LINES)
+    try:
+        if job_type == LANDXML_TO_GDB:
+            result, error = _run_landxml_to_gdb(parameters, log.append)
+        else:
+            result, error = _run_gdb_to_landxml(parameters, log.append)
+    except Exception as e:
+        result, error = None, f"Unexpected error: {e}"
+        log.append(error)
+    return {'result': result, 'error': error, 'log': list(log)}
+
+def _run_landxml_to_gdb(parameters, status_callback):
+    output_dir = os.path.dirname(parameters['output'])
+    os.makedirs(output_dir, exist_ok=True)
+    try:
+        points_written = transform.create_gdb_from_landxml(
+            parameters['input'], parameters['output'], layer_name=parameters['layer_name'], status_callback=status_callback,
+            raise_errors=True, output_format=parameters['output_format'], profile=parameters.get('profile', False),
+            cprofile=parameters.get('cprofile', False))
+    except transform.ConversionError as e:
+        return {'points_written': 0}, str(e)
+    return {'points_written': points_written}, None
+
+def _run_gdb_to_landxml(parameters, status_callback):
+    files = []
+    summary = {}
+
+    def collect(event):
+        if event.kind == FILE_FINISHED:
+            files.append(event.data)
+        elif event.kind == RUN_FINISHED:
+            summary.update(converted=event.data['converted'], skipped=event.data['skipped'], failed=event.data['failed'])
+
+    messages = []
+
+    def log(message):
+        messages.append(message)
+        status_callback(message)
+
+    transform_opposite.run_conversion(
+        parameters['input_dir'], parameters['output_dir'], status_callback=log, max_workers=1,
+        layer_workers=parameters.get('layer_workers', 1), force=parameters.get('force', False), progress_callback=collect,
+        extraction_filter=_extraction_filter(parameters), vertex_tolerance=parameters.get('vertex_tolerance'),
+        compression=parameters.get('compression'), max_points_per_file=parameters.get('max_points_per_file'),
+        max_bytes_per_file=parameters.get('max_bytes_per_file'), profile=parameters.get('profile', False),
+        cprofile=parameters.get('cprofile', False))
+    if not summary:
+        # run_conversion stopped before converting anything, after reporting why.
+        return None, next((message for message in reversed(messages) if message.startswith("Error")), "Conversion did not run.")
+    result = dict(summary, files=files)
+    failed = [file['path'] for file in files if file['status'] == 'failed']
+    if failed:
+        return result, f"{len(failed)} GDB(s) could not be converted: {', '.join(failed)}"
+    return result, None
+
+# --- The service ---
+
+class ServiceJob:
+    """A submitted job and what became of it."""
+
+    __slots__ = ('id', 'type', 'parameters', 'state', 'submitted', 'started', 'finished', 'seconds', 'result', 'error',
+                 'log', '_start_time')
+
+    def __init__(self, job_id, job_type, parameters):
+        self.id = job_id
+        self.type = job_type
+        self.parameters = parameters
+        self.state = QUEUED
+        self.submitted = _now_iso()
+        self.started = self.finished = self.seconds = None
+        self.result = self.error = None
+        self.log = []
+        self._start_time = None
+
+    def to_dict(self, include_log=True):
+        job = {'id': self.id, 'type': self.type, 'parameters': self.parameters, 'state': self.state,
+               'submitted': self.submitted, 'started': self.started, 'finished': self.finished, 'seconds': self.seconds,
+               'result': self.result, 'error': self.error}
+        if include_log:
+            job['log'] = self.log
+        return job
+
+class ConversionService:
+    """
+    Queue of conversion jobs run by a WarmProcessPool whose workers have fiona/GDAL loaded.
+
+    Jobs run in submission order, at most `workers` at a time. All methods are thread-safe;
+    the HTTP front end (serve()) calls them from its request threads.
+    """
+
+    def __init__(self, workers=1, status_callback=print):
+        """
+        Args:
+            workers (int): Number of worker processes, i.e. jobs run at the same time.
+            status_callback (function): Function to call with the service's own messages
+                                        (jobs starting and finishing, worker restarts).
+        """
+        self.workers = max(1, workers)
+        self.status_callback = status_callback
+        self.started = None
+        self._jobs = collections.OrderedDict() # job id -> ServiceJob, oldest first
+        self._queue = collections.deque()      # ids of queued jobs
+        self._running = {}                     # Future -> ServiceJob
+        self._job_ids = itertools.count(1)
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._pool = None
+        self._dispatcher = None
+
+    def start(self):
+        """Starts the worker processes (loading fiona/GDAL in each) and the dispatcher."""
+        start_time = time.perf_counter()
+        self._pool = self._start_pool()
+        self.started = _now_iso()
+        self.status_callback(f"Started {self.workers} worker process(es) with fiona/GDAL loaded "
+                             f"in {time.perf_counter() - start_time:.1f} s.")
+        self._dispatcher = threading.Thread(target=self._dispatch, name="conversion-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def _start_pool(self):
+        # Loading the libraries for GDB to LandXML also covers LandXML to GDB.
+        return WarmProcessPool(self.workers, self.status_callback, load_converter_libraries, (GDB_TO_LANDXML,))
+
+    def submit(self, job_spec):
+        """
+        Queues a job ({'type': ..., parameters...}, see JOB_PARAMETERS).
+
+        Returns:
+            dict: The queued job.
+
+        Raises:
+            ValueError: If the job is invalid (see validate_job) or the service is stopping.
+        """
+        job_type, parameters = validate_job(job_spec)
+        with self._condition:
+            if self._stopping:
+                raise ValueError("the service is shutting down")
+            job = ServiceJob(str(next(self._job_ids)), job_type, parameters)
+            self._jobs[job.id] = job
+            self._queue.append(job.id)
+            self._forget_old_jobs()
+            self._condition.notify_all()
+            return job.to_dict()
+
+    def get(self, job_id, wait=0.0):
+        """The job with this id (waiting up to wait seconds for it to finish), or None if unknown."""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if wait > 0:
+                self._condition.wait_for(lambda: job.state in FINISHED_STATES, timeout=min(wait, MAX_WAIT_SECONDS))
+            return job.to_dict()
+
+    def list_jobs(self):
+        with self._condition:
+            return [job.to_dict(include_log=False) for job in self._jobs.values()]
+
+    def cancel(self, job_id):
+        """
+        Cancels a queued job. Returns the job, or None if it is unknown.
+
+        Raises:
+            ValueError: If the job is already running or finished.
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job.state != QUEUED:
+                raise ValueError(f"job {job_id} is {job.state} and can no longer be cancelled")
+            self._queue.remove(job_id)
+            job.state = CANCELLED
+            job.finished = _now_iso()
+            self._condition.notify_all()
+            return job.to_dict()
+
+    def status(self):
+        with self._condition:
+            counts = collections.Counter(job.state for job in self._jobs.values())
+            return {
+                'started': self.started,
+                'workers': self.workers,
+                'worker_pids': self._pool.worker_pids if self._pool is not None else [],
+                'queued': len(self._queue),
+                'running': len(self._running),
+                'jobs': {state: counts.get(state, 0) for state in (QUEUED, RUNNING) + FINISHED_STATES},
+                'stopping': self._stopping,
+            }
+
+    def _forget_old_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.state in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def _wake(self, future=None):
+        with self._condition:
+            self._condition.notify_all()
+
+    def _dispatch(self):
+        """Dispatcher thread: collects finished jobs and starts queued ones on free workers."""
+        with self._condition:
+            while not (self._stopping and not self._running):
+                self._collect_finished_jobs()
+                self._start_jobs()
+                self._condition.wait(TICK_SECONDS)
+                self._pool.drain()
+
+    def _start_jobs(self):
+        while self._queue and len(self._running) < self.workers and not self._stopping:
+            job = self._jobs[self._queue.popleft()]
+            job.state = RUNNING
+            job.started = _now_iso()
+            job._start_time = time.perf_counter()
+            future = self._pool.submit(run_job, job.type, job.parameters)
+            self._running[future] = job
+            future.add_done_callback(self._wake)
+
+    def _collect_finished_jobs(self):
+        pool_broken = False
+        for future in [future for future in self._running if future.done()]:
+            job = self._running.pop(future)
+            try:
+                outcome = future.result()
+            except Exception as e:
+                outcome = {'result': None, 'error': f"Worker process failed: {e}", 'log': []}
+                pool_broken = pool_broken or isinstance(e, concurrent.futures.process.BrokenProcessPool)
+            job.result = outcome['result']
+            job.error = outcome['error']
+            job.log = outcome['log']
+            job.state = SUCCEEDED if job.error is None else FAILED
+            job.finished = _now_iso()
+            job.seconds = time.perf_counter() - job._start_time
+            self.status_callback(f"Job {job.id} ({job.type}) {job.state} in {job.seconds:.1f} s"
+                                 + (f": {job.error}" if job.error else "."))
+            self._forget_old_jobs()
+        if pool_broken:
+            self.status_callback("A worker process died; restarting the worker processes.")
+            self._pool.close(wait=False)
+            self._pool = self._start_pool()
+        if pool_broken or not self._running:
+            self._condition.notify_all()
+
+    def close(self):
+        """Cancels the queued jobs, waits for the running ones and stops the workers."""
+        with self._condition:
+            self._stopping = True
+            for job_id in self._queue:
+                self._jobs[job_id].state = CANCELLED
+                self._jobs[job_id].finished = _now_iso()
+            self._queue.clear()
+            if self._running:
+                self.status_callback(f"Stopping after {len(self._running)} running job(s)...")
+            self._condition.notify_all()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+        if self._pool is not None:
+            self._pool.close()
+        self.status_callback("Conversion service stopped.")
+
+# --- HTTP front end ---
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    server_version = "ConversionService/1.0"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def address_string(self):
+        # Unix socket clients have no address.
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix-socket"
+
+    def log_message(self, format, *args):
+        pass # Requests are not logged; the service reports jobs starting and finishing.
+
+    def _send_json(self, status, body):
+        data = (json.dumps(body, indent=2) + "\n").encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status, message):
+        self._send_json(status, {'error': message})
+
+    def _route(self):
+        url = urllib.parse.urlsplit(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        return parts, urllib.parse.parse_qs(url.query)
+
+    def do_GET(self):
+        parts, query = self._route()
+        if parts == ['status']:
+            self._send_json(200, self.service.status())
+        elif parts == ['jobs']:
+            self._send_json(200, {'jobs': self.service.list_jobs()})
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            try:
+                wait = float(query.get('wait', ['0'])[0])
+            except ValueError:
+                self._send_error(400, "wait must be a number of seconds")
+                return
+            job = self.service.get(parts[1], wait)
+            if job is None:
+                self._send_error(404, f"unknown job {parts[1]}")
+            else:
+                self._send_json(200, job)
+        else:
+            self._send_error(404, f"unknown path {self.path}")
+
+    def do_POST(self):
+        parts, _ = self._route()
+        if parts != ['jobs']:
+            self._send_error(404, f"unknown path {self.path}")
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if not 0 < length <= MAX_REQUEST_BYTES:
+            self._send_error(400, f"expected a JSON body of at most {MAX_REQUEST_BYTES} bytes")
+            return
+        try:
+            job_spec = json.loads(self.rfile.read(length))
+            job = self.service.submit(job_spec)
+        except ValueError as e: # Includes malformed JSON
+            self._send_error(400, str(e))
+            return
+        self._send_json(202, job)
+
+    def do_DELETE(self):
+        parts, _ = self._route()
+        if len(parts) != 2 or parts[0] != 'jobs':
+            self._send_error(404, f"unknown path {self.path}")
+            return
+        try:
+            job = self.service.cancel(parts[1])
+        except ValueError as e:
+            self._send_error(409, str(e))
+            return
+        if job is None:
+            self._send_error(404, f"unknown job {parts[1]}")
+        else:
+            self._send_json(200, job)
+
+class _TCPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def _remove_stale_socket(socket_path):
+    """Removes a Unix socket left behind by a service that is no longer running."""
+    if not os.path.exists(socket_path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError:
+        os.remove(socket_path)
+    else:
+        raise OSError(f"another service is already listening on {socket_path}")
+    finally:
+        probe.close()
+
+def create_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+    """
+    Creates the HTTP server of a service, on host:port or, if socket_path is given, on a
+    Unix socket only the current user can connect to. Call serve_forever() on it.
+    """
+    if socket_path is not None:
+        _remove_stale_socket(socket_path)
+        server = _UnixServer(socket_path, _RequestHandler)
+        os.chmod(socket_path, 0o600)
+    else:
+        server = _TCPServer((host, port), _RequestHandler)
+    server.service = service
+    return server
+
+def serve(workers=1, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, status_callback=print):
+    """Runs a ConversionService until the process is interrupted (Ctrl+C)."""
+    service = ConversionService(workers, status_callback)
+    server = create_server(service, host, port, socket_path)
+    try:
+        service.start()
+        address = f"unix:{socket_path}" if socket_path is not None else f"http://{host}:{server.server_address[1]}"
+        status_callback(f"Listening on {address}. Press Ctrl+C to stop.")
+        try:
+            server.serve_forever(poll_interval=TICK_SECONDS)
+        except KeyboardInterrupt:
+            pass
+    finally:
+        server.server_close()
+        service.close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local conversion service whose worker processes keep fiona/GDAL loaded.")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of worker processes, i.e. jobs converted at the same time (default: 1)")
+    parser.add_argument("--host", default=DEFAULT_HOST,
+                        help=f"Address to listen on (default: {DEFAULT_HOST}; do not expose the service to other machines)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help=f"Port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("--socket", metavar="PATH",
+                        help="Listen on this Unix socket instead of a TCP port")
+    args = parser.parse_args()
+    if args.socket is not None and not hasattr(socket, 'AF_UNIX'):
+        parser.error("Unix sockets are not available on this platform; use --host/--port")
+    try:
+        serve(workers=args.jobs, host=args.host, port=args.port, socket_path=args.socket)
+    except OSError as e: # Address in use, another service on the socket, ...
+        parser.exit(1, f"Error: cannot listen: {e}\n")
@@ -1,7 +1,10 @@
 import tkinter as tk
 from tkinter import filedialog, scrolledtext, ttk
-import threading
+import multiprocessing
+import queue
 import os
+import traceback
+from progress_events import ProgressTracker, FILE_FINISHED, LAYER_FINISHED
 # Make sure transform_opposite.py is in the same directory or accessible via PYTHONPATH
 try:
     import transform_opposite 
@@ -21,6 +24,41 @@ except ImportError:
         # For simplicity, this example will likely fail to run if this import fails.
         raise
 
+# Log messages and progress events from the conversion process are queued and applied to the
+# widgets in one batch every LOG_FLUSH_INTERVAL_MS, instead of one Tk callback per message.
+LOG_FLUSH_INTERVAL_MS = 100
+# Only the last MAX_LOG_LINES lines stay in the log area; the full log goes to LOG_FILE_NAME
+# in the output folder.
+MAX_LOG_LINES = 2000
+LOG_FILE_NAME = "gdb_to_xml_conversion.log"
+
+# Conversions run in a child process started with 'spawn' on every platform: the XML building
+# is CPU-bound Python and would otherwise compete with Tk for the GIL, and a forked copy of
+# the Tk process is not safe to use.
+_process_context = multiprocessing.get_context('spawn')
+
+def conversion_process(input_gdb_dir, output_xml_dir, force, message_queue, cancel_event):
+    """
+    Entry point of the child process that runs a conversion for the GUI.
+
+    Log messages, progress events and the end of the run are sent back through
+    message_queue as ('log', message), ('progress', event), ('error', None) and
+    ('done', None). Setting cancel_event stops the conversion between layers or GDBs.
+    """
+    def log(message):
+        message_queue.put(('log', message))
+
+    try:
+        transform_opposite.run_conversion(input_gdb_dir, output_xml_dir, status_callback=log, force=force,
+                                          progress_callback=lambda event: message_queue.put(('progress', event)),
+                                          cancel_event=cancel_event)
+    except Exception as e:
+        message_queue.put(('error', None))
+        log(f"An error occurred during conversion: {e}")
+        log(traceback.format_exc())
+    finally:
+        message_queue.put(('done', None))
+
 class GDBToXMLConverterApp:
     def __init__(self, master):
         self.master = master
@@ -51,6 +89,11 @@ class GDBToXMLConverterApp:
         self.browse_output_btn = ttk.Button(input_frame, text="Browse...", command=self.browse_output_xml_dir)
         self.browse_output_btn.grid(row=1, column=2, padx=5, pady=5)
         
+        # GDBs unchanged since the last conversion into the output folder are skipped unless this is ticked
+        self.force_var = tk.BooleanVar(value=False)
+        self.force_check = ttk.Checkbutton(input_frame, text="Reconvert GDBs that have not changed", variable=self.force_var)
+        self.force_check.grid(row=2, column=1, padx=5, pady=5, sticky="w")
+
         input_frame.columnconfigure(1, weight=1) # Make entry expand
 
         # Set default paths (optional, based on script location)
@@ -62,8 +105,12 @@ class GDBToXMLConverterApp:
             pass # In case __file__ is not defined (e.g. interactive)
 
         # Convert Button
-        self.convert_button = ttk.Button(master, text="Start Conversion", command=self.start_conversion_thread)
-        self.convert_button.pack(pady=10)
+        button_frame = ttk.Frame(master)
+        button_frame.pack(pady=10)
+        self.convert_button = ttk.Button(button_frame, text="Start Conversion", command=self.start_conversion)
+        self.convert_button.pack(side="left", padx=5)
+        self.cancel_button = ttk.Button(button_frame, text="Cancel", command=self.cancel_conversion, state=tk.DISABLED)
+        self.cancel_button.pack(side="left", padx=5)
 
         # Progress Bar
         self.progress_var = tk.DoubleVar()
@@ -81,6 +128,17 @@ class GDBToXMLConverterApp:
         # Center the window
         master.eval('tk::PlaceWindow . center')
 
+        self.ui_queue = _process_context.Queue()
+        self.conversion_process = None
+        self.cancel_event = None
+        self.closing = False
+        self.log_file = None
+        self.log_file_path = None
+        self.error_occurred = False
+        self.progress_tracker = ProgressTracker()
+        master.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.master.after(LOG_FLUSH_INTERVAL_MS, self._flush_ui_queue)
+
 
     def browse_input_gdb_dir(self):
         directory = filedialog.askdirectory()
@@ -93,58 +151,138 @@ class GDBToXMLConverterApp:
             self.output_xml_dir_var.set(directory)
 
     def log_status(self, message):
-        self.master.after(0, self._log_status_thread_safe, message)
+        # Messages are shown by _flush_ui_queue, in order with those of the conversion process
+        self.ui_queue.put(('log', message))
 
-    def _log_status_thread_safe(self, message):
+    def _flush_ui_queue(self):
+        # Checked before draining: once the process has exited, everything it sent is in the queue
+        process_exited = self.conversion_process is not None and not self.conversion_process.is_alive()
+        messages = []
+        try:
+            while True:
+                kind, payload = self.ui_queue.get_nowait()
+                if kind == 'log':
+                    messages.append(payload)
+                elif kind == 'progress':
+                    self._handle_progress_event(payload)
+                elif kind == 'error':
+                    self.error_occurred = True
+                elif kind == 'done':
+                    self._append_log(messages)
+                    messages = []
+                    self._conversion_finished()
+        except queue.Empty:
+            pass
+        self._append_log(messages)
+        if process_exited and self.conversion_process is not None:
+            # Exited without sending 'done', e.g. killed or crashed inside GDAL
+            self.error_occurred = True
+            self._append_log([f"Error: The conversion process stopped unexpectedly (exit code {self.conversion_process.exitcode})."])
+            self._conversion_finished()
+        if self.closing and self.conversion_process is None:
+            self.master.destroy()
+            return
+        self.master.after(LOG_FLUSH_INTERVAL_MS, self._flush_ui_queue)
+
+    def _append_log(self, messages):
+        if not messages:
+            return
+        if self.log_file is not None:
+            self.log_file.write("\n".join(messages) + "\n")
+            self.log_file.flush()
         self.status_text.config(state=tk.NORMAL)
-        self.status_text.insert(tk.END, message + "\n")
+        self.status_text.insert(tk.END, "\n".join(messages[-MAX_LOG_LINES:]) + "\n")
+        # Drop the oldest lines so the widget never holds more than MAX_LOG_LINES
+        line_count = int(self.status_text.index('end-1c').split('.')[0]) - 1
+        if line_count > MAX_LOG_LINES:
+            self.status_text.delete('1.0', f"{line_count - MAX_LOG_LINES + 1}.0")
         self.status_text.see(tk.END)
         self.status_text.config(state=tk.DISABLED)
-        # Crude progress update - can be made more sophisticated
-        if "Processing GDB" in message:
-             self.progress_var.set(self.progress_var.get() + 5) # Increment a bit
-        if "Finished processing." in message or "Conversion process complete." in message:
-            self.progress_var.set(100)
 
+    def _handle_progress_event(self, event):
+        # The bar follows the GDBs, layers and features actually converted (see progress_events.py)
+        self.progress_tracker.handle(event)
+        self.progress_var.set(100 * self.progress_tracker.fraction())
+        # A layer that fails is skipped, and its GDB is still converted from the other layers.
+        if ((event.kind == FILE_FINISHED and event.data['status'] == 'failed')
+                or (event.kind == LAYER_FINISHED and event.data['error'] is not None)):
+            self.error_occurred = True
+
+    def _open_log_file(self, output_xml_dir):
+        self.log_file = None
+        self.log_file_path = None
+        if not output_xml_dir:
+            return
+        try:
+            os.makedirs(output_xml_dir, exist_ok=True)
+            self.log_file_path = os.path.join(output_xml_dir, LOG_FILE_NAME)
+            self.log_file = open(self.log_file_path, 'w', encoding='utf-8')
+        except OSError as e:
+            self.log_file_path = None
+            self.log_status(f"Warning: Could not create log file in {output_xml_dir}: {e}")
 
-    def conversion_task(self):
+    def _conversion_finished(self):
+        self.conversion_process = None
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            self._append_log(["Conversion cancelled."])
+        elif self.error_occurred:
+            self._append_log(["Conversion finished with errors."])
+        elif self.progress_var.get() < 100:
+            self.progress_var.set(100) # Mark as complete if no error kept it lower
+        if self.log_file_path is not None:
+            self._append_log([f"Full log saved to: {self.log_file_path}"])
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+        self.cancel_event = None
+        self.convert_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+
+    def start_conversion(self):
         input_gdb_dir = self.input_gdb_dir_var.get()
         output_xml_dir = self.output_xml_dir_var.get()
 
+        self.status_text.config(state=tk.NORMAL)
+        self.status_text.delete('1.0', tk.END) # Clear previous logs
+        self.status_text.config(state=tk.DISABLED)
+        self.progress_var.set(0)
+        self.progress_tracker = ProgressTracker()
+        self.error_occurred = False
+
         if not input_gdb_dir or not output_xml_dir:
             self.log_status("Error: Input and Output directories must be specified.")
-            self.convert_button.config(state=tk.NORMAL)
-            self.progress_var.set(0)
             return
 
-        self.log_status("Starting conversion...")
-        self.progress_var.set(0)
-        try:
-            # Call the refactored function from transform_opposite.py
-            transform_opposite.run_conversion(input_gdb_dir, output_xml_dir, status_callback=self.log_status)
-        except Exception as e:
-            self.log_status(f"An error occurred during conversion: {e}")
-            import traceback
-            self.log_status(traceback.format_exc())
-        finally:
-            self.convert_button.config(state=tk.NORMAL)
-            # self.log_status("Conversion process complete.") # Already logged by run_conversion
-            # self.progress_bar.stop() # If it was in indeterminate mode
-            if self.progress_var.get() < 100 and "error" not in self.status_text.get("1.0", tk.END).lower() : # if not already 100 and no error
-                 self.progress_var.set(100) # Mark as complete if no specific error set it lower
-
-    def start_conversion_thread(self):
         self.convert_button.config(state=tk.DISABLED)
-        self.status_text.config(state=tk.NORMAL)
-        self.status_text.delete('1.0', tk.END) # Clear previous logs
-        self.status_text.config(state=tk.DISABLED)
-        self.progress_var.set(0)
-        
-        # Run the conversion in a separate thread to keep the GUI responsive
-        self.conversion_thread = threading.Thread(target=self.conversion_task, daemon=True)
-        self.conversion_thread.start()
+        self.cancel_button.config(state=tk.NORMAL)
+        self._open_log_file(output_xml_dir)
+        self.log_status("Starting conversion...")
+
+        # Run the conversion in a separate process to keep the GUI responsive
+        self.cancel_event = _process_context.Event()
+        self.conversion_process = _process_context.Process(
+            target=conversion_process,
+            args=(input_gdb_dir, output_xml_dir, self.force_var.get(), self.ui_queue, self.cancel_event)
+        )
+        self.conversion_process.start()
+
+    def cancel_conversion(self):
+        if self.cancel_event is not None and not self.cancel_event.is_set():
+            self.cancel_event.set()
+            self.cancel_button.config(state=tk.DISABLED)
+            self.log_status("Cancelling: the conversion stops before the next layer. Incomplete XML files are removed.")
+
+    def on_close(self):
+        if self.conversion_process is None:
+            self.master.destroy()
+            return
+        # Let the conversion stop cleanly (no partial XML) before the application exits
+        self.cancel_conversion()
+        self.closing = True
+        self.master.withdraw()
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support() # Needed for the conversion process in a PyInstaller executable
     root = tk.Tk()
     app = GDBToXMLConverterApp(root)
     root.mainloop()
@@ -0,0 +1,217 @@
+import xml.etree.ElementTree as ET
+
+# --- LandXML parser backends ---
+# The CgPoints of a LandXML file are read by one of two interchangeable backends, which give
+# the same runs of points and the same status messages:
+#   'lxml'   libxml2 through lxml's parser target interface: the C parser calls back with
+#            plain attribute dicts and no element tree is built. Parsing is 5-10 % faster,
+#            though building the batches and writing them take most of a conversion.
+#   'stdlib' xml.etree.ElementTree.iterparse (expat), pruning the tree as it goes.
+# lxml (5.0 or later) is optional and imported on first use; without it the stdlib backend
+# is used.
+# Both read the first CgPoints element directly under the root, with the LandXML-1.2
+# namespace or without any. Its namespace is resolved once, when it starts, and CgPoints
+# are then matched on that one tag.
+
+LANDXML_NAMESPACE = 'http://www.landxml.org/schema/LandXML-1.2'
+
+PARSER_BACKENDS = ('lxml', 'stdlib')
+# Backend used when none is asked for: None picks lxml when it is installed.
+PARSER_BACKEND = None
+
+# Bytes fed to the lxml parser at a time.
+LXML_FEED_SIZE = 64 * 1024
+
+lxml_etree = None
+_lxml_checked = False
+
+
+def _lxml_available():
+    """Imports lxml once; returns whether a version the lxml backend can use is installed."""
+    global lxml_etree, _lxml_checked
+    if not _lxml_checked:
+        _lxml_checked = True
+        try:
+            from lxml import etree as lxml_etree
+        except ImportError:
+            lxml_etree = None
+        else:
+            # resolve_entities='internal' is new in lxml 5.0.
+            if lxml_etree.LXML_VERSION < (5, 0):
+                lxml_etree = None
+    return lxml_etree is not None
+
+def resolve_parser_backend(parser_backend=None):
+    """
+    Returns the name of the backend that reads LandXML: parser_backend, or PARSER_BACKEND
+    when it is None, or 'lxml' when both are None and lxml is installed, else 'stdlib'.
+
+    Raises:
+        ValueError: If the backend is not one of PARSER_BACKENDS.
+        ImportError: If 'lxml' is asked for and lxml 5.0 or later is not installed.
+    """
+    parser_backend = parser_backend or PARSER_BACKEND
+    if parser_backend is None:
+        return 'lxml' if _lxml_available() else 'stdlib'
+    if parser_backend not in PARSER_BACKENDS:
+        raise ValueError(f"unknown XML parser backend '{parser_backend}', expected one of {list(PARSER_BACKENDS)}")
+    if parser_backend == 'lxml' and not _lxml_available():
+        raise ImportError("the lxml XML parser backend needs the lxml package (5.0 or later).")
+    return parser_backend
+
+def _cgpoint_tag(cgpoints_tag):
+    """The CgPoint tag to match inside a CgPoints element with this tag, or None if it is not one that is read."""
+    if cgpoints_tag == f"{{{LANDXML_NAMESPACE}}}CgPoints":
+        return f"{{{LANDXML_NAMESPACE}}}CgPoint"
+    if cgpoints_tag == 'CgPoints':
+        return 'CgPoint'
+    return None
+
+def _report_point_count(found_cgpoints, point_count, status_callback):
+    if not found_cgpoints:
+        status_callback("No CgPoints element found directly under the root (with or without LandXML namespace).")
+    else:
+        status_callback(f"Found {point_count} CgPoint elements.")
+
+def iter_cgpoint_runs(xml_file, batch_size, status_callback=print, parser_backend=None):
+    """
+    Streams the raw data of the CgPoints in a LandXML file.
+
+    Args:
+        xml_file (file): Binary stream of the (decompressed) XML.
+        batch_size (int): Number of CgPoints per run; only the last run is shorter.
+        status_callback (function): Function to call for status updates.
+        parser_backend (str): 'lxml', 'stdlib' or None (see resolve_parser_backend).
+
+    Yields:
+        tuple: (texts, attribs): the coordinate text (None if empty) and attribute dict of
+               each CgPoint of a run.
+
+    Raises:
+        ET.ParseError: If the XML is malformed, whichever backend reads it.
+    """
+    if resolve_parser_backend(parser_backend) == 'lxml':
+        return _iter_cgpoint_runs_lxml(xml_file, batch_size, status_callback)
+    return _iter_cgpoint_runs_stdlib(xml_file, batch_size, status_callback)
+
+def _iter_cgpoint_runs_stdlib(xml_file, batch_size, status_callback):
+    texts = [] # Raw coordinate text and attributes of the CgPoints not yielded yet
+    attribs = []
+    depth = 0
+    root = None
+    cgpoints_element = None
+    cgpoint_tag = None
+    point_count = 0
+
+    for event, elem in ET.iterparse(xml_file, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if depth == 1:
+                root = elem
+                status_callback(f"XML Root tag: {root.tag}") # Print root tag
+            elif depth == 2 and cgpoints_element is None:
+                cgpoint_tag = _cgpoint_tag(elem.tag)
+                if cgpoint_tag is not None:
+                    cgpoints_element = elem
+                    status_callback(f"Found CgPoints element: {elem.tag}")
+            continue
+
+        depth -= 1
+        if depth == 1:
+            if elem is cgpoints_element:
+                break
+            # Elements before CgPoints (Units, Application, ...) are not needed once read.
+            root.remove(elem)
+        elif depth == 2 and cgpoints_element is not None and root[0] is cgpoints_element:
+            if elem.tag == cgpoint_tag:
+                texts.append(elem.text)
+                attribs.append(elem.attrib)
+                point_count += 1
+                if len(texts) >= batch_size:
+                    yield texts, attribs
+                    texts, attribs = [], []
+            # Finished children are always the first one left, so this stays cheap and the
+            # CgPoints element never accumulates points.
+            cgpoints_element.remove(elem)
+
+    _report_point_count(cgpoints_element is not None, point_count, status_callback)
+    if texts:
+        yield texts, attribs
+
+class _CgPointCollector:
+    """lxml parser target that keeps the coordinate text and attributes of the CgPoints it is fed."""
+
+    def __init__(self, status_callback):
+        self.status_callback = status_callback
+        self.texts = []
+        self.attribs = []
+        self.found_cgpoints = False
+        self.finished = False    # The CgPoints element has been closed
+        self._depth = 0
+        self._cgpoint_tag = None # Set while inside the CgPoints element
+        self._text_parts = None  # Set while inside a CgPoint, before any child element
+
+    def start(self, tag, attrib):
+        self._depth += 1
+        if self._depth == 3:
+            if tag == self._cgpoint_tag:
+                self.attribs.append(attrib)
+                self._text_parts = []
+        elif self._depth == 1:
+            self.status_callback(f"XML Root tag: {tag}")
+        elif self._depth == 2 and not self.found_cgpoints:
+            self._cgpoint_tag = _cgpoint_tag(tag)
+            if self._cgpoint_tag is not None:
+                self.found_cgpoints = True
+                self.status_callback(f"Found CgPoints element: {tag}")
+        elif self._text_parts is not None:
+            # Only the text before a CgPoint's first child is its coordinates, as with ElementTree's .text.
+            self.texts.append("".join(self._text_parts) or None)
+            self._text_parts = None
+
+    def data(self, text):
+        if self._text_parts is not None:
+            self._text_parts.append(text)
+
+    def end(self, tag):
+        if self._depth == 3:
+            if self._text_parts is not None:
+                self.texts.append("".join(self._text_parts) or None)
+                self._text_parts = None
+        elif self._depth == 2 and self._cgpoint_tag is not None:
+            self._cgpoint_tag = None
+            self.finished = True
+        self._depth -= 1
+
+    def close(self):
+        pass
+
+def _iter_cgpoint_runs_lxml(xml_file, batch_size, status_callback):
+    collector = _CgPointCollector(status_callback)
+    # Like expat, only entities declared in the document itself are expanded. (With
+    # resolve_entities=False, lxml would hand over "&amp;" in attributes as "&#38;".)
+    parser = lxml_etree.XMLParser(target=collector, resolve_entities='internal')
+    yielded_count = 0
+    try:
+        while not collector.finished:
+            data = xml_file.read(LXML_FEED_SIZE)
+            if not data:
+                parser.close()
+                break
+            parser.feed(data)
+            # Runs are cut at exactly batch_size, as with the stdlib backend.
+            while len(collector.texts) >= batch_size:
+                texts, attribs = collector.texts[:batch_size], collector.attribs[:batch_size]
+                del collector.texts[:batch_size], collector.attribs[:batch_size]
+                yielded_count += batch_size
+                yield texts, attribs
+    except lxml_etree.XMLSyntaxError as e:
+        # Only the part of the document up to the end of CgPoints is read, as with iterparse.
+        if not collector.finished:
+            raise ET.ParseError(str(e)) from e
+
+    # A CgPoint still open when the document ended has attributes but no text yet.
+    del collector.attribs[len(collector.texts):]
+    _report_point_count(collector.found_cgpoints, yielded_count + len(collector.texts), status_callback)
+    if collector.texts:
+        yield collector.texts, collector.attribs
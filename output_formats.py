@@ -0,0 +1,133 @@
+import json
+import os
+import shutil
+import struct
+from proj_lib_setup import import_fiona
+
+# --- Output formats of LandXML -> point conversion ---
+# create_gdb_from_landxml hands the parsed CgPoint batches (PointBatch objects) to a writer
+# for the chosen format. The fiona formats go through writerecords(), which fiona wraps in
+# one transaction per batch for drivers that support them (GeoPackage). GeoParquet is
+# written with pyarrow, one row group per batch, with the attributes kept dictionary-encoded
+# as they are in the batch; it needs the optional pyarrow package (and pyproj for the CRS).
+
+# name -> (fiona driver or None for GeoParquet, file extension, one-line description)
+OUTPUT_FORMATS = {
+    'gdb': ('OpenFileGDB', '.gdb', "Esri File Geodatabase (folder)"),
+    'gpkg': ('GPKG', '.gpkg', "GeoPackage (SQLite)"),
+    'fgb': ('FlatGeobuf', '.fgb', "FlatGeobuf with a packed spatial index"),
+    'parquet': (None, '.parquet', "GeoParquet 1.0 (needs pyarrow)"),
+}
+DEFAULT_OUTPUT_FORMAT = 'gdb'
+
+# Drivers that hold several layers per dataset; the others ignore the layer name.
+_MULTI_LAYER_DRIVERS = ('OpenFileGDB', 'GPKG')
+
+# WKB of a 2D point: byte order (1 = little endian), geometry type (1 = Point), x, y.
+_WKB_POINT = struct.Struct('<BIdd')
+
+pyarrow = pyarrow_parquet = None
+_pyarrow_checked = False
+
+
+def _pyarrow_available():
+    """Imports pyarrow once; returns whether it is installed."""
+    global pyarrow, pyarrow_parquet, _pyarrow_checked
+    if not _pyarrow_checked:
+        _pyarrow_checked = True
+        try:
+            import pyarrow
+            import pyarrow.parquet as pyarrow_parquet
+        except ImportError:
+            pyarrow = None
+    return pyarrow is not None
+
+def format_available(output_format):
+    """Whether the packages needed for an output format are installed."""
+    if OUTPUT_FORMATS[output_format][0] is None:
+        return _pyarrow_available()
+    return True
+
+def output_path_for(output_dir, base_name, output_format):
+    """<output_dir>/<base_name><extension of the format>."""
+    return os.path.join(output_dir, base_name + OUTPUT_FORMATS[output_format][1])
+
+def remove_output(path):
+    """Removes an earlier output: a folder (.gdb) or a single file."""
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+class FionaPointWriter:
+    """Writes PointBatch objects to one layer of a dataset through fiona."""
+
+    def __init__(self, path, driver, layer_name, schema, crs, status_callback=print):
+        fiona = import_fiona(status_callback)
+        layer_kwargs = {'layer': layer_name} if driver in _MULTI_LAYER_DRIVERS else {}
+        self._collection = fiona.open(path, 'w', driver=driver, schema=schema, crs=crs, **layer_kwargs)
+
+    def write(self, batch):
+        self._collection.writerecords(batch.iter_fiona_records())
+
+    def close(self):
+        self._collection.close()
+
+class GeoParquetPointWriter:
+    """
+    Writes PointBatch objects to a GeoParquet file: a WKB 'geometry' column plus one
+    dictionary-encoded string column per attribute, one row group per batch.
+    """
+
+    def __init__(self, path, schema, crs, status_callback=print):
+        if not _pyarrow_available():
+            raise ImportError("GeoParquet output needs the pyarrow package.")
+        import pyproj
+        field_names = list(schema['properties'])
+        string_dictionary = pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+        geo_metadata = {
+            'version': '1.0.0',
+            'primary_column': 'geometry',
+            'columns': {'geometry': {
+                'encoding': 'WKB',
+                'geometry_types': ['Point'],
+                'crs': pyproj.CRS.from_user_input(crs).to_json_dict(),
+            }},
+        }
+        self._schema = pyarrow.schema(
+            [pyarrow.field(field_name, string_dictionary) for field_name in field_names]
+            + [pyarrow.field('geometry', pyarrow.binary())],
+            metadata={'geo': json.dumps(geo_metadata)},
+        )
+        self._writer = pyarrow_parquet.ParquetWriter(path, self._schema)
+
+    def write(self, batch):
+        point_count = len(batch)
+        columns = []
+        for field_name, codes, distinct_values in batch.iter_encoded_columns():
+            # The batch's uint32 codes are used as the int32 dictionary indices without a copy.
+            indices = pyarrow.Array.from_buffers(pyarrow.int32(), point_count, [None, pyarrow.py_buffer(codes)])
+            columns.append(pyarrow.DictionaryArray.from_arrays(indices, pyarrow.array(distinct_values, pyarrow.string())))
+        geometries = [_WKB_POINT.pack(1, 1, easting, northing) for easting, northing in zip(batch.eastings, batch.northings)]
+        columns.append(pyarrow.array(geometries, pyarrow.binary()))
+        self._writer.write_table(pyarrow.Table.from_arrays(columns, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+def open_point_writer(output_format, path, layer_name, schema, crs, status_callback=print):
+    """
+    Creates the writer for an output format. The writer has write(batch) and close().
+
+    Args:
+        output_format (str): Key of OUTPUT_FORMATS.
+        path (str): Output path (must not exist yet).
+        layer_name (str): Layer name, for formats with named layers (gdb, gpkg).
+        schema (dict): fiona schema of the points; every property is a string.
+        crs (str): CRS of the coordinates, e.g. 'EPSG:28992'.
+        status_callback (function): Function to call for status updates.
+    """
+    driver = OUTPUT_FORMATS[output_format][0]
+    if driver is None:
+        return GeoParquetPointWriter(path, schema, crs, status_callback)
+    return FionaPointWriter(path, driver, layer_name, schema, crs, status_callback)
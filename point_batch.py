@@ -0,0 +1,126 @@
+import itertools
+from array import array
+
+# --- Compact point batches ---
+# Both converters move points around in batches (CgPoints on their way to the GDB writer,
+# layer rows spooled between processes). A PointBatch keeps a batch column by column:
+# coordinates in array('d') columns and every attribute dictionary-encoded, i.e. each
+# distinct string is stored once per batch and points only hold its index. Attributes that
+# mostly repeat the same defaults ("DefaultCode", "surveyed", one timestamp, ...) then cost
+# four bytes per point instead of a pointer plus a string object of their own.
+
+
+class PointBatch:
+    """
+    A batch of points stored column by column.
+
+    Points are added with append() (or a whole batch at once with from_columns() or
+    from_rows()) and read back with iter_rows(), iter_fiona_records(), value() or, still
+    encoded, iter_encoded_columns(). The readers decode the columns as they go, so they never hold a second
+    copy of the batch. A PointBatch pickles to its arrays and distinct strings, which is
+    far smaller than pickling one tuple per point.
+    """
+
+    __slots__ = ('field_names', 'has_z', 'eastings', 'northings', 'elevations', '_codes', '_values', '_lookups')
+
+    def __init__(self, field_names, has_z=True):
+        """
+        Args:
+            field_names (sequence): Names of the attribute columns, in the order their
+                                    values are passed to append().
+            has_z (bool): Whether points have an elevation column.
+        """
+        self.field_names = tuple(field_names)
+        self.has_z = has_z
+        self.eastings = array('d')
+        self.northings = array('d')
+        self.elevations = array('d') if has_z else None
+        self._codes = [array('I') for _ in self.field_names]
+        self._values = [[] for _ in self.field_names]
+        self._lookups = [{} for _ in self.field_names]
+
+    @classmethod
+    def from_columns(cls, field_names, eastings, northings, elevations, columns):
+        """
+        Builds a batch from whole columns at once, which is much faster than calling
+        append() per point.
+
+        Args:
+            field_names (sequence): Names of the attribute columns.
+            eastings, northings (sequence): Coordinates, one per point.
+            elevations (sequence): Elevations, or None for a batch without has_z.
+            columns (sequence): One sequence of values per field name, one value per point.
+        """
+        batch = cls(field_names, has_z=elevations is not None)
+        batch.eastings = array('d', eastings)
+        batch.northings = array('d', northings)
+        if elevations is not None:
+            batch.elevations = array('d', elevations)
+        for codes, lookup, distinct_values, column in zip(batch._codes, batch._lookups, batch._values, columns):
+            for value in dict.fromkeys(column):
+                lookup[value] = len(distinct_values)
+                distinct_values.append(value)
+            codes.extend(map(lookup.__getitem__, column))
+        return batch
+
+    @classmethod
+    def from_rows(cls, field_names, rows):
+        """Builds a batch (with has_z) from (easting, northing, elevation, values) rows, the layout of iter_rows()."""
+        if not rows:
+            return cls(field_names)
+        eastings, northings, elevations, value_tuples = zip(*rows)
+        return cls.from_columns(field_names, eastings, northings, elevations, list(zip(*value_tuples)))
+
+    def __len__(self):
+        return len(self.eastings)
+
+    def append(self, easting, northing, elevation, values):
+        """Adds one point. values holds one attribute value per field name (elevation is ignored without has_z)."""
+        self.eastings.append(easting)
+        self.northings.append(northing)
+        if self.has_z:
+            self.elevations.append(elevation)
+        for codes, lookup, distinct_values, value in zip(self._codes, self._lookups, self._values, values):
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(distinct_values)
+                distinct_values.append(value)
+            codes.append(code)
+
+    def value(self, index, field_name):
+        """Attribute field_name of the point at index (negative indexes count from the end)."""
+        column = self.field_names.index(field_name)
+        return self._values[column][self._codes[column][index]]
+
+    def distinct_values(self, field_name):
+        """The distinct values of an attribute in this batch, in order of first appearance."""
+        return list(self._values[self.field_names.index(field_name)])
+
+    def iter_encoded_columns(self):
+        """Yields (field_name, codes, distinct_values) per attribute: value i is distinct_values[codes[i]]."""
+        return zip(self.field_names, self._codes, self._values)
+
+    def _iter_value_tuples(self):
+        return zip(*(map(distinct_values.__getitem__, codes) for codes, distinct_values in zip(self._codes, self._values)))
+
+    def iter_rows(self):
+        """Yields (easting, northing, elevation, values) per point; elevation is None without has_z."""
+        elevations = self.elevations if self.has_z else itertools.repeat(None)
+        return zip(self.eastings, self.northings, elevations, self._iter_value_tuples())
+
+    def iter_fiona_records(self):
+        """Yields a 2D fiona point record per point, with the attributes as its properties."""
+        field_names = self.field_names
+        for easting, northing, values in zip(self.eastings, self.northings, self._iter_value_tuples()):
+            yield {
+                'geometry': {'type': 'Point', 'coordinates': (easting, northing)},
+                'properties': dict(zip(field_names, values)),
+            }
+
+    def __getstate__(self):
+        # The lookups are rebuilt from the distinct values instead of being pickled.
+        return (self.field_names, self.has_z, self.eastings, self.northings, self.elevations, self._codes, self._values)
+
+    def __setstate__(self, state):
+        (self.field_names, self.has_z, self.eastings, self.northings, self.elevations, self._codes, self._values) = state
+        self._lookups = [{value: code for code, value in enumerate(distinct_values)} for distinct_values in self._values]
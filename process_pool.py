@@ -0,0 +1,131 @@
+import concurrent.futures
+import multiprocessing
+import multiprocessing.managers
+import os
+import queue
+import signal
+
+
+def _drain_queue(message_queue, callback):
+    while True:
+        try:
+            message = message_queue.get_nowait()
+        except queue.Empty:
+            return
+        callback(message)
+
+def run_in_process_pool(worker, jobs, status_callback=print, max_workers=None, progress_callback=None, cancel_event=None):
+    """
+    Runs worker(*job, status_callback=...) for every job in a process pool.
+
+    Workers report through a Manager queue whose put() only returns once the message has
+    been handed over, so every status message of a job reaches status_callback (in the
+    calling process) before that job's result is yielded.
+
+    Args:
+        worker (function): Module-level function to run in the worker processes. It must
+                           accept a status_callback keyword argument.
+        jobs (list): Argument tuples, one per call of worker.
+        status_callback (function): Function to call for status updates, in this process.
+        max_workers (int): Number of worker processes (None = one per CPU core).
+        progress_callback (function): If given, worker is also passed a progress_callback
+                                      keyword argument, and the (picklable) progress events
+                                      it sends are forwarded here through a second queue.
+        cancel_event (threading.Event): Once set, jobs that have not started yet are
+                                        dropped (they are not yielded); running jobs finish.
+
+    Yields:
+        tuple: (job, result, error) in completion order. error is the exception raised by
+               the worker (result is then None), or None on success.
+    """
+    with multiprocessing.Manager() as manager:
+        status_queue = manager.Queue()
+        worker_kwargs = {'status_callback': status_queue.put}
+        if progress_callback is not None:
+            event_queue = manager.Queue()
+            worker_kwargs['progress_callback'] = event_queue.put
+
+        def drain_queues():
+            _drain_queue(status_queue, status_callback)
+            if progress_callback is not None:
+                _drain_queue(event_queue, progress_callback)
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(worker, *job, **worker_kwargs): job
+                for job in jobs
+            }
+            pending = set(futures)
+            cancelled = False
+            while pending:
+                done, pending = concurrent.futures.wait(pending, timeout=0.2, return_when=concurrent.futures.FIRST_COMPLETED)
+                drain_queues()
+                if not cancelled and cancel_event is not None and cancel_event.is_set():
+                    cancelled = True
+                    for future in pending:
+                        future.cancel()
+                for future in done:
+                    if future.cancelled():
+                        continue
+                    try:
+                        yield futures[future], future.result(), None
+                    except Exception as e:
+                        yield futures[future], None, e
+        drain_queues()
+
+def _ignore_interrupts():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _init_warm_worker(initializer, initargs):
+    _ignore_interrupts()
+    if initializer is not None:
+        initializer(*initargs)
+
+class WarmProcessPool:
+    """
+    A fixed set of worker processes that are started once and reused for every job, for
+    long-running callers (such as watch mode) that submit jobs as they come in.
+
+    initializer runs once in every worker process, so expensive imports (fiona/GDAL) are
+    paid when the pool starts instead of per job. Status messages of the workers are
+    collected in a Manager queue and forwarded to status_callback by drain(). The pool's
+    processes ignore Ctrl+C: the owner decides whether running jobs finish (close()).
+    """
+
+    def __init__(self, max_workers, status_callback=print, initializer=None, initargs=()):
+        self.max_workers = max_workers
+        self._status_callback = status_callback
+        self._manager = multiprocessing.managers.SyncManager()
+        self._manager.start(_ignore_interrupts)
+        self._status_queue = self._manager.Queue()
+        self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=_init_warm_worker,
+                                                               initargs=(initializer, initargs))
+        # Workers are spawned on demand: one job per worker starts all of them (and runs
+        # their initializer) now, rather than when the first real jobs arrive.
+        warm_up = [self._executor.submit(os.getpid) for _ in range(max_workers)]
+        self.worker_pids = sorted({future.result() for future in warm_up})
+
+    def submit(self, worker, *args):
+        """Runs worker(*args, status_callback=...) in one of the workers; returns its Future."""
+        return self._executor.submit(worker, *args, status_callback=self._status_queue.put)
+
+    def drain(self):
+        """Forwards the status messages received so far to status_callback."""
+        _drain_queue(self._status_queue, self._status_callback)
+
+    def close(self, wait=True):
+        """Stops the workers: jobs that have not started are dropped; wait=False also kills the running ones."""
+        if not wait:
+            # ProcessPoolExecutor has no public way to stop running jobs (before Python 3.14).
+            for process in list((self._executor._processes or {}).values()):
+                process.terminate()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        if wait:
+            self.drain()
+        self._manager.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
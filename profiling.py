@@ -0,0 +1,224 @@
+import contextlib
+import cProfile
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+
+# --- Conversion profiling ---
+# With profile=True, a converter times the stages of every input and writes the result as a
+# JSON report next to its output, <output dir>/<input name>.profile.json. Per stage it records
+# the wall time, the CPU time of the thread doing the work and the peak memory (RSS) reached
+# while the stage ran. With cprofile=True, the whole input is also run under cProfile and the
+# statistics are dumped to <output dir>/<input name>.prof (open them with pstats or snakeviz);
+# cProfile slows the conversion down, so the stage times of such a run are inflated.
+#
+# Peak memory per stage needs Linux, where the process's peak RSS can be reset when a stage
+# starts (/proc/self/clear_refs). Elsewhere only the process's peak RSS is recorded.
+
+PROFILE_REPORT_SUFFIX = '.profile.json'
+CPROFILE_SUFFIX = '.prof'
+
+_PROC_STATUS = '/proc/self/status'
+_PROC_CLEAR_REFS = '/proc/self/clear_refs'
+_END = object()
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+_peak_reset_checked = False
+_peak_resettable = False
+
+
+def peak_rss_resettable():
+    """Whether the peak RSS can be reset, so that it can be measured per stage (Linux)."""
+    global _peak_reset_checked, _peak_resettable
+    if not _peak_reset_checked:
+        _peak_reset_checked = True
+        _peak_resettable = reset_peak_rss(check=False) and _read_vm_hwm() is not None
+    return _peak_resettable
+
+def reset_peak_rss(check=True):
+    """Resets the peak RSS of this process to its current RSS. Returns whether that worked."""
+    if check and not peak_rss_resettable():
+        return False
+    try:
+        with open(_PROC_CLEAR_REFS, 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def _read_vm_hwm():
+    try:
+        with open(_PROC_STATUS) as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def peak_rss_bytes():
+    """Peak RSS of this process in bytes, since the last reset_peak_rss(); None if it cannot be measured."""
+    if peak_rss_resettable():
+        return _read_vm_hwm()
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024 # kilobytes except on macOS
+
+def profile_report_path(input_path, output_dir, suffix=PROFILE_REPORT_SUFFIX):
+    """<output_dir>/<input file or folder name><suffix>, e.g. out/site.xml.profile.json."""
+    return os.path.join(output_dir, os.path.basename(os.path.normpath(input_path)) + suffix)
+
+def stage(profile, name):
+    """profile.stage(name), or a context manager that does nothing when profile is None."""
+    return profile.stage(name) if profile is not None else contextlib.nullcontext()
+
+class StageStats:
+    """Totals of one stage: wall and CPU seconds, number of times it ran and peak RSS."""
+
+    __slots__ = ('wall_seconds', 'cpu_seconds', 'calls', 'peak_rss_bytes')
+
+    def __init__(self):
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.calls = 0
+        self.peak_rss_bytes = None
+
+    def add(self, wall_seconds, cpu_seconds, calls=1, peak_rss_bytes=None):
+        self.wall_seconds += wall_seconds
+        self.cpu_seconds += cpu_seconds
+        self.calls += calls
+        if peak_rss_bytes is not None and (self.peak_rss_bytes is None or peak_rss_bytes > self.peak_rss_bytes):
+            self.peak_rss_bytes = peak_rss_bytes
+
+    def to_dict(self):
+        return {'wall_seconds': self.wall_seconds, 'cpu_seconds': self.cpu_seconds, 'calls': self.calls,
+                'peak_rss_bytes': self.peak_rss_bytes}
+
+class InputProfile:
+    """
+    Profile of the conversion of one input: the stages it went through and, around the
+    whole conversion (used as a context manager), its wall time, CPU time, peak RSS and
+    optionally cProfile statistics.
+
+    Stages are timed with stage(name) and may run many times (once per batch or chunk);
+    their times add up. A stage's CPU time is that of the thread running it.
+    """
+
+    def __init__(self, input_path, output_path, converter, cprofile_path=None):
+        """
+        Args:
+            input_path (str): The input converted.
+            output_path (str): Its output.
+            converter (str): Name of the conversion, e.g. 'landxml_to_gdb'.
+            cprofile_path (str): If given, the conversion runs under cProfile and the
+                                 statistics are dumped here.
+        """
+        self.input_path = input_path
+        self.output_path = output_path
+        self.converter = converter
+        self.cprofile_path = cprofile_path
+        self.stages = {}
+        self.details = {} # Added to the report as they are (points written, status, ...)
+        self.started = None
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.peak_rss_bytes = None
+        self.error = None
+        self._start_wall = self._start_cpu = None
+        self._profiler = None
+
+    def _note_peak(self):
+        peak = peak_rss_bytes()
+        if peak is not None and (self.peak_rss_bytes is None or peak > self.peak_rss_bytes):
+            self.peak_rss_bytes = peak
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Times the code run inside the with block as (one run of) stage name."""
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats()
+        resettable = peak_rss_resettable()
+        if resettable:
+            self._note_peak() # The peak since the last reset still counts for the whole input.
+            reset_peak_rss()
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            wall_seconds = time.perf_counter() - start_wall
+            cpu_seconds = time.thread_time() - start_cpu
+            stats.add(wall_seconds, cpu_seconds, peak_rss_bytes=peak_rss_bytes() if resettable else None)
+
+    def iter_stage(self, name, iterable):
+        """Yields the items of iterable, timing the production of each one as stage name."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                item = next(iterator, _END)
+            if item is _END:
+                return
+            yield item
+
+    def add_stage(self, name, stats):
+        """Adds the totals of a stage timed elsewhere (a StageStats, e.g. from a worker process)."""
+        if name not in self.stages:
+            self.stages[name] = StageStats()
+        self.stages[name].add(stats.wall_seconds, stats.cpu_seconds, stats.calls, stats.peak_rss_bytes)
+
+    def __enter__(self):
+        self.started = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='milliseconds')
+        reset_peak_rss()
+        if self.cprofile_path is not None:
+            self._profiler = cProfile.Profile()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        if self._profiler is not None:
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._profiler is not None:
+            self._profiler.disable()
+        self.wall_seconds = time.perf_counter() - self._start_wall
+        self.cpu_seconds = time.process_time() - self._start_cpu
+        self._note_peak()
+        if exc_value is not None:
+            self.error = f"{exc_type.__name__}: {exc_value}"
+        if self._profiler is not None:
+            self._profiler.dump_stats(self.cprofile_path)
+            self._profiler = None
+
+    def to_dict(self):
+        return {
+            'converter': self.converter,
+            'input': self.input_path,
+            'output': self.output_path,
+            'started': self.started,
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'peak_rss_bytes': self.peak_rss_bytes,
+            'peak_rss_per_stage': peak_rss_resettable(),
+            'error': self.error,
+            **self.details,
+            'stages': {name: stats.to_dict() for name, stats in self.stages.items()},
+            'cprofile': os.path.basename(self.cprofile_path) if self.cprofile_path else None,
+            'environment': {'python': platform.python_version(), 'platform': platform.platform(), 'pid': os.getpid()},
+        }
+
+    def write_report(self, path):
+        """Writes the profile as JSON to path (replacing it in one step)."""
+        partial_path = path + ".part"
+        with open(partial_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+            f.write("\n")
+        os.replace(partial_path, path)
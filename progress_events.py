@@ -0,0 +1,132 @@
+import json
+import time
+
+# --- Progress and metrics events ---
+# Besides the free-text status_callback, the converters can report what they are doing as
+# ProgressEvent objects passed to a progress_callback. Every event has a kind (one of the
+# constants below), a timestamp and the fields listed next to its kind.
+
+FILES_DISCOVERED = 'files_discovered' # input_dir, found, to_convert, skipped
+FILE_STARTED = 'file_started'         # path
+LAYERS_FOUND = 'layers_found'         # path, layers
+LAYER_PROGRESS = 'layer_progress'     # path, layer, features_total, features_read, vertices
+LAYER_FINISHED = 'layer_finished'     # path, layer, features, vertices, read_seconds, build_seconds, serialize_seconds,
+                                      # error (None, or why the layer was skipped part-way or entirely)
+FILE_FINISHED = 'file_finished'       # path, output_path, status ('converted', 'empty', 'failed' or 'cancelled'),
+                                      # points_written, bytes_written, seconds, read_seconds, build_seconds, serialize_seconds
+RUN_FINISHED = 'run_finished'         # converted, skipped, failed, cancelled, seconds
+
+# Stages timed for every layer:
+#   read      - getting point rows out of the GDB (fiona or the columnar reader)
+#   build     - turning rows into CgPoint attributes (oID, default names)
+#   serialize - formatting and writing the XML text
+STAGES = ('read', 'build', 'serialize')
+
+
+class ProgressEvent:
+    """One progress/metrics event: its kind, when it happened and its fields."""
+
+    __slots__ = ('kind', 'timestamp', 'data')
+
+    def __init__(self, kind, **data):
+        self.kind = kind
+        self.timestamp = time.time()
+        self.data = data
+
+    def to_dict(self):
+        return {'event': self.kind, 'timestamp': self.timestamp, **self.data}
+
+    def __repr__(self):
+        return f"ProgressEvent({self.kind!r}, {self.data!r})"
+
+def emit_event(progress_callback, kind, **data):
+    """Sends an event to progress_callback, if there is one."""
+    if progress_callback is not None:
+        progress_callback(ProgressEvent(kind, **data))
+
+class LayerMetrics:
+    """Counts and stage times of the layer currently being converted, and the error that stopped it, if any."""
+
+    __slots__ = ('features_total', 'features_read', 'vertices', 'read_seconds', 'build_seconds', 'serialize_seconds', 'error')
+
+    def __init__(self):
+        self.features_total = None
+        self.features_read = 0
+        self.vertices = 0
+        self.read_seconds = 0.0
+        self.build_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.error = None
+
+    def stage_seconds(self):
+        return {f"{stage}_seconds": getattr(self, f"{stage}_seconds") for stage in STAGES}
+
+class ProgressTracker:
+    """
+    Follows an event stream and works out how much of the run is done.
+
+    Each file to convert counts equally; within a file each layer counts equally, and
+    the current layer advances with the share of its features read so far.
+    """
+
+    def __init__(self):
+        self.files_total = 0
+        self.files_done = 0
+        self.finished = False
+        self._files = {} # path -> [layers_total, layers_done, fraction of the current layer]
+
+    def handle(self, event):
+        data = event.data
+        if event.kind == FILES_DISCOVERED:
+            self.files_total = data['to_convert']
+        elif event.kind == LAYERS_FOUND:
+            self._files[data['path']] = [len(data['layers']), 0, 0.0]
+        elif event.kind == LAYER_PROGRESS:
+            file_state = self._files.get(data['path'])
+            if file_state is not None and data['features_total']:
+                file_state[2] = min(1.0, data['features_read'] / data['features_total'])
+        elif event.kind == LAYER_FINISHED:
+            file_state = self._files.get(data['path'])
+            if file_state is not None:
+                file_state[1] += 1
+                file_state[2] = 0.0
+        elif event.kind == FILE_FINISHED and data['status'] != 'cancelled':
+            # A cancelled file keeps the progress it had reached.
+            self._files.pop(data['path'], None)
+            self.files_done += 1
+        elif event.kind == RUN_FINISHED and not data.get('cancelled'):
+            self.finished = True
+
+    def fraction(self):
+        """Fraction of the run completed, from 0.0 to 1.0."""
+        if self.finished:
+            return 1.0
+        if not self.files_total:
+            return 0.0
+        in_progress = sum(
+            min(1.0, (layers_done + layer_fraction) / layers_total)
+            for layers_total, layers_done, layer_fraction in self._files.values() if layers_total
+        )
+        return min(1.0, (self.files_done + in_progress) / self.files_total)
+
+class JsonLinesMetricsWriter:
+    """
+    progress_callback that appends every event as one JSON object per line, e.g. for
+    a monitoring agent tailing the file. Each line is flushed as soon as it is written.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def __call__(self, event):
+        self._file.write(json.dumps(event.to_dict()) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,173 @@
+import json
+import os
+import sys
+
+# --- PROJ_LIB discovery ---
+# fiona/GDAL need PROJ's proj.db, which is not always found on its own inside a venv or a
+# PyInstaller bundle. Probing for it means several stat calls and possibly importing pyproj,
+# so the directory that worked is cached on disk and only re-checked (one stat) next time.
+# Nothing here runs on import: the converters call import_fiona() right before the first
+# conversion, which keeps the GUI and the command-line tools quick to start.
+
+CACHE_VERSION = 1
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Potential locations for proj.db relative to a base directory (like .venv or python install dir)
+# Order matters: more specific/standard paths first
+proj_relative_paths = [
+    os.path.join('Lib', 'site-packages', 'pyproj', 'proj_dir', 'share', 'proj'), # Standard for venv
+    os.path.join('Lib', 'site-packages', 'pyproj', 'data'), # Another common one for pyproj data
+    os.path.join('share', 'proj') # General system-like path or older venv structure
+]
+
+_fiona = None
+
+
+def _is_frozen():
+    return getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS')
+
+def _has_proj_db(path):
+    return bool(path) and os.path.exists(os.path.join(path, 'proj.db'))
+
+def cache_path():
+    """Location of the cached PROJ_LIB, in the per-user cache directory."""
+    if os.name == 'nt':
+        cache_root = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        cache_root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_root, 'xml-to-gdb-script', 'proj_lib.json')
+
+def _cache_context():
+    # A cached path is only reused by the same interpreter running the same copy of the scripts.
+    return {'version': CACHE_VERSION, 'executable': sys.executable, 'script_dir': script_dir}
+
+def _read_cached_proj_lib():
+    try:
+        with open(cache_path(), 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get('context') != _cache_context() or not _has_proj_db(cached.get('proj_lib')):
+        return None
+    return cached['proj_lib']
+
+def _write_cached_proj_lib(proj_lib_path):
+    path = cache_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = path + ".tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump({'context': _cache_context(), 'proj_lib': proj_lib_path}, f)
+        os.replace(temporary_path, path)
+    except OSError:
+        pass # Caching is only an optimisation.
+
+def _probe_proj_lib(status_callback):
+    """The full search: PyInstaller bundle, .venv/interpreter locations, then pyproj.datadir."""
+    # Check if running in a PyInstaller bundle
+    if _is_frozen():
+        # The data is bundled to 'pyproj/proj_dir/share/proj' relative to sys._MEIPASS
+        bundled_proj_path = os.path.join(sys._MEIPASS, 'pyproj', 'proj_dir', 'share', 'proj')
+        # Fallback for older pyproj versions that might place data directly in _MEIPASS/pyproj/data
+        bundled_proj_path_alt = os.path.join(sys._MEIPASS, 'pyproj', 'data')
+        for candidate in (bundled_proj_path, bundled_proj_path_alt):
+            if _has_proj_db(candidate):
+                status_callback(f"PROJ_LIB successfully set from PyInstaller bundle: {candidate}")
+                return candidate
+        status_callback(f"Warning: Running in PyInstaller bundle, but 'proj.db' not found at expected bundled paths:"
+                        f" {os.path.join(bundled_proj_path, 'proj.db')} or {os.path.join(bundled_proj_path_alt, 'proj.db')}")
+
+    # Bases to check:
+    # 1. .venv in the script's directory
+    # 2. .venv in the parent of the script's directory (if script is in a subdir like 'src')
+    # 3. The directory derived from sys.executable (covers global python or activated venv)
+    potential_bases = [
+        os.path.join(script_dir, '.venv'),
+        os.path.join(os.path.dirname(script_dir), '.venv'),
+        os.path.dirname(os.path.dirname(sys.executable))
+    ]
+    # Normalize, remove duplicates, and ensure they are absolute paths
+    potential_bases = sorted(list(set(os.path.abspath(p) for p in potential_bases)))
+
+    for base_path in potential_bases:
+        for rel_path in proj_relative_paths:
+            candidate_proj_lib_path = os.path.join(base_path, rel_path)
+            if _has_proj_db(candidate_proj_lib_path):
+                status_callback(f"PROJ_LIB successfully set to: {candidate_proj_lib_path}")
+                return candidate_proj_lib_path
+
+    # Fallback: try to use pyproj.datadir.get_data_dir()
+    try:
+        # Import pyproj here, only if needed, to avoid issues if it's not installed
+        # or if its import itself triggers PROJ errors without PROJ_LIB
+        import pyproj
+        pyproj_datadir = pyproj.datadir.get_data_dir()
+        if _has_proj_db(pyproj_datadir):
+            status_callback(f"PROJ_LIB set using pyproj.datadir: {pyproj_datadir}")
+            return pyproj_datadir
+        elif pyproj_datadir:
+            status_callback(f"pyproj.datadir.get_data_dir() ({pyproj_datadir}) found, but 'proj.db' not in this directory.")
+        else:
+            status_callback("pyproj.datadir.get_data_dir() did not return a valid path.")
+    except ImportError:
+        status_callback("pyproj module not found. Cannot use pyproj.datadir to find PROJ_LIB.")
+    except Exception as e:
+        status_callback(f"Error trying to use pyproj.datadir: {e}")
+
+    # Only print these detailed warnings if not running bundled,
+    # as the bundled check has its own warning.
+    if not _is_frozen():
+        venv_path_from_sys = os.path.dirname(os.path.dirname(sys.executable))
+        original_sys_attempt_path1 = os.path.join(venv_path_from_sys, 'Lib', 'site-packages', 'pyproj', 'proj_dir', 'share', 'proj')
+        original_sys_attempt_path2 = os.path.join(venv_path_from_sys, 'share', 'proj')
+
+        script_venv_attempt_path1 = os.path.join(script_dir, '.venv', 'Lib', 'site-packages', 'pyproj', 'proj_dir', 'share', 'proj')
+        script_venv_attempt_path2 = os.path.join(script_dir, '.venv', 'share', 'proj')
+
+        status_callback(f"Warning: Could not automatically find and set PROJ_LIB. PROJ errors may persist.")
+        status_callback(f"  Checked common locations based on script path ({script_dir}) and Python executable ({sys.executable}).")
+        status_callback(f"  Examples of paths derived from sys.executable ({sys.executable}):")
+        status_callback(f"    - {original_sys_attempt_path1}")
+        status_callback(f"    - {original_sys_attempt_path2}")
+        status_callback(f"  Examples of paths derived from .venv relative to script ({script_dir}):")
+        status_callback(f"    - {script_venv_attempt_path1}")
+        status_callback(f"    - {script_venv_attempt_path2}")
+        status_callback(f"  Also attempted to use pyproj.datadir.get_data_dir().")
+        status_callback("  Please ensure 'proj.db' is accessible and PROJ_LIB is set correctly, or that 'pyproj' is installed with its data files in a standard location.")
+        status_callback("  You might need to manually find 'proj.db' in your environment and set the PROJ_LIB environment variable before running the script.")
+    return None
+
+def ensure_proj_lib(status_callback=print):
+    """
+    Sets the PROJ_LIB environment variable to a directory containing proj.db.
+
+    The cached directory from an earlier run is used when it is still valid; otherwise
+    the full search runs and its result is cached.
+
+    Returns:
+        str: The PROJ_LIB directory, or None if proj.db could not be found.
+    """
+    proj_lib_path = _read_cached_proj_lib()
+    if proj_lib_path is None:
+        proj_lib_path = _probe_proj_lib(status_callback)
+        if proj_lib_path is not None:
+            _write_cached_proj_lib(proj_lib_path)
+    if proj_lib_path is not None:
+        os.environ['PROJ_LIB'] = proj_lib_path
+    return proj_lib_path
+
+def import_fiona(status_callback=print):
+    """
+    Imports fiona (and with it GDAL) on first use, after PROJ_LIB has been set up.
+
+    Returns:
+        module: The fiona module.
+    """
+    global _fiona
+    if _fiona is None:
+        ensure_proj_lib(status_callback)
+        # Imports that depend on PROJ_LIB being potentially set
+        import fiona
+        _fiona = fiona
+    return _fiona
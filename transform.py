@@ -1,304 +1,746 @@
 import os
-import sys
+import re
 import shutil
-
-# --- BEGIN PROJ_LIB FIX ---
-# Attempt to set PROJ_LIB based on script location and common venv structure
-proj_lib_found = False
-# Determine the directory of the current script
-# This is crucial for finding .venv if it's relative to the script
-script_dir = os.path.dirname(os.path.abspath(__file__))
-
-# Potential locations for proj.db relative to a base directory (like .venv or python install dir)
-# Order matters: more specific/standard paths first
-proj_relative_paths = [
-    os.path.join('Lib', 'site-packages', 'pyproj', 'proj_dir', 'share', 'proj'), # Standard for venv
-    os.path.join('Lib', 'site-packages', 'pyproj', 'data'), # Another common one for pyproj data
-    os.path.join('share', 'proj') # General system-like path or older venv structure
-]
-
-# Bases to check:
-# 1. .venv in the script's directory
-# 2. .venv in the parent of the script's directory (if script is in a subdir like 'src')
-# 3. The directory derived from sys.executable (covers global python or activated venv)
-potential_bases = [
-    os.path.join(script_dir, '.venv'),
-    os.path.join(os.path.dirname(script_dir), '.venv'), # e.g. if script is in src/ and .venv is in project root
-    os.path.dirname(os.path.dirname(sys.executable))
-]
-# Normalize, remove duplicates, and ensure they are absolute paths
-potential_bases = sorted(list(set(os.path.abspath(p) for p in potential_bases)))
-
-for base_path in potential_bases:
-    if proj_lib_found:
-        break
-    for rel_path in proj_relative_paths:
-        candidate_proj_lib_path = os.path.join(base_path, rel_path)
-        # Check if proj.db exists in this candidate path
-        if os.path.exists(os.path.join(candidate_proj_lib_path, 'proj.db')):
-            os.environ['PROJ_LIB'] = candidate_proj_lib_path
-            print(f"PROJ_LIB successfully set to: {candidate_proj_lib_path}")
-            proj_lib_found = True
-            break
-
-if not proj_lib_found:
-    # Fallback: try to use pyproj.datadir.get_data_dir()
-    # This needs pyproj to be importable.
-    try:
-        # Import pyproj here, only if needed, to avoid issues if it's not installed
-        # or if its import itself triggers PROJ errors without PROJ_LIB
-        import pyproj
-        pyproj_datadir = pyproj.datadir.get_data_dir()
-        if pyproj_datadir and os.path.exists(os.path.join(pyproj_datadir, 'proj.db')):
-            os.environ['PROJ_LIB'] = pyproj_datadir
-            print(f"PROJ_LIB set using pyproj.datadir: {pyproj_datadir}")
-            proj_lib_found = True
-        elif pyproj_datadir:
-            print(f"pyproj.datadir.get_data_dir() ({pyproj_datadir}) found, but 'proj.db' not in this directory.")
-        else:
-            print("pyproj.datadir.get_data_dir() did not return a valid path.")
-    except ImportError:
-        print("pyproj module not found. Cannot use pyproj.datadir to find PROJ_LIB.")
-    except Exception as e:
-        print(f"Error trying to use pyproj.datadir: {e}")
-
-if not proj_lib_found:
-    # Construct the paths that were previously being checked to inform the user
-    venv_path_from_sys = os.path.dirname(os.path.dirname(sys.executable))
-    original_sys_attempt_path1 = os.path.join(venv_path_from_sys, 'Lib', 'site-packages', 'pyproj', 'proj_dir', 'share', 'proj')
-    original_sys_attempt_path2 = os.path.join(venv_path_from_sys, 'share', 'proj')
-    
-    script_venv_attempt_path1 = os.path.join(script_dir, '.venv', 'Lib', 'site-packages', 'pyproj', 'proj_dir', 'share', 'proj')
-    script_venv_attempt_path2 = os.path.join(script_dir, '.venv', 'share', 'proj')
-
-    print(f"Warning: Could not automatically find and set PROJ_LIB. PROJ errors may persist.")
-    print(f"  Checked common locations based on script path ({script_dir}) and Python executable ({sys.executable}).")
-    print(f"  Examples of paths derived from sys.executable ({sys.executable}):")
-    print(f"    - {original_sys_attempt_path1}")
-    print(f"    - {original_sys_attempt_path2}")
-    print(f"  Examples of paths derived from .venv relative to script ({script_dir}):")
-    print(f"    - {script_venv_attempt_path1}")
-    print(f"    - {script_venv_attempt_path2}")
-    print(f"  Also attempted to use pyproj.datadir.get_data_dir().")
-    print("  Please ensure 'proj.db' is accessible and PROJ_LIB is set correctly, or that 'pyproj' is installed with its data files in a standard location.")
-    print("  You might need to manually find 'proj.db' in your environment and set the PROJ_LIB environment variable before running the script.")
-
-# --- END PROJ_LIB FIX ---
-
-# Imports that depend on PROJ_LIB being potentially set
+import time
+import argparse
+import functools
+import queue
+import threading
+import itertools
 import xml.etree.ElementTree as ET
-import fiona
+from proj_lib_setup import import_fiona # fiona/GDAL are imported on first use, after the PROJ_LIB setup
+from process_pool import run_in_process_pool
+from conversion_manifest import ConversionManifest
+from point_batch import PointBatch
+from compressed_files import decompression_errors, is_landxml_file, landxml_base_name, open_landxml
+from landxml_parsers import iter_cgpoint_runs
+from profiling import CPROFILE_SUFFIX, InputProfile, profile_report_path, stage
+from output_formats import DEFAULT_OUTPUT_FORMAT, OUTPUT_FORMATS, format_available, open_point_writer, output_path_for, remove_output
+
+# Number of CgPoints handed to the GDB writer per writerecords() call when streaming.
+DEFAULT_BATCH_SIZE = 10000
+
+# Parse the next batch in a background thread while the current one is written. Only worth it
+# with a spare core: parsing and the fiona writer otherwise just take turns on the same one.
+BACKGROUND_PARSING = (os.cpu_count() or 1) > 1
+
+# Attributes copied from each CgPoint, with the value used when the attribute is missing.
+# The keys double as the GDB field names.
+CGPOINT_ATTRIBUTE_DEFAULTS = {
+    'name': "",
+    'oID': "",
+    'code': "DefaultCode",
+    'desc': "",
+    'role': "surveyed",
+    'timeStamp': "",
+    'pointGeometry': "point",
+    'pntRef': "",
+    'solutionType': "unknown",
+    'surveyMethod': "",
+    'surveyOrder': "",
+    'class': "default",
+    'latitude': "0.0000000000",
+    'longitude': "0.0000000000",
+    'ellipsoidHeight': "0.000",
+}
+
+# Define the schema for the GDB layer - SIMPLIFIED FOR DEBUGGING
+CGPOINT_SCHEMA = {
+    'geometry': 'Point',  # Changed from PointZ to Point (2D)
+    'properties': {field_name: 'str' for field_name in CGPOINT_ATTRIBUTE_DEFAULTS},
+}
+
+# Merged GDBs (merge_landxml_files) record which file every point came from.
+SOURCE_FILE_FIELD = 'source_file'
+MERGED_SCHEMA = {
+    'geometry': 'Point',
+    'properties': {**CGPOINT_SCHEMA['properties'], SOURCE_FILE_FIELD: 'str'},
+}
+
+def iter_cgpoint_batches(xml_file_path, batch_size=DEFAULT_BATCH_SIZE, status_callback=print, parser_backend=None, profile=None):
+    """
+    Streams CgPoint data out of a LandXML file in PointBatch objects of up to batch_size points.
+
+    The file (plain, gzip or zstd compressed) is streamed through a parser backend (see
+    landxml_parsers.py), so no CgPoint is held in memory for long: only the coordinate
+    text and attributes of each one are kept, and these are parsed a whole batch at a
+    time. Only the first CgPoints element directly under the root is read (with the
+    LandXML-1.2 namespace or without any namespace), and parsing stops as soon as it is
+    closed.
+
+    Args:
+        xml_file_path (str): Path to the LandXML file, which may be compressed (see
+                             compressed_files.open_landxml).
+        batch_size (int): Maximum number of points per batch.
+        status_callback (function): Function to call for status updates.
+        parser_backend (str): 'lxml' or 'stdlib'; None uses lxml when it is installed.
+        profile (InputProfile): If given, reading and parsing the XML is timed as its
+                                'parse' stage and building the batches as 'build'.
+
+    Yields:
+        PointBatch: 2D points with the CGPOINT_ATTRIBUTE_DEFAULTS fields as attributes, for
+                    every CgPoint with parseable coordinates.
 
-print(f"Fiona supported drivers: {fiona.supported_drivers}") # Add this line to check drivers
+    Raises:
+        ET.ParseError: If the XML is malformed.
+        FileNotFoundError: If the XML file does not exist.
+        ImportError: If the file is zstd-compressed and zstandard is not installed.
+    """
+    with open_landxml(xml_file_path) as xml_file:
+        runs = iter_cgpoint_runs(xml_file, batch_size, status_callback, parser_backend)
+        if profile is not None:
+            runs = profile.iter_stage('parse', runs)
+        for texts, attribs in runs:
+            with stage(profile, 'build'):
+                batch = _build_cgpoint_batch(texts, attribs, status_callback)
+            if len(batch):
+                yield batch
+
+def iter_cgpoint_records(xml_file_path, status_callback=print):
+    """
+    Streams CgPoint data out of a LandXML file as fiona point records (see iter_cgpoint_batches).
+
+    Yields:
+        dict: A fiona record ({'geometry': ..., 'properties': ...}) for every CgPoint with
+              parseable coordinates.
+    """
+    for batch in iter_cgpoint_batches(xml_file_path, status_callback=status_callback):
+        yield from batch.iter_fiona_records()
+
+def _build_cgpoint_batch(texts, attribs, status_callback):
+    """
+    Turns the raw coordinate texts and attribute dicts of a run of CgPoints into a
+    PointBatch, parsing and encoding them column by column. CgPoints without usable
+    coordinates are reported and left out.
+    """
+    eastings, northings, failures = _parse_coordinate_pairs(texts)
+    if failures:
+        for index, error in failures:
+            name = attribs[index].get('name')
+            if error is None:
+                status_callback(f"Warning: No coordinate data for point {name}")
+            else:
+                status_callback(f"Warning: Could not parse coordinates for point {name}: {texts[index]}. Error: {error}")
+        failed = {index for index, _ in failures}
+        attribs = [attrib for index, attrib in enumerate(attribs) if index not in failed]
+    columns = [[attrib.get(field_name, default) for attrib in attribs]
+               for field_name, default in CGPOINT_ATTRIBUTE_DEFAULTS.items()]
+    # Elevation is not written (2D points)
+    return PointBatch.from_columns(CGPOINT_ATTRIBUTE_DEFAULTS, eastings, northings, None, columns)
 
-def create_gdb_from_landxml(xml_file_path, gdb_path, layer_name="CgPoints"):
+def _parse_coordinate_pairs(texts):
     """
-    Parses a LandXML file to extract CgPoint data and writes it to a File Geodatabase.
+    Parses the easting and northing (the first two numbers) of many CgPoint coordinate
+    texts at once.
+
+    When every text has the same number of values - the usual case - the texts are
+    joined and split once, checked to still line up text by text, and the two columns
+    are converted with one map(float) each. Otherwise (or if any value fails to convert)
+    the texts are parsed one by one, so only the bad ones are reported.
+
+    Args:
+        texts (list): Coordinate texts of the CgPoints (None or empty for points without
+                      coordinates).
+
+    Returns:
+        tuple: (eastings, northings, failures). eastings and northings hold the values of
+               the texts that parsed, in order. failures lists (index, error) for the
+               others; error is None when the text was empty.
+    """
+    if texts and all(texts):
+        width = len(texts[0].split())
+        if width >= 2:
+            # A separator token between texts shows up at every (width + 1)th position
+            # exactly when each text has width values.
+            tokens = " | ".join(texts).split()
+            if len(tokens) == len(texts) * (width + 1) - 1 and tokens[width::width + 1].count('|') == len(texts) - 1:
+                try:
+                    return list(map(float, tokens[0::width + 1])), list(map(float, tokens[1::width + 1])), []
+                except ValueError:
+                    pass
+
+    eastings = []
+    northings = []
+    failures = []
+    for index, coords_text in enumerate(texts):
+        if not coords_text:
+            failures.append((index, None))
+            continue
+        try:
+            parts = coords_text.split()
+            easting = float(parts[0])
+            northing = float(parts[1])
+        except (IndexError, ValueError) as e:
+            failures.append((index, e))
+            continue
+        eastings.append(easting)
+        northings.append(northing)
+    return eastings, northings, failures
+
+class ConversionError(Exception):
+    """Raised by create_gdb_from_landxml(..., raise_errors=True) when a file cannot be converted."""
+
+class ChunkWriteError(Exception):
+    """A batch of records could not be written to the GDB layer."""
+
+def _fail(message, status_callback, raise_errors):
+    status_callback(message)
+    if raise_errors:
+        raise ConversionError(message)
+    return 0
+
+def _iter_in_background(iterable, max_pending=2):
+    """
+    Runs an iterator in a background thread and yields its items here.
+
+    Up to max_pending items are produced ahead of the consumer, so the next chunk of
+    CgPoints is parsed while the current one is being written. Exceptions raised by the
+    iterator are re-raised in the consumer.
+    """
+    pending = queue.Queue(maxsize=max_pending)
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        pending.put((item, None), timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if stop.is_set():
+                    return
+            pending.put((done, None))
+        except BaseException as e:
+            pending.put((done, e))
+
+    producer = threading.Thread(target=produce, name="cgpoint-parser", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = pending.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        # Unblock the producer if the consumer stopped early (e.g. a write error).
+        stop.set()
+        producer.join()
+
+def create_gdb_from_landxml(xml_file_path, gdb_path, layer_name="CgPoints", batch_size=DEFAULT_BATCH_SIZE,
+                            status_callback=print, raise_errors=False, output_format=DEFAULT_OUTPUT_FORMAT,
+                            profile=False, cprofile=False):
+    """
+    Parses a LandXML file to extract CgPoint data and writes it to a File Geodatabase
+    (or another output format).
+
+    CgPoints are streamed from the XML and written in batches of batch_size records, so
+    peak memory does not depend on the number of points in the file. With
+    BACKGROUND_PARSING the next batch is parsed while the current one is written. If a
+    batch cannot be written, the error names the batch and its point range.
 
     Args:
         xml_file_path (str): Path to the LandXML file.
-        gdb_path (str): Path to the output File Geodatabase (.gdb folder).
+        gdb_path (str): Path to the output File Geodatabase (.gdb folder), or to the
+                        output file for other formats.
         layer_name (str): Name of the point layer to be created in the GDB.
+        batch_size (int): Number of points passed to the GDB writer at a time.
+        status_callback (function): Function to call for status updates.
+        raise_errors (bool): Raise ConversionError on failure instead of only reporting it
+                             through status_callback and returning 0.
+        output_format (str): Key of output_formats.OUTPUT_FORMATS: 'gdb', 'gpkg', 'fgb'
+                             or 'parquet'.
+        profile (bool): Time the parse, build and write stages (wall time, CPU time and
+                        peak memory) and write them to <input name>.profile.json next to
+                        the output (see profiling.py). Batches are then parsed in this
+                        thread, not in the background.
+        cprofile (bool): Also run the conversion under cProfile and dump the statistics
+                         to <input name>.prof next to the output (implies profile).
+
+    Returns:
+        int: Number of points written to the GDB (0 if nothing was written).
     """
+    if not (profile or cprofile):
+        return _create_gdb_from_landxml(xml_file_path, gdb_path, layer_name, batch_size, status_callback, raise_errors,
+                                        output_format)
+    output_dir = os.path.dirname(os.path.abspath(gdb_path))
+    input_profile = InputProfile(xml_file_path, gdb_path, 'landxml_to_gdb',
+                                 profile_report_path(xml_file_path, output_dir, CPROFILE_SUFFIX) if cprofile else None)
+    input_profile.details.update(output_format=output_format, points_written=0)
     try:
-        tree = ET.parse(xml_file_path)
-        root = tree.getroot()
-        print(f"XML Root tag: {root.tag}") # Print root tag
+        with input_profile:
+            points_written = _create_gdb_from_landxml(xml_file_path, gdb_path, layer_name, batch_size, status_callback,
+                                                      raise_errors, output_format, input_profile)
+        input_profile.details['points_written'] = points_written
+    finally:
+        report_path = profile_report_path(xml_file_path, output_dir)
+        try:
+            input_profile.write_report(report_path)
+            status_callback(f"Profile written to {report_path}")
+        except OSError as e:
+            status_callback(f"Warning: could not write profile {report_path}: {e}")
+    return points_written
+
+def _create_gdb_from_landxml(xml_file_path, gdb_path, layer_name, batch_size, status_callback, raise_errors, output_format,
+                             profile=None):
+    output_label = "GDB" if output_format == 'gdb' else f"{output_format} file"
+    existing_label = "GDB directory" if output_format == 'gdb' else output_label
+    if not format_available(output_format):
+        return _fail(f"Error: output format '{output_format}' needs packages that are not installed "
+                     f"({OUTPUT_FORMATS[output_format][2]}).", status_callback, raise_errors)
+
+    batches = iter_cgpoint_batches(xml_file_path, batch_size, status_callback, profile=profile)
+    if BACKGROUND_PARSING and profile is None:
+        batches = _iter_in_background(batches)
+    try:
+        first_batch = next(batches, None)
     except ET.ParseError as e:
-        print(f"Error parsing XML file: {e}")
-        return
+        return _fail(f"Error parsing XML file: {e}", status_callback, raise_errors)
     except FileNotFoundError:
-        print(f"Error: XML file not found at {xml_file_path}")
-        return
-
-    # Namespace for LandXML-1.2
-    ns = {'landxml': 'http://www.landxml.org/schema/LandXML-1.2'}
-    # Try to find CgPoints using the LandXML namespace first
-    cgpoints_element = root.find('landxml:CgPoints', ns)
-
-    # If not found with LandXML namespace, try without a namespace (common for simpler XMLs or different schemas)
-    if cgpoints_element is None:
-        # Attempt to find CgPoints without a namespace, which might occur if the default namespace is not explicitly declared for child elements
-        # or if the XML is not strictly adhering to namespace prefixes for all elements.
-        print("CgPoints element not found with explicit LandXML-1.2 namespace prefix. Trying to find 'CgPoints' using the declared default namespace...")
-        cgpoints_element = root.find('{http://www.landxml.org/schema/LandXML-1.2}CgPoints')
-
-    if cgpoints_element is None:
-        print("Still not found. Trying to find 'CgPoints' without any namespace qualification (less likely for LandXML but a fallback)...")
-        cgpoints_element = root.find('CgPoints') # Try finding CgPoints without namespace as a last resort
-
-    # If still not found, it might be under a different parent or Leica-specific structure
-    if cgpoints_element is None:
-        print("No CgPoints element found directly under the root (with or without LandXML namespace).")
-        # Placeholder for trying other common Leica structures if known, e.g. root.find('.//LeicaPointsContainer')
-        # For now, we'll just report it's not found and exit for this file.
-        return
-
-    print(f"Found CgPoints element: {cgpoints_element.tag}")
-
-    points_data = []
-    # Adjust findall to match how cgpoints_element was found
-    point_elements_to_search = cgpoints_element.findall('landxml:CgPoint', ns) if 'landxml' in ns and root.find('landxml:CgPoints', ns) is not None else cgpoints_element.findall('CgPoint')
-    
-    print(f"Found {len(point_elements_to_search)} CgPoint potential elements.")
-    
-    for i, cgpoint in enumerate(point_elements_to_search):
-        name = cgpoint.get('name')
-        oID = cgpoint.get('oID')
-        code = cgpoint.get('code')
-        desc = cgpoint.get('desc')
-        role = cgpoint.get('role')
-        timeStamp = cgpoint.get('timeStamp')
-        pointGeometry_xml = cgpoint.get('pointGeometry') # XML attribute name
-        pntRef = cgpoint.get('pntRef')
-        solutionType = cgpoint.get('solutionType')
-        surveyMethod = cgpoint.get('surveyMethod')
-        surveyOrder = cgpoint.get('surveyOrder')
-        class_val = cgpoint.get('class') # XML attribute name
-        latitude = cgpoint.get('latitude')
-        longitude = cgpoint.get('longitude')
-        ellipsoidHeight = cgpoint.get('ellipsoidHeight')
-        
-        coords_text = cgpoint.text
-        if i < 5: # Print details for the first 5 points for debugging
-            print(f"  Point {i+1}: Name='{name}', CoordsRaw='{coords_text}'")
-        
-        if coords_text:
-            try:
-                parts = coords_text.split()
-                easting = float(parts[0])
-                northing = float(parts[1])
-                points_data.append({
-                    'geometry': {'type': 'Point', 'coordinates': (easting, northing)}, # Removed elevation
-                    'properties': {
-                        'name': name if name is not None else "",
-                        'oID': oID if oID is not None else "",
-                        'code': code if code is not None else "DefaultCode",
-                        'desc': desc if desc is not None else "",
-                        'role': role if role is not None else "surveyed",
-                        'timeStamp': timeStamp if timeStamp is not None else "",
-                        'pointGeometry': pointGeometry_xml if pointGeometry_xml is not None else "point", # GDB field name
-                        'pntRef': pntRef if pntRef is not None else "",
-                        'solutionType': solutionType if solutionType is not None else "unknown",
-                        'surveyMethod': surveyMethod if surveyMethod is not None else "",
-                        'surveyOrder': surveyOrder if surveyOrder is not None else "",
-                        'class': class_val if class_val is not None else "default", # GDB field name
-                        'latitude': latitude if latitude is not None else "0.0000000000",
-                        'longitude': longitude if longitude is not None else "0.0000000000",
-                        'ellipsoidHeight': ellipsoidHeight if ellipsoidHeight is not None else "0.000",
-                    }
-                })
-            except (IndexError, ValueError) as e:
-                print(f"Warning: Could not parse coordinates for point {name}: {coords_text}. Error: {e}")
-        else:
-            print(f"Warning: No coordinate data for point {name}")
+        return _fail(f"Error: XML file not found at {xml_file_path}", status_callback, raise_errors)
+    except ImportError as e:
+        return _fail(f"Error: {e}", status_callback, raise_errors)
+    except decompression_errors() as e:
+        return _fail(f"Error decompressing XML file: {e}", status_callback, raise_errors)
 
-    if not points_data:
-        print("No valid point data extracted from the XML.")
-        return
+    if not first_batch:
+        status_callback("No valid point data extracted from the XML.")
+        return 0
 
-    # Define the schema for the GDB layer - SIMPLIFIED FOR DEBUGGING
     crs = 'EPSG:28992' 
-    schema = {
-        'geometry': 'Point',  # Changed from PointZ to Point (2D)
-        'properties': {
-            'name': 'str', # Simplified to only name
-            'oID': 'str',
-            'code': 'str',
-            'desc': 'str',
-            'role': 'str',
-            'timeStamp': 'str',
-            'pointGeometry': 'str', # GDB field name
-            'pntRef': 'str',
-            'solutionType': 'str',
-            'surveyMethod': 'str',
-            'surveyOrder': 'str',
-            'class': 'str', # GDB field name
-            'latitude': 'str',
-            'longitude': 'str',
-            'ellipsoidHeight': 'str',
-        }
+
+    # Ensure the target output is removed if it exists, to avoid conflicts
+    if os.path.exists(gdb_path):
+        status_callback(f"Attempting to remove existing {existing_label}: {gdb_path}")
+        try:
+            remove_output(gdb_path)
+            status_callback(f"Successfully removed existing {existing_label}: {gdb_path}")
+        except Exception as e:
+            # Stop if we can't clean up
+            return _fail(f"Error removing existing {existing_label} {gdb_path}: {e}. "
+                         "Please check if the GDB is open in another application or if you have permissions.",
+                         status_callback, raise_errors)
+
+    points_written = 0
+    chunk_number = 0
+    try:
+        status_callback(f"Attempting to create {output_label}: {gdb_path} with layer: {layer_name}")
+        with stage(profile, 'write'):
+            dst = open_point_writer(output_format, gdb_path, layer_name, CGPOINT_SCHEMA, crs, status_callback)
+        try:
+            for chunk_number, batch in enumerate(itertools.chain([first_batch], batches), start=1):
+                try:
+                    with stage(profile, 'write'):
+                        dst.write(batch)
+                except Exception as e:
+                    first_name = batch.value(0, 'name')
+                    last_name = batch.value(-1, 'name')
+                    raise ChunkWriteError(
+                        f"chunk {chunk_number} (points {points_written + 1}-{points_written + len(batch)}, "
+                        f"names '{first_name}' to '{last_name}'): {e}"
+                    ) from e
+                points_written += len(batch)
+        finally:
+            with stage(profile, 'write'):
+                dst.close()
+    except ET.ParseError as e:
+        _remove_partial_gdb(gdb_path, status_callback)
+        return _fail(f"Error parsing XML file: {e}", status_callback, raise_errors)
+    except decompression_errors() as e:
+        _remove_partial_gdb(gdb_path, status_callback)
+        return _fail(f"Error decompressing XML file: {e}", status_callback, raise_errors)
+    except ChunkWriteError as e:
+        # Records of the failing chunk before the bad one are already in the layer.
+        _remove_partial_gdb(gdb_path, status_callback)
+        return _fail(f"Error writing to {output_label} in {e}", status_callback, raise_errors)
+    except Exception as e:
+        return _fail(f"Error writing to {output_label}: {e}", status_callback, raise_errors)
+    status_callback(f"Successfully created {output_label}: {gdb_path} with layer: {layer_name}")
+    status_callback(f"{points_written} points written.")
+    return points_written
+
+def _remove_partial_gdb(gdb_path, status_callback):
+    """Removes an output (GDB or file) left half-written by a failed streaming conversion."""
+    if os.path.exists(gdb_path):
+        try:
+            remove_output(gdb_path)
+            status_callback(f"Removed incomplete output: {gdb_path}")
+        except Exception as e:
+            status_callback(f"Could not remove incomplete output {gdb_path}: {e}")
+
+def find_landxml_files(input_dir):
+    """Returns the paths of all LandXML files (.xml, .xml.gz, .xml.zst) in input_dir and its subdirectories, in os.walk order."""
+    xml_file_paths = []
+    for root, dirs, files in os.walk(input_dir):
+        for filename in files:
+            if is_landxml_file(filename):
+                xml_file_paths.append(os.path.join(root, filename))
+    return xml_file_paths
+
+def convert_landxml_file(xml_file_path, gdb_path, layer_name, output_format=DEFAULT_OUTPUT_FORMAT, status_callback=print,
+                         profile=False, cprofile=False):
+    """
+    Converts one LandXML file and reports the outcome instead of raising. profile and
+    cprofile are passed on to create_gdb_from_landxml.
+
+    Returns:
+        dict: {'xml_path', 'gdb_path', 'points_written', 'duration', 'error', 'skipped'},
+              where duration is in seconds, error is None or the error message and
+              skipped is always False.
+    """
+    status_callback(f"--- Processing XML: {xml_file_path} ---")
+    status_callback(f"Output {'GDB' if output_format == 'gdb' else output_format} will be: {gdb_path}")
+    start_time = time.perf_counter()
+    points_written = 0
+    error = None
+    try:
+        points_written = create_gdb_from_landxml(xml_file_path, gdb_path, layer_name=layer_name,
+                                                 status_callback=status_callback, raise_errors=True,
+                                                 output_format=output_format, profile=profile, cprofile=cprofile)
+    except ConversionError as e:
+        error = str(e)
+    except Exception as e:
+        error = f"Unexpected error converting {xml_file_path}: {e}"
+        status_callback(error)
+    status_callback("-" * 40) # Separator for multiple files
+    return {
+        'xml_path': xml_file_path,
+        'gdb_path': gdb_path,
+        'points_written': points_written,
+        'duration': time.perf_counter() - start_time,
+        'error': error,
+        'skipped': False,
     }
 
-    # Ensure the target GDB directory is removed if it exists, to avoid conflicts
+def run_batch(input_dir, output_dir, jobs=1, layer_name="SurveyPoints", status_callback=print, force=False,
+              output_format=DEFAULT_OUTPUT_FORMAT, profile=False, cprofile=False):
+    """
+    Converts every LandXML file (.xml, .xml.gz or .xml.zst) under input_dir into
+    <xml name>.gdb (or the extension of output_format) in output_dir.
+
+    Args:
+        input_dir (str): Directory searched recursively for LandXML files.
+        output_dir (str): Directory where the GDBs are created.
+        jobs (int): Number of files converted at the same time, each in its own process.
+                    1 converts them one by one in this process; None uses one process
+                    per CPU core.
+        layer_name (str): Name of the point layer created in every GDB.
+        status_callback (function): Function to call for status updates.
+        force (bool): Convert every file, even those the output directory's manifest
+                      records as already converted and unchanged since.
+        output_format (str): Output format of every file (see create_gdb_from_landxml).
+        profile (bool): Write a <input name>.profile.json report with the stage times and
+                        peak memory of every file converted into output_dir.
+        cprofile (bool): Also dump cProfile statistics per file (<input name>.prof).
+
+    Returns:
+        list: One result dict per file (see convert_landxml_file), in the order the
+              files were found. Files skipped as unchanged have 'skipped' set to True
+              and the points_written of their earlier conversion.
+    """
+    # Ensure input directory exists
+    if not os.path.exists(input_dir):
+        os.makedirs(input_dir)
+        status_callback(f"Created input directory: {input_dir}. Please place XML files there.")
+
+    # Ensure output directory exists
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        status_callback(f"Created output directory: {output_dir}")
+
+    status_callback(f"Searching for XML files in: {input_dir}")
+    # Create GDB name from XML filename (e.g., input.xml -> input.gdb). Files with the same
+    # name in different subdirectories map to the same GDB; as in a sequential run, the
+    # last one found is the one that ends up in the output.
+    jobs_by_gdb = {}
+    for xml_file_path in find_landxml_files(input_dir):
+        xml_base_name = landxml_base_name(xml_file_path)
+        gdb_output_path = output_path_for(output_dir, xml_base_name, output_format)
+        if gdb_output_path in jobs_by_gdb:
+            status_callback(f"Warning: {jobs_by_gdb[gdb_output_path][0]} and {xml_file_path} both map to {gdb_output_path}; "
+                            f"only {xml_file_path} will be converted.")
+            del jobs_by_gdb[gdb_output_path]
+        jobs_by_gdb[gdb_output_path] = (xml_file_path, gdb_output_path, layer_name, output_format)
+    all_jobs = list(jobs_by_gdb.values())
+
+    # Inputs converted by an earlier run with the same settings are skipped unless forced.
+    manifest = ConversionManifest(output_dir)
+    settings = {'converter': 'landxml_to_gdb', 'layer_name': layer_name, 'output_format': output_format}
+    results_by_xml = {}
+    conversion_jobs = []
+    for job in all_jobs:
+        xml_file_path, gdb_output_path, _, _ = job
+        if not force and manifest.is_up_to_date(xml_file_path, gdb_output_path, settings):
+            status_callback(f"Skipping unchanged {xml_file_path} (already converted to {gdb_output_path}).")
+            results_by_xml[xml_file_path] = {
+                'xml_path': xml_file_path, 'gdb_path': gdb_output_path,
+                'points_written': manifest.get(gdb_output_path)['points_written'],
+                'duration': 0.0, 'error': None, 'skipped': True,
+            }
+        else:
+            conversion_jobs.append(job)
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(conversion_jobs))
+
+    try:
+        if jobs > 1:
+            status_callback(f"Converting {len(conversion_jobs)} XML file(s) with {jobs} worker processes.")
+            worker = functools.partial(convert_landxml_file, profile=profile, cprofile=cprofile)
+            for job, result, error in run_in_process_pool(worker, conversion_jobs, status_callback, jobs):
+                if error is not None:
+                    status_callback(f"Error: worker process failed while converting {job[0]}: {error}")
+                    result = {'xml_path': job[0], 'gdb_path': job[1], 'points_written': 0, 'duration': 0.0,
+                              'error': f"Worker process failed: {error}", 'skipped': False}
+                results_by_xml[job[0]] = result
+                _record_in_manifest(manifest, result, settings)
+        else:
+            for job in conversion_jobs:
+                result = convert_landxml_file(*job, status_callback=status_callback, profile=profile, cprofile=cprofile)
+                results_by_xml[job[0]] = result
+                _record_in_manifest(manifest, result, settings)
+    finally:
+        manifest.save()
+    results = [results_by_xml[job[0]] for job in all_jobs if job[0] in results_by_xml]
+
+    converted_count = sum(1 for result in results if result['points_written'] > 0 and not result['skipped'])
+    skipped_count = sum(1 for result in results if result['skipped'])
+    if not results:
+        status_callback(f"No XML files found in '{input_dir}' or its subdirectories.")
+    elif converted_count > 0:
+        status_callback(f"\nFinished processing. {converted_count} XML file(s) converted and saved to '{output_dir}'.")
+    elif skipped_count == 0:
+        status_callback(f"\nFinished processing. XML files were found, but none were successfully converted.")
+    if skipped_count:
+        status_callback(f"{skipped_count} unchanged XML file(s) skipped (use --force to convert them again).")
+    return results
+
+def _record_in_manifest(manifest, result, settings):
+    if result['error'] is None and result['points_written'] > 0:
+        try:
+            manifest.record(result['xml_path'], result['gdb_path'], settings, result['points_written'])
+        except OSError:
+            pass # Input vanished after conversion: it is simply converted again next time.
+
+def _source_layer_name(xml_file_path, used_layer_names):
+    """A valid GDB layer name (letters, digits, underscores; starting with a letter) for one source file, unique within the merge."""
+    base_name = re.sub(r'\W', '_', landxml_base_name(xml_file_path), flags=re.ASCII)
+    if not base_name[:1].isalpha():
+        base_name = f"L_{base_name}"
+    base_name = base_name[:150]
+    layer_name = base_name
+    suffix = 1
+    while layer_name.lower() in used_layer_names:
+        suffix += 1
+        layer_name = f"{base_name}_{suffix}"
+    used_layer_names.add(layer_name.lower())
+    return layer_name
+
+def _iter_merged_records(batch, source_file, seen_names, counts):
+    """Fiona records of a batch with their source file set, leaving out names already in seen_names (if not None)."""
+    for record in batch.iter_fiona_records():
+        properties = record['properties']
+        if seen_names is not None and properties['name']:
+            if properties['name'] in seen_names:
+                counts['duplicates'] += 1
+                continue
+            seen_names.add(properties['name'])
+        properties[SOURCE_FILE_FIELD] = source_file
+        counts['points_written'] += 1
+        yield record
+
+def merge_landxml_files(xml_file_paths, gdb_path, layer_name="SurveyPoints", layer_per_source=False, deduplicate=True,
+                        source_root=None, batch_size=DEFAULT_BATCH_SIZE, status_callback=print):
+    """
+    Writes the CgPoints of many LandXML files into one File Geodatabase.
+
+    With one layer, the GDB is opened once and every file's points are appended to it,
+    which avoids creating a dataset per file. With layer_per_source, each file gets its
+    own layer, named after the file. Either way every point has a source_file attribute.
+    An existing GDB at gdb_path is replaced.
+
+    Args:
+        xml_file_paths (list): LandXML files, merged in this order.
+        gdb_path (str): Path to the output File Geodatabase (.gdb folder).
+        layer_name (str): Name of the point layer (without layer_per_source).
+        layer_per_source (bool): Write one layer per source file instead of one layer.
+        deduplicate (bool): Keep only the first point with a given name, across all
+                            files (points without a name are always kept).
+        source_root (str): Directory source_file values are relative to (None = file name only).
+        batch_size (int): Number of points passed to the GDB writer at a time.
+        status_callback (function): Function to call for status updates.
+
+    Returns:
+        list: One result dict per file: {'xml_path', 'layer_name', 'points_written',
+              'duplicates', 'duration', 'error'}. A file that cannot be read has its
+              error set; points of it written before the error stay in the GDB.
+
+    Raises:
+        ConversionError: If the GDB cannot be created or written to. The incomplete
+                         GDB is removed.
+    """
     if os.path.exists(gdb_path):
-        print(f"Attempting to remove existing GDB directory: {gdb_path}")
+        status_callback(f"Attempting to remove existing GDB directory: {gdb_path}")
         try:
             shutil.rmtree(gdb_path)
-            print(f"Successfully removed existing GDB directory: {gdb_path}")
         except Exception as e:
-            print(f"Error removing existing GDB directory {gdb_path}: {e}. "
-                  "Please check if the GDB is open in another application or if you have permissions.")
-            return # Stop if we can't clean up
+            _fail(f"Error removing existing GDB directory {gdb_path}: {e}. "
+                  "Please check if the GDB is open in another application or if you have permissions.",
+                  status_callback, raise_errors=True)
 
+    fiona = import_fiona(status_callback)
+    seen_names = set() if deduplicate else None
+    used_layer_names = set()
+    results = []
+    dst = None
+    dst_layer = None
     try:
-        print(f"Attempting to create GDB: {gdb_path} with layer: {layer_name}")
-        # Added layer=layer_name and changed context variable to 'dst'
-        with fiona.open(gdb_path, 'w', driver='OpenFileGDB', schema=schema, crs=crs, layer=layer_name) as dst:
-            dst.writerecords(points_data)
-        print(f"Successfully created GDB: {gdb_path} with layer: {layer_name}")
-        print(f"{len(points_data)} points written.")
+        for xml_file_path in xml_file_paths:
+            source_file = os.path.relpath(xml_file_path, source_root) if source_root else os.path.basename(xml_file_path)
+            source_file = source_file.replace(os.sep, '/')
+            target_layer = _source_layer_name(xml_file_path, used_layer_names) if layer_per_source else layer_name
+            status_callback(f"--- Merging XML: {xml_file_path} into layer '{target_layer}' ---")
+            start_time = time.perf_counter()
+            counts = {'points_written': 0, 'duplicates': 0}
+            error = None
+            batches = iter_cgpoint_batches(xml_file_path, batch_size, status_callback)
+            if BACKGROUND_PARSING:
+                batches = _iter_in_background(batches)
+            try:
+                for batch in batches:
+                    if dst_layer != target_layer:
+                        # Opened on the first batch, so files without points add no layer.
+                        if dst is not None:
+                            dst.close()
+                        try:
+                            dst = fiona.open(gdb_path, 'w', driver='OpenFileGDB', schema=MERGED_SCHEMA, crs='EPSG:28992',
+                                             layer=target_layer)
+                        except Exception as e:
+                            raise ChunkWriteError(f"layer '{target_layer}': {e}") from e
+                        dst_layer = target_layer
+                    first_point = counts['points_written'] + counts['duplicates'] + 1
+                    try:
+                        dst.writerecords(_iter_merged_records(batch, source_file, seen_names, counts))
+                    except Exception as e:
+                        raise ChunkWriteError(f"points {first_point}-{first_point + len(batch) - 1} of {xml_file_path}: {e}") from e
+            except ET.ParseError as e:
+                error = f"Error parsing XML file: {e}"
+            except FileNotFoundError:
+                error = f"Error: XML file not found at {xml_file_path}"
+            except ImportError as e:
+                error = f"Error: {e}"
+            except decompression_errors() as e:
+                error = f"Error decompressing XML file {xml_file_path}: {e}"
+            except OSError as e:
+                error = f"Error reading XML file {xml_file_path}: {e}"
+            if error is not None:
+                status_callback(error)
+            status_callback(f"{counts['points_written']} points merged from {xml_file_path}"
+                            + (f", {counts['duplicates']} duplicate names skipped." if counts['duplicates'] else "."))
+            results.append({
+                'xml_path': xml_file_path,
+                'layer_name': target_layer,
+                'points_written': counts['points_written'],
+                'duplicates': counts['duplicates'],
+                'duration': time.perf_counter() - start_time,
+                'error': error,
+            })
+        if dst is not None:
+            dst.close()
     except Exception as e:
-        print(f"Error writing to GDB: {e}")
+        if dst is not None:
+            try:
+                dst.close()
+            except Exception:
+                pass
+        _remove_partial_gdb(gdb_path, status_callback)
+        prefix = "Error writing to GDB in " if isinstance(e, ChunkWriteError) else "Error writing to GDB: "
+        _fail(f"{prefix}{e}", status_callback, raise_errors=True)
+
+    total_points = sum(result['points_written'] for result in results)
+    if dst is None:
+        status_callback("No valid point data extracted from the XML files. GDB not created.")
+    else:
+        status_callback(f"Successfully merged {total_points} points from {len(results)} XML file(s) into {gdb_path}.")
+    return results
+
+def run_merge(input_dir, gdb_path, layer_name="SurveyPoints", layer_per_source=False, deduplicate=True, status_callback=print):
+    """
+    Merges every .xml, .xml.gz and .xml.zst file under input_dir (in sorted path order)
+    into one GDB, see merge_landxml_files. Unlike run_batch, the merged GDB is always rebuilt.
+
+    Returns:
+        list: One result dict per file (see merge_landxml_files).
+    """
+    xml_file_paths = sorted(find_landxml_files(input_dir))
+    if not xml_file_paths:
+        status_callback(f"No XML files found in '{input_dir}' or its subdirectories.")
+        return []
+    output_dir = os.path.dirname(os.path.abspath(gdb_path))
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        status_callback(f"Created output directory: {output_dir}")
+    status_callback(f"Merging {len(xml_file_paths)} XML file(s) from {input_dir} into {gdb_path}.")
+    return merge_landxml_files(xml_file_paths, gdb_path, layer_name=layer_name, layer_per_source=layer_per_source,
+                               deduplicate=deduplicate, source_root=input_dir, status_callback=status_callback)
 
 if __name__ == "__main__":
     # Get the directory of the current script
     script_dir = os.path.dirname(os.path.abspath(__file__))
 
-    # Define input directory for XML files relative to the script directory
+    # Default input directory for XML files relative to the script directory.
     # All .xml files in this directory and its subdirectories will be processed.
-    # You might need to create this folder and place your XML files there.
-    input_xml_dir = os.path.join(script_dir, "input_xmls") 
-    
-    # Define output directory for GDBs relative to the script directory
-    # GDBs will be created in this folder.
-    output_gdb_dir = os.path.join(script_dir, "output_gdbs")
-
-    # Ensure input directory exists
-    if not os.path.exists(input_xml_dir):
-        os.makedirs(input_xml_dir)
-        print(f"Created input directory: {input_xml_dir}. Please place XML files there.")
-
-    # Ensure output directory exists
-    if not os.path.exists(output_gdb_dir):
-        os.makedirs(output_gdb_dir)
-        print(f"Created output directory: {output_gdb_dir}")
+    default_input_xml_dir = os.path.join(script_dir, "input_xmls") 
+    # Default output directory for GDBs relative to the script directory.
+    default_output_gdb_dir = os.path.join(script_dir, "output_gdbs")
 
+    parser = argparse.ArgumentParser(description="Convert every LandXML file in a directory tree into a File Geodatabase.")
+    parser.add_argument("input_xml_dir", nargs="?", default=default_input_xml_dir,
+                        help=f"Directory searched recursively for .xml, .xml.gz and .xml.zst files (default: {default_input_xml_dir})")
+    parser.add_argument("output_gdb_dir", nargs="?", default=default_output_gdb_dir,
+                        help=f"Directory where GDBs are created (default: {default_output_gdb_dir})")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of files to convert in parallel worker processes (0 = one per CPU core, default: 1)")
     # Define the layer name within the GDB (can be constant for all GDBs)
-    output_layer_name = "SurveyPoints" 
+    parser.add_argument("--layer-name", default="SurveyPoints",
+                        help="Name of the point layer created in each GDB (default: SurveyPoints)")
+    parser.add_argument("--force", action="store_true",
+                        help="Convert every file, including those unchanged since they were last converted")
+    parser.add_argument("--format", choices=list(OUTPUT_FORMATS), default=DEFAULT_OUTPUT_FORMAT,
+                        help="Output format: " + ", ".join(f"{name} = {description}" for name, (_, _, description) in OUTPUT_FORMATS.items())
+                             + f" (default: {DEFAULT_OUTPUT_FORMAT})")
+    parser.add_argument("--merge", metavar="GDB_NAME",
+                        help="Merge all files into one GDB with this name in the output directory, instead of one GDB per file")
+    parser.add_argument("--layer-per-source", action="store_true",
+                        help="With --merge, write one layer per XML file (named after it) instead of one layer")
+    parser.add_argument("--keep-duplicates", action="store_true",
+                        help="With --merge, keep every point instead of only the first one with a given name")
+    parser.add_argument("--profile", action="store_true",
+                        help="Write the stage times and peak memory of every file to <input name>.profile.json in the output directory")
+    parser.add_argument("--cprofile", action="store_true",
+                        help="Also dump cProfile statistics of every file to <input name>.prof (implies --profile)")
+    args = parser.parse_args()
 
-    processed_files_count = 0
-    found_xml_files = False
-
-    print(f"Searching for XML files in: {input_xml_dir}")
-    for root, dirs, files in os.walk(input_xml_dir):
-        for filename in files:
-            if filename.lower().endswith(".xml"):
-                found_xml_files = True
-                xml_file_path = os.path.join(root, filename)
-                
-                # Create GDB name from XML filename (e.g., input.xml -> input.gdb)
-                xml_base_name = os.path.splitext(filename)[0]
-                gdb_name = f"{xml_base_name}.gdb"
-                gdb_output_path = os.path.join(output_gdb_dir, gdb_name)
-
-                print(f"--- Processing XML: {xml_file_path} ---")
-                print(f"Output GDB will be: {gdb_output_path}")
-                
-                create_gdb_from_landxml(xml_file_path, gdb_output_path, layer_name=output_layer_name)
-                processed_files_count += 1
-                
-                # Optional: Verification for each created GDB
-                # try:
-                #     with fiona.open(gdb_output_path, 'r', layer=output_layer_name) as source:
-                #         print(f"Verification: Found {len(list(source))} features in '{output_layer_name}' of {gdb_name}.")
-                # except Exception as e:
-                #     print(f"Could not verify GDB {gdb_name}: {e}")
-                print("-" * 40) # Separator for multiple files
-
-    if not found_xml_files:
-        print(f"No XML files found in '{input_xml_dir}' or its subdirectories.")
-    elif processed_files_count > 0:
-        print(f"\nFinished processing. {processed_files_count} XML file(s) converted and saved to '{output_gdb_dir}'.")
+    if args.merge and args.format != 'gdb':
+        parser.error("--merge only writes GDBs (--format gdb)")
+    if args.merge and (args.profile or args.cprofile):
+        parser.error("--profile is not available with --merge")
+    if args.merge:
+        merged_gdb_name = args.merge if args.merge.lower().endswith(".gdb") else f"{args.merge}.gdb"
+        try:
+            batch_results = run_merge(args.input_xml_dir, os.path.join(args.output_gdb_dir, merged_gdb_name),
+                                      layer_name=args.layer_name, layer_per_source=args.layer_per_source,
+                                      deduplicate=not args.keep_duplicates)
+        except ConversionError:
+            raise SystemExit(1)
     else:
-        print(f"\nFinished processing. XML files were found, but none were successfully converted.")
+        batch_results = run_batch(args.input_xml_dir, args.output_gdb_dir, jobs=args.jobs or None, layer_name=args.layer_name,
+                                  force=args.force, output_format=args.format, profile=args.profile, cprofile=args.cprofile)
+    for result in batch_results:
+        if result['error']:
+            print(f"FAILED {result['xml_path']}: {result['error']}")
@@ -1,238 +1,1333 @@
 import os
-import sys # Added for PROJ_LIB fix
-import xml.etree.ElementTree as ET
-import fiona # Added for listing layers
-from xml.dom import minidom
 import datetime # Added for timestamps
-import pyproj # Added for PROJ_LIB fix and PyInstaller
-
-# --- BEGIN PROJ_LIB FIX ---
-# Attempt to set PROJ_LIB based on script location and common venv structure
-proj_lib_found = False
-
-# Check if running in a PyInstaller bundle
-if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
-    # This is the path to the bundled 'proj' data folder
-    # The data is bundled to 'pyproj/proj_dir/share/proj' relative to sys._MEIPASS
-    bundled_proj_path = os.path.join(sys._MEIPASS, 'pyproj', 'proj_dir', 'share', 'proj')
-    if os.path.exists(os.path.join(bundled_proj_path, 'proj.db')):
-        os.environ['PROJ_LIB'] = bundled_proj_path
-        print(f"PROJ_LIB successfully set from PyInstaller bundle: {bundled_proj_path}")
-        proj_lib_found = True
-    else:
-        # Fallback for older pyproj versions that might place data directly in _MEIPASS/pyproj/data
-        bundled_proj_path_alt = os.path.join(sys._MEIPASS, 'pyproj', 'data')
-        if os.path.exists(os.path.join(bundled_proj_path_alt, 'proj.db')):
-            os.environ['PROJ_LIB'] = bundled_proj_path_alt
-            print(f"PROJ_LIB successfully set from PyInstaller bundle (alternative path): {bundled_proj_path_alt}")
-            proj_lib_found = True
-        else:
-            print(f"Warning: Running in PyInstaller bundle, but 'proj.db' not found at expected bundled paths:"
-                  f" {os.path.join(bundled_proj_path, 'proj.db')} or {os.path.join(bundled_proj_path_alt, 'proj.db')}")
-
-if not proj_lib_found:
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-
-    proj_relative_paths = [
-        os.path.join('Lib', 'site-packages', 'pyproj', 'proj_dir', 'share', 'proj'),
-        os.path.join('Lib', 'site-packages', 'pyproj', 'data'),
-        os.path.join('share', 'proj')
-    ]
-
-    potential_bases = [
-        os.path.join(script_dir, '.venv'),
-        os.path.join(os.path.dirname(script_dir), '.venv'),
-        os.path.dirname(os.path.dirname(sys.executable))
-    ]
-    potential_bases = sorted(list(set(os.path.abspath(p) for p in potential_bases)))
-
-    for base_path in potential_bases:
-        if proj_lib_found:
-            break
-        for rel_path in proj_relative_paths:
-            candidate_proj_lib_path = os.path.join(base_path, rel_path)
-            if os.path.exists(os.path.join(candidate_proj_lib_path, 'proj.db')):
-                os.environ['PROJ_LIB'] = candidate_proj_lib_path
-                print(f"PROJ_LIB successfully set to: {candidate_proj_lib_path}")
-                proj_lib_found = True
-                break
-
-if not proj_lib_found:
+import argparse
+import concurrent.futures
+import fnmatch
+import functools
+import io
+import itertools
+import json
+import pickle
+import tempfile
+import time
+from proj_lib_setup import import_fiona # fiona/GDAL are imported on first use, after the PROJ_LIB setup
+from process_pool import run_in_process_pool
+from conversion_manifest import ConversionManifest
+from compressed_files import COMPRESSIONS, compressed_path, compression_available, open_landxml_for_writing
+from point_batch import PointBatch
+from profiling import CPROFILE_SUFFIX, InputProfile, profile_report_path, stage
+from progress_events import (FILES_DISCOVERED, FILE_STARTED, LAYERS_FOUND, LAYER_PROGRESS, LAYER_FINISHED,
+                             FILE_FINISHED, RUN_FINISHED, STAGES, LayerMetrics, JsonLinesMetricsWriter, emit_event)
+
+# Optional columnar reader for line/polygon layers (pyogrio + pyarrow + shapely + numpy).
+# When any of them is missing, every layer is read feature by feature through fiona. They are
+# imported on first use (pyogrio loads GDAL), see _columnar_reader_available().
+np = pyarrow = shapely = open_arrow = None
+_columnar_reader_checked = False
+# Set to False to force the feature-by-feature path even when the columnar reader is installed.
+USE_COLUMNAR_READER = True
+
+
+LANDXML_NAMESPACE = "http://www.landxml.org/schema/LandXML-1.2"
+XSI_NAMESPACE = "http://www.w3.org/2001/XMLSchema-instance"
+# Output files are written through a large buffer so each CgPoint line does not hit the disk on its own.
+XML_WRITE_BUFFER_SIZE = 1024 * 1024
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="no" ?>\n'
+
+# Characters escaped in both attribute values and text, matching what minidom's
+# toprettyxml() produced before the writer became incremental.
+_XML_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'})
+
+class LandXMLStreamWriter:
+    """
+    Writes a LandXML document to a text file one element at a time.
+
+    Elements are indented two spaces per level, exactly like the previous
+    ET.tostring -> minidom.toprettyxml round trip, but nothing is kept in memory
+    apart from the stack of currently open tags.
+    """
+
+    def __init__(self, file_obj, indent="  ", open_tags=()):
+        """
+        Args:
+            file_obj (file): Text file to write to.
+            indent (str): Indentation per level.
+            open_tags (sequence): Tags already open in file_obj, outermost first, when
+                                  writing inside a document started elsewhere.
+        """
+        self._file = file_obj
+        self._indent = indent
+        self._open_tags = list(open_tags)
+
+    @property
+    def open_tags(self):
+        """The tags of the currently open elements, outermost first."""
+        return tuple(self._open_tags)
+
+    def _start_tag(self, tag, attrs):
+        if not attrs:
+            return f"{self._indent * len(self._open_tags)}<{tag}"
+        attr_text = " ".join(f'{key}="{str(value).translate(_XML_ESCAPES)}"' for key, value in attrs.items())
+        return f"{self._indent * len(self._open_tags)}<{tag} {attr_text}"
+
+    def write_declaration(self):
+        self._file.write(XML_DECLARATION)
+
+    def start_element(self, tag, attrs=None):
+        self._file.write(self._start_tag(tag, attrs) + ">\n")
+        self._open_tags.append(tag)
+
+    def end_element(self):
+        tag = self._open_tags.pop()
+        self._file.write(f"{self._indent * len(self._open_tags)}</{tag}>\n")
+
+    def empty_element(self, tag, attrs=None):
+        self._file.write(self._start_tag(tag, attrs) + "/>\n")
+
+    def text_element(self, tag, attrs, text):
+        self._file.write(f"{self._start_tag(tag, attrs)}>{text.translate(_XML_ESCAPES)}</{tag}>\n")
+
+    def write_cgpoint(self, attrs, text):
+        """Writes one <CgPoint> inside the currently open <CgPoints> element."""
+        self.text_element("CgPoint", attrs, text)
+
+    def close_all(self):
+        while self._open_tags:
+            self.end_element()
+
+def write_landxml_preamble(writer, gdb_base_name, current_date_str, current_time_str, current_timestamp_iso):
+    """
+    Writes the XML declaration, the LandXML root element and the Units, CoordinateSystem
+    and Application elements, and leaves an open <CgPoints> element ready for points.
+    """
+    writer.write_declaration()
+    writer.start_element("LandXML", {
+        "xmlns": LANDXML_NAMESPACE, "xmlns:xsi": XSI_NAMESPACE,
+        "date": current_date_str, "time": current_time_str, "version": "1.2",
+        "language": "English", "readOnly": "false",
+        "xsi:schemaLocation": f"{LANDXML_NAMESPACE} http://www.landxml.org/schema/LandXML-1.2/LandXML-1.2.xsd"
+    })
+    writer.start_element("Units")
+    writer.empty_element("Metric", {
+        "areaUnit": "squareMeter", "linearUnit": "meter", "volumeUnit": "cubicMeter",
+        "temperatureUnit": "celsius", "pressureUnit": "pascal", "diameterUnit": "meter",
+        "angularUnit": "decimal dd.mm.ss", "directionUnit": "decimal dd.mm.ss"
+    })
+    writer.end_element()
+    writer.empty_element("CoordinateSystem", {
+        "desc": "RD / NAP", "name": "RDNAP", "epsgCode": "28992+5709", 
+        "horizontalDatum": "Amersfoort", "verticalDatum": "NAP", "ellipsoidName": "Bessel 1841",
+        "horizontalCoordinateSystemName": "RD", "zone": "", "falseNorthing": "0", "falseEasting": "0",
+        "latitudeOfNaturalOrigin": "0", "longitudeOfNaturalOrigin": "0", "naturalOriginScaleFactor": "1"
+    })
+    writer.start_element("Application", {
+        "name": "Python GDB to LandXML Converter", "desc": f"Converted from GDB: {gdb_base_name}", 
+        "manufacturer": "Custom Script", "version": "1.1",
+        "manufacturerURL": "", "timeStamp": current_timestamp_iso
+    })
+    writer.empty_element("Author", {
+        "createdBy": "AutomatedProcess", "company": "N/A", 
+        "companyURL": "", "timeStamp": current_timestamp_iso
+    })
+    writer.end_element()
+    writer.start_element("CgPoints")
+
+# Attributes of a CgPoint row, in the order of its attribute tuple (see _iter_cgpoint_rows).
+CGPOINT_ROW_FIELDS = ('name', 'code', 'desc', 'pntRef', 'solutionType', 'surveyMethod', 'surveyOrder', 'class',
+                      'latitude', 'longitude', 'ellipsoidHeight')
+# Code of the CgPoints made from the vertices of lines and polygons, as opposed to points
+# read from a Point layer.
+DERIVED_VERTEX_CODE = "DerivedVertex"
+
+# --- Extraction filters ---
+# A filter is pushed down to the read: layers are selected by name before they are opened,
+# and the bounding box and attribute filter are handed to OGR (fiona's filter() or pyogrio's
+# open_arrow()), which answers the bounding box from the layer's spatial index. Features
+# outside the filter are never turned into Python objects.
+
+class ExtractionFilter:
+    """
+    Selects the layers and features convert_gdb_to_landxml extracts from a GDB.
+
+    Features are selected whole: every vertex of a line or polygon that intersects the
+    bounding box is extracted, including vertices that lie outside it.
+    """
+
+    __slots__ = ('bbox', 'include_layers', 'exclude_layers', 'where')
+
+    def __init__(self, bbox=None, include_layers=None, exclude_layers=None, where=None):
+        """
+        Args:
+            bbox (tuple): (xmin, ymin, xmax, ymax) in the layers' coordinate system; only
+                          features intersecting it are read. None = no spatial filter.
+            include_layers (list): Layer name patterns (fnmatch, case-insensitive, e.g.
+                                   'Survey*'); only matching layers are read. None = all.
+            exclude_layers (list): Layer name patterns of layers that are never read.
+            where (str): OGR SQL attribute filter, e.g. "code = 'TREE'". None = no filter.
+        """
+        if bbox is not None:
+            bbox = tuple(float(value) for value in bbox)
+            if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+                raise ValueError(f"bbox must be (xmin, ymin, xmax, ymax), got {bbox}")
+        self.bbox = bbox
+        self.include_layers = list(include_layers) if include_layers else None
+        self.exclude_layers = list(exclude_layers) if exclude_layers else None
+        self.where = where or None
+
+    def selects_layer(self, layer_name):
+        """Whether a layer passes the include and exclude patterns."""
+        name = layer_name.lower()
+        if self.include_layers is not None and not any(fnmatch.fnmatchcase(name, pattern.lower()) for pattern in self.include_layers):
+            return False
+        return not any(fnmatch.fnmatchcase(name, pattern.lower()) for pattern in self.exclude_layers or ())
+
+    def read_options(self):
+        """The bbox= and where= keyword arguments of the read; both fiona's filter() and pyogrio's open_arrow() take them."""
+        options = {}
+        if self.bbox is not None:
+            options['bbox'] = self.bbox
+        if self.where is not None:
+            options['where'] = self.where
+        return options
+
+    def settings(self):
+        """The filter as recorded in the conversion manifest; only the parts that are set."""
+        settings = {
+            'bbox': list(self.bbox) if self.bbox is not None else None,
+            'include_layers': self.include_layers,
+            'exclude_layers': self.exclude_layers,
+            'where': self.where,
+        }
+        return {key: value for key, value in settings.items() if value is not None}
+
+PROCESSABLE_SCHEMA_GEOM_TYPES = [
+    'Point', 'PointZ', 'PointM', '3D Point',
+    'LineString', '3D LineString', 'MultiLineString', '3D MultiLineString',
+    'Polygon', '3D Polygon', 'MultiPolygon', '3D MultiPolygon'
+]
+
+def _iter_feature_coords(actual_geom_type, raw_coords):
+    """Yields the coordinates to extract from one geometry, without closing ring vertices."""
+    if actual_geom_type == 'Point':
+        if raw_coords and isinstance(raw_coords, (list, tuple)) and len(raw_coords) >= 2:
+            yield raw_coords
+    elif actual_geom_type in ['LineString', '3D LineString']:
+        if raw_coords:
+            yield from raw_coords
+    elif actual_geom_type in ['MultiLineString', '3D MultiLineString']:
+        if raw_coords:
+            for line_coords in raw_coords: 
+                yield from line_coords
+    elif actual_geom_type in ['Polygon', '3D Polygon']:
+        if raw_coords:
+            for ring in raw_coords: 
+                yield from (ring[:-1] if len(ring) > 1 and tuple(ring[0]) == tuple(ring[-1]) else ring)
+    elif actual_geom_type in ['MultiPolygon', '3D MultiPolygon']:
+        if raw_coords:
+            for polygon_rings in raw_coords: 
+                for ring in polygon_rings: 
+                    yield from (ring[:-1] if len(ring) > 1 and tuple(ring[0]) == tuple(ring[-1]) else ring)
+
+def _iter_cgpoint_rows(features, layer_name, metrics):
+    """
+    Yields one CgPoint row per extracted point of the features of an open fiona layer
+    (the layer itself or a filter() of it).
+
+    A row holds everything about the point that does not depend on its oID:
+    (easting, northing, elevation, attributes), where attributes are the CGPOINT_ROW_FIELDS
+    values. name and desc are None when they default to Point_<oID> / Desc_<oID>, which
+    _write_cgpoint_rows fills in. This is the row layout of PointBatch.iter_rows().
+    metrics.features_read follows the features read so far.
+    """
+    for feature_idx, feature in enumerate(features):
+        metrics.features_read = feature_idx + 1
+        geom = feature.get('geometry')
+        if not geom:
+            continue
+
+        actual_geom_type = geom.get('type')
+        props = feature.get('properties', {})
+        is_point = actual_geom_type == 'Point'
+        if not is_point:
+            original_feature_id_str = str(feature.get('id', f"feat{feature_idx}"))
+            base_name_prop = props.get('name', f'Feat_{original_feature_id_str}')
+
+        vertex_in_feature_counter_for_name = 0
+        for coord_tuple in _iter_feature_coords(actual_geom_type, geom.get('coordinates')):
+            if not (isinstance(coord_tuple, (list, tuple)) and 2 <= len(coord_tuple) <= 3 and all(isinstance(c, (int, float)) for c in coord_tuple)):
+                continue
+
+            vertex_in_feature_counter_for_name += 1
+
+            easting = coord_tuple[0]
+            northing = coord_tuple[1]
+            elevation = coord_tuple[2] if len(coord_tuple) > 2 else 0.0
+
+            if is_point:
+                point_name_str = str(props['name']) if 'name' in props else None
+                point_code = str(props.get('code', 'DefaultCode'))
+                point_desc = str(props['description']) if 'description' in props else None
+                solution_type = str(props.get('solutionType', "unknown"))
+                survey_method = str(props.get('surveyMethod', ""))
+                class_val = str(props.get('class', "default"))
+            else: 
+                point_name_str = f"{base_name_prop}_L{layer_name[:8].replace(' ','_')}_V{vertex_in_feature_counter_for_name}"
+                point_code = DERIVED_VERTEX_CODE
+                point_desc = f"Vtx {vertex_in_feature_counter_for_name} of {base_name_prop} from Lyr {layer_name}"
+                solution_type = "derived_vertex"
+                survey_method = "extracted_from_geometry"
+                class_val = "derived_default"
+
+            yield easting, northing, elevation, (
+                point_name_str, point_code, point_desc, str(props.get('pntRef', "")),
+                solution_type, survey_method, str(props.get('surveyOrder', "")), class_val,
+                str(props.get('latitude', "0.0000000000")),
+                str(props.get('longitude', "0.0000000000")),
+                str(props.get('ellipsoidHeight', "0.000")),
+            )
+
+# Layer geometry types read through the columnar path when it is available.
+COLUMNAR_SCHEMA_GEOM_TYPES = [
+    'LineString', '3D LineString', 'MultiLineString', '3D MultiLineString',
+    'Polygon', '3D Polygon', 'MultiPolygon', '3D MultiPolygon'
+]
+# Attribute types whose Arrow values convert to the same Python values fiona returns.
+_COLUMNAR_FIELD_TYPES = ('str', 'int', 'int32', 'int64', 'float')
+# Attributes a derived vertex takes from its feature.
+_DERIVED_VERTEX_FIELDS = ('name', 'pntRef', 'surveyOrder', 'latitude', 'longitude', 'ellipsoidHeight')
+# Features per Arrow record batch on the columnar path.
+COLUMNAR_BATCH_SIZE = 65536
+
+# shapely.get_type_id codes
+_LINE_TYPE_IDS = (1, 5)     # LineString, MultiLineString
+_POLYGON_TYPE_IDS = (3, 6)  # Polygon, MultiPolygon
+
+def _columnar_reader_available():
+    """Imports the optional columnar reader packages once; returns whether all of them are installed."""
+    global np, pyarrow, shapely, open_arrow, _columnar_reader_checked
+    if not _columnar_reader_checked:
+        _columnar_reader_checked = True
+        try:
+            import numpy as np
+            import pyarrow
+            import shapely
+            from pyogrio.raw import open_arrow
+        except ImportError:
+            open_arrow = None
+    return open_arrow is not None
+
+def _columnar_reader_supports(schema):
+    """Whether a layer with this fiona schema can take the columnar path with identical output."""
+    if not (USE_COLUMNAR_READER and _columnar_reader_available()):
+        return False
+    if schema.get('geometry') not in COLUMNAR_SCHEMA_GEOM_TYPES:
+        return False
+    properties = schema.get('properties', {})
+    return all(
+        properties[field_name].split(':')[0] in _COLUMNAR_FIELD_TYPES
+        for field_name in _DERIVED_VERTEX_FIELDS if field_name in properties
+    )
+
+def _iter_cgpoint_rows_columnar(gdb_path, layer_name, schema, metrics, read_options=None):
+    """
+    Columnar equivalent of _iter_cgpoint_rows for line and polygon layers.
+
+    Features are read as Arrow record batches through pyogrio (filtered by read_options, see
+    ExtractionFilter.read_options()), and each batch's geometries
+    are flattened into one coordinate array with shapely. Closing ring vertices, vertex
+    numbers, names and descriptions are then computed for the whole batch at once instead
+    of per coordinate. Yields exactly the rows _iter_cgpoint_rows would.
+    """
+    properties = schema.get('properties', {})
+    columns = [field_name for field_name in _DERIVED_VERTEX_FIELDS if field_name in properties]
+    layer_tag = layer_name[:8].replace(' ', '_')
+
+    with open_arrow(gdb_path, layer=layer_name, columns=columns, return_fids=True,
+                    batch_size=COLUMNAR_BATCH_SIZE, use_pyarrow=True, **(read_options or {})) as (meta, reader):
+        fid_column = meta.get('fid_column') or 'OGC_FID'
+        geometry_column = meta.get('geometry_name') or 'wkb'
+
+        for batch in reader:
+            metrics.features_read += batch.num_rows
+            geoms = shapely.from_wkb(batch.column(geometry_column).to_numpy(zero_copy_only=False))
+            present = ~shapely.is_missing(geoms)
+            if not present.any():
+                continue
+            feature_positions = np.flatnonzero(present)
+            geoms = geoms[present]
+
+            type_ids = shapely.get_type_id(geoms)
+            if np.isin(type_ids, _POLYGON_TYPE_IDS).all():
+                parts, part_feature = shapely.get_parts(geoms, return_index=True)
+                sequences, sequence_part = shapely.get_rings(parts, return_index=True)
+                sequence_feature = part_feature[sequence_part]
+                strip_closing_vertex = True
+            elif np.isin(type_ids, _LINE_TYPE_IDS).all():
+                sequences, sequence_feature = shapely.get_parts(geoms, return_index=True)
+                strip_closing_vertex = False
+            else:
+                # File geodatabase feature classes hold a single geometry family.
+                raise ValueError(f"mixed geometry types in layer '{layer_name}'")
+
+            coords, coord_sequence = shapely.get_coordinates(sequences, include_z=True, return_index=True)
+            coords[~shapely.has_z(sequences)[coord_sequence], 2] = 0.0
+
+            if strip_closing_vertex and len(coords):
+                counts = np.bincount(coord_sequence, minlength=len(sequences))
+                ends = np.cumsum(counts)
+                candidates = np.flatnonzero(counts > 1)
+                firsts = coords[ends[candidates] - counts[candidates]]
+                lasts = coords[ends[candidates] - 1]
+                closed = candidates[(firsts == lasts).all(axis=1)]
+                keep = np.ones(len(coords), dtype=bool)
+                keep[ends[closed] - 1] = False
+                coords = coords[keep]
+                coord_sequence = coord_sequence[keep]
+            if not len(coords):
+                continue
+
+            coord_feature = sequence_feature[coord_sequence]
+            # Vertices of a feature are contiguous, so a vertex's number is its offset from
+            # the first vertex of the same feature.
+            vertex_numbers = (np.arange(len(coord_feature)) - np.searchsorted(coord_feature, coord_feature) + 1).astype(str)
+
+            fids = batch.column(fid_column).take(feature_positions).to_pylist()
+            field_values = {
+                field_name: batch.column(field_name).take(feature_positions).to_pylist()
+                for field_name in columns
+            }
+            if 'name' in field_values:
+                base_names = [f"{base_name_prop}" for base_name_prop in field_values['name']]
+            else:
+                base_names = [f"Feat_{fid}" for fid in fids]
+
+            def per_vertex(values):
+                return np.array(values, dtype=object)[coord_feature]
+
+            def per_vertex_str(field_name, default):
+                if field_name not in field_values:
+                    return itertools.repeat(default)
+                return per_vertex([str(value) for value in field_values[field_name]])
+
+            name_prefixes = np.array([f"{base_name}_L{layer_tag}_V" for base_name in base_names])
+            desc_suffixes = np.array([f" of {base_name} from Lyr {layer_name}" for base_name in base_names])
+            names = np.char.add(name_prefixes[coord_feature], vertex_numbers).tolist()
+            descs = np.char.add(np.char.add("Vtx ", vertex_numbers), desc_suffixes[coord_feature]).tolist()
+
+            yield from zip(
+                coords[:, 0].tolist(), coords[:, 1].tolist(), coords[:, 2].tolist(),
+                zip(
+                    names, itertools.repeat(DERIVED_VERTEX_CODE), descs, per_vertex_str('pntRef', ""),
+                    itertools.repeat("derived_vertex"), itertools.repeat("extracted_from_geometry"),
+                    per_vertex_str('surveyOrder', ""), itertools.repeat("derived_default"),
+                    per_vertex_str('latitude', "0.0000000000"),
+                    per_vertex_str('longitude', "0.0000000000"),
+                    per_vertex_str('ellipsoidHeight', "0.000"),
+                ),
+            )
+
+# --- Shared vertices ---
+# Neighbouring parcels and connected lines share vertices, so every feature would write its
+# own CgPoint at the same position. With a vertex tolerance, the derived vertices of a GDB
+# (all layers) go through a hash index over their snapped coordinates: the first vertex at a
+# position is written, and later ones are merged into it and only listed as its members.
+# Points from Point layers are surveyed points and are always written as they are, even on
+# top of a vertex.
+
+# Snapping grid of the vertex index; CgPoint coordinates are written with three decimals.
+DEFAULT_VERTEX_TOLERANCE = 0.001
+
+class VertexIndex:
+    """
+    Hash index of the derived vertices written for one GDB, keyed by their coordinates
+    snapped to a grid of tolerance-sized cells (easting, northing and elevation). Vertices
+    in the same cell are one vertex, which keeps the names of all vertices merged into it.
+    """
+
+    def __init__(self, tolerance=DEFAULT_VERTEX_TOLERANCE):
+        """
+        Args:
+            tolerance (float): Grid cell size; 0 only merges points with equal coordinates.
+        """
+        if tolerance < 0:
+            raise ValueError(f"vertex tolerance must not be negative, got {tolerance}")
+        self.tolerance = tolerance
+        self._scale = 1.0 / tolerance if tolerance > 0 else None
+        self._points = {}  # snapped coordinates -> (oID, name) of the point written there
+        self._members = {} # oID -> names of the points merged into it, for shared vertices only
+        self.duplicates = 0
+
+    def add_rows(self, rows, last_oid):
+        """
+        Adds CgPoint rows, whose new points are numbered from last_oid + 1 in order.
+
+        Returns:
+            list: The rows to be written: all rows that are not derived vertices, and the
+                  derived vertices at positions not seen before. The other vertices are
+                  recorded as members of the vertex already written at theirs.
+        """
+        scale = self._scale
+        points = self._points
+        members = self._members
+        new_rows = []
+        for row in rows:
+            easting, northing, elevation, values = row
+            if values[1] != DERIVED_VERTEX_CODE:
+                last_oid += 1
+                new_rows.append(row)
+                continue
+            if scale is None:
+                key = (easting, northing, elevation)
+            else:
+                key = (round(easting * scale), round(northing * scale), round(elevation * scale))
+            point = points.get(key)
+            if point is None:
+                last_oid += 1
+                points[key] = (last_oid, values[0] or f"Point_{last_oid}")
+                new_rows.append(row)
+                continue
+            oid, name = point
+            point_members = members.get(oid)
+            if point_members is None:
+                point_members = members[oid] = [name]
+            point_members.append(values[0] or "(unnamed point)")
+        self.duplicates += len(rows) - len(new_rows)
+        return new_rows
+
+    @property
+    def shared_count(self):
+        """Number of written vertices that other vertices were merged into."""
+        return len(self._members)
+
+    def write_members(self, writer):
+        """
+        Writes a <Feature code="sharedVertex"> into the open <CgPoints> element for every
+        shared vertex, with the vertex's oID and the names of all its member points (the
+        written point first). Derived vertex names include their feature and layer.
+        """
+        for oid, names in self._members.items():
+            writer.start_element("Feature", {"name": names[0], "code": "sharedVertex"})
+            writer.empty_element("Property", {"label": "oID", "value": oid})
+            for name in names:
+                writer.empty_element("Property", {"label": "member", "value": name})
+            writer.end_element()
+
+# Rows numbered and written per chunk. Stage times are measured, and LAYER_PROGRESS events
+# sent, once per chunk rather than once per point.
+WRITE_CHUNK_SIZE = 10000
+
+def _write_cgpoint_rows(rows, cgpoints_writer, starting_oid, current_timestamp_iso, metrics=None, chunk_callback=None,
+                        vertex_index=None, profile=None):
+    """
+    Numbers rows from starting_oid + 1 and writes them as CgPoints. Returns the number written.
+
+    Rows are taken WRITE_CHUNK_SIZE at a time; the time spent reading, building and
+    serializing each chunk is added to metrics (a LayerMetrics), and chunk_callback, if
+    given, is called after every chunk. If reading a row fails, the rows read before it
+    are still written before the error is raised. With a vertex_index (a VertexIndex),
+    rows at an already written position are merged into that point instead of written.
+    With a profile (an InputProfile), the stages are also timed there.
+    """
+    if metrics is None:
+        metrics = LayerMetrics()
+    rows = iter(rows)
+    current_oid = starting_oid
+    while True:
+        read_start = time.perf_counter()
+        with stage(profile, 'read'):
+            chunk = []
+            read_error = None
+            try:
+                chunk.extend(itertools.islice(rows, WRITE_CHUNK_SIZE))
+            except Exception as e:
+                read_error = e
+
+        build_start = time.perf_counter()
+        with stage(profile, 'build'):
+            new_rows = chunk if vertex_index is None else vertex_index.add_rows(chunk, current_oid)
+            cgpoints = []
+            for easting, northing, elevation, (point_name_str, point_code, point_desc, pnt_ref, solution_type, survey_method,
+                                               survey_order, class_val, latitude, longitude, ellipsoid_height) in new_rows:
+                current_oid += 1
+                if not point_name_str: point_name_str = f"Point_{current_oid}"
+                if point_desc is None: point_desc = f"Desc_{current_oid}"
+
+                cgpoint_attrs = {
+                    "name": point_name_str, "oID": str(current_oid), "code": point_code,
+                    "desc": point_desc, "role": "surveyed", "timeStamp": current_timestamp_iso,
+                    "pointGeometry": "point", "pntRef": pnt_ref,
+                    "solutionType": solution_type, "surveyMethod": survey_method,
+                    "surveyOrder": survey_order, "class": class_val,
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    "ellipsoidHeight": ellipsoid_height
+                }
+                cgpoints.append((cgpoint_attrs, f"{northing:.3f} {easting:.3f} {elevation:.3f}"))
+
+        serialize_start = time.perf_counter()
+        with stage(profile, 'serialize'):
+            for cgpoint_attrs, coordinate_text in cgpoints:
+                cgpoints_writer.write_cgpoint(cgpoint_attrs, coordinate_text)
+        serialize_end = time.perf_counter()
+
+        metrics.read_seconds += build_start - read_start
+        metrics.build_seconds += serialize_start - build_start
+        metrics.serialize_seconds += serialize_end - serialize_start
+        metrics.vertices += len(chunk)
+        if chunk and chunk_callback is not None:
+            chunk_callback()
+        if read_error is not None:
+            raise read_error
+        if len(chunk) < WRITE_CHUNK_SIZE:
+            return current_oid - starting_oid
+
+def _extract_layer_rows(gdb_path, layer_name, handle_rows, status_callback, metrics, extraction_filter=None):
+    """
+    Opens a GDB layer and passes an iterator over its CgPoint rows to handle_rows, which
+    must consume it and return the number of rows it handled. The caller reports the
+    points it wrote (see _report_layer_points). The layer's feature count, the features
+    read and the error that stopped the layer, if any, are kept in metrics (a LayerMetrics).
+    With an extraction_filter, only the features it selects are read.
+
+    Returns:
+        int: Number of points extracted, or 0 if the layer was skipped or failed. Rows
+             handled before a failure are not taken back.
+    """
+    fiona = import_fiona(status_callback)
     try:
-        pyproj_datadir = pyproj.datadir.get_data_dir()
-        if pyproj_datadir and os.path.exists(os.path.join(pyproj_datadir, 'proj.db')):
-            os.environ['PROJ_LIB'] = pyproj_datadir
-            print(f"PROJ_LIB set using pyproj.datadir: {pyproj_datadir}")
-            proj_lib_found = True
-        elif pyproj_datadir:
-            print(f"pyproj.datadir.get_data_dir() ({pyproj_datadir}) found, but 'proj.db' not in this directory.")
-        else:
-            print("pyproj.datadir.get_data_dir() did not return a valid path.")
-    except ImportError:
-        print("pyproj module not found. Cannot use pyproj.datadir to find PROJ_LIB.")
+        with fiona.open(gdb_path, 'r', layer=layer_name) as source:
+            layer_geom_type = source.schema.get('geometry')
+
+            if layer_geom_type not in PROCESSABLE_SCHEMA_GEOM_TYPES:
+                status_callback(f"Info: Layer '{layer_name}' in {gdb_path} has a geometry type ({layer_geom_type}) that cannot be processed for CgPoints. Skipping layer for this GDB's XML.")
+                return 0
+
+            read_options = extraction_filter.read_options() if extraction_filter is not None else {}
+            if not read_options:
+                try:
+                    metrics.features_total = len(source)
+                except Exception:
+                    pass # Not every driver can count features up front; progress then follows whole layers.
+            # A filtered layer cannot be counted without reading it, so its progress follows whole layers too.
+
+            if _columnar_reader_supports(source.schema):
+                rows = _iter_cgpoint_rows_columnar(gdb_path, layer_name, source.schema, metrics, read_options)
+            elif read_options:
+                rows = _iter_cgpoint_rows(source.filter(**read_options), layer_name, metrics)
+            else:
+                rows = _iter_cgpoint_rows(source, layer_name, metrics)
+            points_added_this_layer = handle_rows(rows)
+
+    except fiona.errors.DriverError as e:
+        metrics.error = f"Fiona DriverError for layer '{layer_name}' in GDB '{gdb_path}': {e}. Skipping layer."
+        status_callback(metrics.error)
+        try:
+            available_layers_info = fiona.listlayers(gdb_path)
+            status_callback(f"  (Context: Available layers in {gdb_path} are: {available_layers_info})")
+        except Exception:
+            pass 
+        return 0
     except Exception as e:
-        print(f"Error trying to use pyproj.datadir: {e}")
-
-if not proj_lib_found:
-    # Only print these detailed warnings if not running bundled,
-    # as the bundled check has its own warning.
-    if not (getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS')):
-        venv_path_from_sys = os.path.dirname(os.path.dirname(sys.executable))
-        original_sys_attempt_path1 = os.path.join(venv_path_from_sys, 'Lib', 'site-packages', 'pyproj', 'proj_dir', 'share', 'proj')
-        original_sys_attempt_path2 = os.path.join(venv_path_from_sys, 'share', 'proj')
-        
-        script_venv_attempt_path1 = os.path.join(script_dir, '.venv', 'Lib', 'site-packages', 'pyproj', 'proj_dir', 'share', 'proj')
-        script_venv_attempt_path2 = os.path.join(script_dir, '.venv', 'share', 'proj')
-
-        print(f"Warning: Could not automatically find and set PROJ_LIB. PROJ errors may persist.")
-        print(f"  Checked common locations based on script path ({script_dir}) and Python executable ({sys.executable}).")
-        print(f"  Examples of paths derived from sys.executable ({sys.executable}):")
-        print(f"    - {original_sys_attempt_path1}")
-        print(f"    - {original_sys_attempt_path2}")
-        print(f"  Examples of paths derived from .venv relative to script ({script_dir}):")
-        print(f"    - {script_venv_attempt_path1}")
-        print(f"    - {script_venv_attempt_path2}")
-        print(f"  Also attempted to use pyproj.datadir.get_data_dir().")
-        print("  Please ensure 'proj.db' is accessible and PROJ_LIB is set correctly, or that 'pyproj' is installed with its data files in a standard location.")
-        print("  You might need to manually find 'proj.db' in your environment and set the PROJ_LIB environment variable before running the script.")
-
-# --- END PROJ_LIB FIX ---
-
-def populate_cgpoints_from_layer(gdb_path, layer_name, cgpoints_element_to_populate, starting_oid, current_timestamp_iso, landxml_namespace_uri, status_callback=print):
-    """
-    Reads features from a GDB layer and adds their point data (original points or
-    vertices from lines/polygons) as CgPoint elements to an existing CgPoints XML element.
+        metrics.error = f"Error reading from layer '{layer_name}' in GDB {gdb_path}: {e}. Skipping layer."
+        status_callback(metrics.error)
+        return 0
+    
+    return points_added_this_layer
+
+def populate_cgpoints_from_layer(gdb_path, layer_name, cgpoints_writer, starting_oid, current_timestamp_iso, status_callback=print,
+                                 progress_callback=None, extraction_filter=None, vertex_index=None, profile=None):
+    """
+    Reads features from a GDB layer and writes their point data (original points or
+    vertices from lines/polygons) as CgPoint elements through a LandXMLStreamWriter.
 
     Args:
         gdb_path (str): Path to the input File Geodatabase (.gdb folder).
         layer_name (str): Name of the point layer to read from the GDB.
-        cgpoints_element_to_populate (ET.Element): The <CgPoints> XML element to add points to.
+        cgpoints_writer (LandXMLStreamWriter): Writer positioned inside an open <CgPoints> element.
         starting_oid (int): The starting oID for points from this layer.
         current_timestamp_iso (str): The ISO timestamp string for CgPoint elements.
-        landxml_namespace_uri (str): The LandXML namespace URI string.
         status_callback (function): Function to call for status updates.
+        progress_callback (function): Function to call with LAYER_PROGRESS and LAYER_FINISHED
+                                      events (see progress_events.py), or None.
+        extraction_filter (ExtractionFilter): Features to read (its bbox and where), or
+                                      None for all of them.
+        vertex_index (VertexIndex): Index of the points already written for the GDB;
+                                    points at their positions are merged into them. None =
+                                    write every point.
+        profile (InputProfile): Profile of the GDB to time the layer's stages in, or None.
 
     Returns:
         tuple: (number_of_points_added, next_available_oid)
     """
+    metrics = LayerMetrics()
+
+    def report_chunk():
+        emit_event(progress_callback, LAYER_PROGRESS, path=gdb_path, layer=layer_name, features_total=metrics.features_total,
+                   features_read=metrics.features_read, vertices=metrics.vertices)
+
     points_added_this_layer = 0
-    current_oid = starting_oid
-    
+
+    def write_rows(rows):
+        nonlocal points_added_this_layer
+        points_added_this_layer = _write_cgpoint_rows(rows, cgpoints_writer, starting_oid, current_timestamp_iso, metrics,
+                                                      report_chunk if progress_callback is not None else None, vertex_index,
+                                                      profile)
+        # Points merged into shared vertices count as extracted, as they do when layers are read in parallel.
+        return metrics.vertices
+
+    points_extracted = _extract_layer_rows(gdb_path, layer_name, write_rows, status_callback, metrics, extraction_filter)
+    _report_layer_points(layer_name, points_extracted, points_added_this_layer, vertex_index, status_callback)
+    emit_event(progress_callback, LAYER_FINISHED, path=gdb_path, layer=layer_name, features=metrics.features_read,
+               vertices=points_added_this_layer, error=metrics.error, **metrics.stage_seconds())
+    return points_added_this_layer, starting_oid + points_added_this_layer
+
+# Rows pickled to a layer's spool file at a time when layers are read in parallel. Each chunk
+# is pickled as a PointBatch, which is much smaller and quicker to (un)pickle than the rows.
+SPOOL_CHUNK_SIZE = 10000
+
+def _spool_rows(rows, spool_path, metrics, profile=None):
+    count = 0
+    start = time.perf_counter()
+    dump_seconds = 0.0 # Spooling is not one of the measured stages.
+    rows = iter(rows)
     try:
-        with fiona.open(gdb_path, 'r', layer=layer_name) as source:
-            layer_geom_type = source.schema.get('geometry')
+        with open(spool_path, 'wb') as f:
+            while True:
+                with stage(profile, 'read'):
+                    chunk = list(itertools.islice(rows, SPOOL_CHUNK_SIZE))
+                if not chunk:
+                    break
+                dump_start = time.perf_counter()
+                pickle.dump(PointBatch.from_rows(CGPOINT_ROW_FIELDS, chunk), f, protocol=pickle.HIGHEST_PROTOCOL)
+                dump_seconds += time.perf_counter() - dump_start
+                count += len(chunk)
+    finally:
+        metrics.read_seconds += time.perf_counter() - start - dump_seconds
+    return count
 
-            processable_schema_geom_types = [
-                'Point', 'PointZ', 'PointM', '3D Point',
-                'LineString', '3D LineString', 'MultiLineString', '3D MultiLineString',
-                'Polygon', '3D Polygon', 'MultiPolygon', '3D MultiPolygon'
-            ]
+def _read_spooled_rows(spool_path):
+    if not os.path.exists(spool_path):
+        return
+    with open(spool_path, 'rb') as f:
+        while True:
+            try:
+                chunk = pickle.load(f)
+            except EOFError:
+                return
+            yield from chunk.iter_rows()
 
-            if layer_geom_type not in processable_schema_geom_types:
-                status_callback(f"Info: Layer '{layer_name}' in {gdb_path} has a geometry type ({layer_geom_type}) that cannot be processed for CgPoints. Skipping layer for this GDB's XML.")
-                return 0, starting_oid
-
-            for feature_idx, feature in enumerate(source):
-                geom = feature.get('geometry')
-                if not geom:
-                    continue
-
-                coords_to_extract = []
-                actual_geom_type = geom.get('type')
-                raw_coords = geom.get('coordinates')
-
-                if actual_geom_type == 'Point':
-                    if raw_coords and isinstance(raw_coords, (list, tuple)) and len(raw_coords) >= 2:
-                        coords_to_extract.append(raw_coords)
-                elif actual_geom_type in ['LineString', '3D LineString']:
-                    if raw_coords:
-                        coords_to_extract.extend(raw_coords)
-                elif actual_geom_type in ['MultiLineString', '3D MultiLineString']:
-                    if raw_coords:
-                        for line_coords in raw_coords: 
-                            coords_to_extract.extend(line_coords)
-                elif actual_geom_type in ['Polygon', '3D Polygon']:
-                    if raw_coords:
-                        for ring in raw_coords: 
-                            coords_to_extract.extend(ring[:-1] if len(ring) > 1 and tuple(ring[0]) == tuple(ring[-1]) else ring)
-                elif actual_geom_type in ['MultiPolygon', '3D MultiPolygon']:
-                    if raw_coords:
-                        for polygon_rings in raw_coords: 
-                            for ring in polygon_rings: 
-                                coords_to_extract.extend(ring[:-1] if len(ring) > 1 and tuple(ring[0]) == tuple(ring[-1]) else ring)
-                
-                vertex_in_feature_counter_for_name = 0
-                for coord_tuple in coords_to_extract:
-                    if not (isinstance(coord_tuple, (list, tuple)) and 2 <= len(coord_tuple) <= 3 and all(isinstance(c, (int, float)) for c in coord_tuple)):
-                        continue
-                    
-                    current_oid += 1
-                    vertex_in_feature_counter_for_name += 1
-                    points_added_this_layer += 1
-
-                    easting = coord_tuple[0]
-                    northing = coord_tuple[1]
-                    elevation = coord_tuple[2] if len(coord_tuple) > 2 else 0.0
-
-                    props = feature.get('properties', {})
-                    original_feature_id_str = str(feature.get('id', f"feat{feature_idx}"))
-
-                    if actual_geom_type == 'Point':
-                        point_name_str = str(props.get('name', f'Point_{current_oid}'))
-                        point_code = str(props.get('code', 'DefaultCode'))
-                        point_desc = str(props.get('description', f'Desc_{current_oid}'))
-                        solution_type = str(props.get('solutionType', "unknown"))
-                        survey_method = str(props.get('surveyMethod', ""))
-                        class_val = str(props.get('class', "default"))
-                    else: 
-                        base_name_prop = props.get('name', f'Feat_{original_feature_id_str}')
-                        point_name_str = f"{base_name_prop}_L{layer_name[:8].replace(' ','_')}_V{vertex_in_feature_counter_for_name}"
-                        point_code = "DerivedVertex"
-                        point_desc = f"Vtx {vertex_in_feature_counter_for_name} of {base_name_prop} from Lyr {layer_name}"
-                        solution_type = "derived_vertex"
-                        survey_method = "extracted_from_geometry"
-                        class_val = "derived_default"
-                    
-                    if not point_name_str: point_name_str = f"Point_{current_oid}"
-
-                    cgpoint_attrs = {
-                        "name": point_name_str, "oID": str(current_oid), "code": point_code,
-                        "desc": point_desc, "role": "surveyed", "timeStamp": current_timestamp_iso,
-                        "pointGeometry": "point", "pntRef": str(props.get('pntRef', "")),
-                        "solutionType": solution_type, "surveyMethod": survey_method,
-                        "surveyOrder": str(props.get('surveyOrder', "")), "class": class_val,
-                        "latitude": str(props.get('latitude', "0.0000000000")),
-                        "longitude": str(props.get('longitude', "0.0000000000")),
-                        "ellipsoidHeight": str(props.get('ellipsoidHeight', "0.000"))
-                    }
-                    cgpoint_element = ET.SubElement(cgpoints_element_to_populate, f"{{{landxml_namespace_uri}}}CgPoint", cgpoint_attrs)
-                    cgpoint_element.text = f"{northing:.3f} {easting:.3f} {elevation:.3f}"
-            
-            if points_added_this_layer > 0:
-                status_callback(f"  Added {points_added_this_layer} points from layer '{layer_name}' to current GDB's XML.")
+def _spool_layer_rows(gdb_path, layer_name, spool_path, extraction_filter=None, profile=False):
+    """
+    Process-pool entry point: extracts one layer's CgPoint rows into spool_path.
 
-    except fiona.errors.DriverError as e:
-        status_callback(f"Fiona DriverError for layer '{layer_name}' in GDB '{gdb_path}': {e}. Skipping layer.")
+    Status messages are collected instead of sent, so the parent can replay them in
+    layer order. Returns (number_of_points_added, messages, layer_metrics, read_stats),
+    where read_stats is the StageStats of reading the layer if profile is set, else None.
+    """
+    messages = []
+    metrics = LayerMetrics()
+    layer_profile = InputProfile(gdb_path, spool_path, 'gdb_layer_to_spool') if profile else None
+    points_added = _extract_layer_rows(gdb_path, layer_name, lambda rows: _spool_rows(rows, spool_path, metrics, layer_profile),
+                                       messages.append, metrics, extraction_filter)
+    return points_added, messages, metrics, layer_profile.stages.get('read') if profile else None
+
+def _report_layer_points(layer_name, points_extracted, points_written, vertex_index, status_callback):
+    """Reports the CgPoints written for a layer that was read without errors, and the vertices merged instead."""
+    if points_extracted <= 0:
+        return # Skipped or failed; _extract_layer_rows has said why.
+    if points_written > 0:
+        status_callback(f"  Added {points_written} points from layer '{layer_name}' to current GDB's XML.")
+    merged_count = points_extracted - points_written
+    if vertex_index is not None and merged_count > 0:
+        status_callback(f"  Merged {merged_count} more points from layer '{layer_name}' into shared vertices already written.")
+
+def _populate_cgpoints_from_layers_in_parallel(gdb_path, gdb_base_name, layer_names, cgpoints_writer, current_timestamp_iso,
+                                              spool_dir, status_callback, layer_workers, progress_callback=None, cancel_event=None,
+                                              extraction_filter=None, vertex_index=None, profile=None):
+    """
+    Reads layers in a process pool and writes them in their original order.
+
+    Workers only produce oID-independent rows, so numbering them while merging gives the
+    same oIDs, names and status messages as populate_cgpoints_from_layer run layer by layer.
+    With a profile, the workers' reading is added to its read stage, although it ran in
+    parallel with the writing.
+
+    Returns:
+        int: Total number of points added.
+
+    Raises:
+        ConversionCancelled: If cancel_event is set; layers not started yet are dropped.
+    """
+    spool_paths = [os.path.join(spool_dir, f"layer_{index}.rows") for index in range(len(layer_names))]
+    gdb_total_points_added = 0
+    master_oid_counter = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=layer_workers) as executor:
+        layer_futures = [executor.submit(_spool_layer_rows, gdb_path, layer_name, spool_path, extraction_filter,
+                                         profile is not None)
+                         for layer_name, spool_path in zip(layer_names, spool_paths)]
+        for current_layer_name, spool_path, layer_future in zip(layer_names, spool_paths, layer_futures):
+            if cancel_event is not None and cancel_event.is_set():
+                for pending_future in layer_futures:
+                    pending_future.cancel()
+                raise ConversionCancelled()
+            points_from_layer, messages, metrics, read_stats = layer_future.result()
+            if read_stats is not None:
+                profile.add_stage('read', read_stats)
+            status_callback(f"  Attempting to process layer: '{current_layer_name}' for GDB '{gdb_base_name}'")
+            # Rows spooled before a read error are still written, as in the sequential path.
+            # Reading the spool back counts towards the read stage, on top of the worker's read time.
+            points_written = _write_cgpoint_rows(_read_spooled_rows(spool_path), cgpoints_writer, master_oid_counter,
+                                                 current_timestamp_iso, metrics, vertex_index=vertex_index, profile=profile)
+            for message in messages:
+                status_callback(message)
+            _report_layer_points(current_layer_name, points_from_layer, points_written, vertex_index, status_callback)
+            # Rows spooled before a read error count too, as in the sequential path.
+            points_from_layer = points_written
+            emit_event(progress_callback, LAYER_FINISHED, path=gdb_path, layer=current_layer_name, features=metrics.features_read,
+                       vertices=points_from_layer, error=metrics.error, **metrics.stage_seconds())
+            if os.path.exists(spool_path):
+                os.remove(spool_path)
+            gdb_total_points_added += points_from_layer
+            master_oid_counter += points_from_layer
+    return gdb_total_points_added
+
+class ConversionCancelled(Exception):
+    """Raised between layers when the cancel_event of a conversion has been set."""
+
+def _raise_if_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise ConversionCancelled()
+
+def combined_xml_path(gdb_path, output_xml_dir_param, compression=None, split=False):
+    """
+    Returns the path of the combined XML file written for a GDB: <output dir>/<gdb name>_combined.xml,
+    with .gz or .zst added for a compression. With split, the output is written in parts and
+    this is the path of their index, <output dir>/<gdb name>_combined_index.json.
+    """
+    gdb_base_name = os.path.splitext(os.path.basename(gdb_path))[0]
+    if split:
+        return os.path.join(output_xml_dir_param, f"{gdb_base_name}_combined_index.json")
+    return compressed_path(os.path.join(output_xml_dir_param, f"{gdb_base_name}_combined.xml"), compression)
+
+# --- Split output ---
+# With a limit on the points or bytes per file, the CgPoints of a GDB are spread over
+# numbered part files instead of one combined XML. Every part is a complete LandXML document
+# with the same header (Units, CoordinateSystem, Application), oIDs continue from one part to
+# the next, and an index file lists the parts in order, so consumers can load them side by side.
+
+def combined_part_path(gdb_path, output_xml_dir_param, part_number, compression=None):
+    """Returns the path of part part_number (from 1) of a split output: <output dir>/<gdb name>_combined_part0001.xml."""
+    gdb_base_name = os.path.splitext(os.path.basename(gdb_path))[0]
+    return compressed_path(os.path.join(output_xml_dir_param, f"{gdb_base_name}_combined_part{part_number:04d}.xml"),
+                           compression)
+
+def _text_size(text):
+    """Size of text in UTF-8 bytes."""
+    return len(text) if text.isascii() else len(text.encode('utf-8'))
+
+class LandXMLPartWriter:
+    """
+    Writes the contents of a <CgPoints> element into numbered LandXML part files, each of
+    at most max_points CgPoints and max_bytes bytes of XML.
+
+    It offers the writer methods the CgPoint and shared-vertex code uses, positioned inside
+    <CgPoints>. Each child of CgPoints (a CgPoint, or a Feature with its properties) is kept
+    whole and goes into the first part with room for it. A part holds at least one child,
+    even if that alone is larger than max_bytes. close_all() finishes the last part.
+    """
+
+    def __init__(self, write_header, part_path, compression=None, max_points=None, max_bytes=None):
+        """
+        Args:
+            write_header (function): Writes the start of a part, up to and including the
+                                     open <CgPoints> element, through the LandXMLStreamWriter
+                                     it is called with.
+            part_path (function): Returns the path to write part n (from 1) to.
+            compression (str): 'gzip' or 'zstd' to compress the parts; None = plain XML.
+            max_points (int): CgPoints per part, or None for no limit.
+            max_bytes (int): Bytes per part, of the uncompressed XML, or None for no limit.
+        """
+        for name, limit in (('max_points', max_points), ('max_bytes', max_bytes)):
+            if limit is not None and limit < 1:
+                raise ValueError(f"{name} must be at least 1, got {limit}")
+        self.max_points = max_points
+        self.max_bytes = max_bytes
+        self._part_path = part_path
+        self._compression = compression
+
+        header = io.StringIO()
+        header_writer = LandXMLStreamWriter(header)
+        write_header(header_writer)
+        self._header = header.getvalue()
+        footer = io.StringIO()
+        LandXMLStreamWriter(footer, open_tags=header_writer.open_tags).close_all()
+        self._footer = footer.getvalue()
+        self._footer_size = _text_size(self._footer)
+
+        # A child of CgPoints is collected in _pending (through write()) until it is complete.
+        self._pending = []
+        self._depth = len(header_writer.open_tags)
+        self._child_writer = LandXMLStreamWriter(self, open_tags=header_writer.open_tags)
+
+        self.parts = [] # {'path', 'points', 'first_oid', 'last_oid'} per part started
+        self._file = None
+        self._part_size = 0
+
+    def write(self, text):
+        self._pending.append(text)
+
+    def write_cgpoint(self, attrs, text):
+        self._child_writer.write_cgpoint(attrs, text)
+        self._write_child(int(attrs["oID"]))
+
+    def start_element(self, tag, attrs=None):
+        self._child_writer.start_element(tag, attrs)
+
+    def empty_element(self, tag, attrs=None):
+        self._child_writer.empty_element(tag, attrs)
+        if len(self._child_writer.open_tags) == self._depth:
+            self._write_child()
+
+    def end_element(self):
+        self._child_writer.end_element()
+        if len(self._child_writer.open_tags) == self._depth:
+            self._write_child()
+
+    def _write_child(self, oid=None):
+        text = "".join(self._pending)
+        self._pending.clear()
+        size = _text_size(text)
+        if self._file is not None:
+            part = self.parts[-1]
+            if ((oid is not None and self.max_points is not None and part['points'] >= self.max_points)
+                    or (self.max_bytes is not None and self._part_size + size + self._footer_size > self.max_bytes)):
+                self._finish_part()
+        if self._file is None:
+            self._start_part()
+        self._file.write(text)
+        self._part_size += size
+        if oid is not None:
+            part = self.parts[-1]
+            part['points'] += 1
+            if part['first_oid'] is None:
+                part['first_oid'] = oid
+            part['last_oid'] = oid
+
+    def _start_part(self):
+        path = self._part_path(len(self.parts) + 1)
+        self._file = open_landxml_for_writing(path, self._compression, XML_WRITE_BUFFER_SIZE)
+        self.parts.append({'path': path, 'points': 0, 'first_oid': None, 'last_oid': None})
+        self._file.write(self._header)
+        self._part_size = _text_size(self._header)
+
+    def _finish_part(self):
+        self._file.write(self._footer)
+        self._file.close()
+        self._file = None
+
+    def close_all(self):
+        """Finishes the part being written; nothing is written if no child was."""
+        if self._file is not None:
+            self._finish_part()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Leaves an unfinished part as it is (but closed) when leaving on an error.
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def write_part_index(index_path, gdb_path, parts, max_points, max_bytes, current_timestamp_iso):
+    """
+    Writes the JSON index of a split output: the source GDB, the limits and, in order, each
+    part's file name (relative to the index), number of CgPoints, first and last oID and size.
+
+    Args:
+        parts (list): The parts in order, as in LandXMLPartWriter.parts, with their final paths.
+    """
+    index = {
+        'source': os.path.basename(gdb_path),
+        'created': current_timestamp_iso,
+        'max_points_per_file': max_points,
+        'max_bytes_per_file': max_bytes,
+        'points': sum(part['points'] for part in parts),
+        'parts': [{'file': os.path.basename(part['path']), 'points': part['points'], 'first_oid': part['first_oid'],
+                   'last_oid': part['last_oid'], 'bytes': os.path.getsize(part['path'])}
+                  for part in parts],
+    }
+    partial_index_path = index_path + ".part"
+    with open(partial_index_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2)
+        f.write("\n")
+    os.replace(partial_index_path, index_path)
+
+def _read_part_index(index_path):
+    """The index of a split output as a dict, or None if it is missing or unreadable."""
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return index if isinstance(index, dict) else None
+
+def _indexed_part_paths(index_path, index=None):
+    """Paths of the parts an index lists, next to it; [] if it cannot be read."""
+    if index is None:
+        index = _read_part_index(index_path)
+    try:
+        return [os.path.join(os.path.dirname(index_path), part['file']) for part in index['parts']]
+    except (KeyError, TypeError):
+        return []
+
+def split_output_complete(index_path):
+    """Whether the index of a split output exists and every part it lists is there, with the size it records."""
+    index = _read_part_index(index_path)
+    if index is None:
+        return False
+    try:
+        part_sizes = [part['bytes'] for part in index['parts']]
+    except (KeyError, TypeError):
+        return False
+    for path, size in zip(_indexed_part_paths(index_path, index), part_sizes):
         try:
-            available_layers_info = fiona.listlayers(gdb_path)
-            status_callback(f"  (Context: Available layers in {gdb_path} are: {available_layers_info})")
-        except Exception:
-            pass 
-        return 0, starting_oid 
+            if os.path.getsize(path) != size:
+                return False
+        except OSError:
+            return False
+    return True
+
+def _remove_other_output_mode(gdb_path, output_xml_dir_param, split):
+    """
+    Removes what an earlier run in the other mode wrote for a GDB, so that only one of a
+    combined XML and a split output is ever left: after a split write, <gdb name>_combined.xml
+    (plain or compressed); after a single-file write, the index and the parts it lists.
+    """
+    if split:
+        stale_paths = [combined_xml_path(gdb_path, output_xml_dir_param, compression)
+                       for compression in (None, *COMPRESSIONS)]
+    else:
+        index_path = combined_xml_path(gdb_path, output_xml_dir_param, split=True)
+        # The index goes first, so it never lists parts that are gone.
+        stale_paths = [index_path] + _indexed_part_paths(index_path)
+    for path in stale_paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+_BYTE_SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+def parse_byte_size(text):
+    """
+    Parses a size such as '500000', '64K', '500M' or '2G' (powers of 1024; a trailing 'B'
+    is allowed) into a number of bytes, for argparse.
+
+    Raises:
+        argparse.ArgumentTypeError: If the size is malformed or not positive.
+    """
+    value = text.strip().upper()
+    if value.endswith('B'):
+        value = value[:-1]
+    unit = value[-1:] if value[-1:] in _BYTE_SIZE_UNITS else ''
+    try:
+        size = int(float(value[:len(value) - len(unit)]) * _BYTE_SIZE_UNITS[unit])
+    except (ValueError, OverflowError):
+        raise argparse.ArgumentTypeError(f"invalid size '{text}', expected e.g. 500000, 64K, 500M or 2G")
+    if size < 1:
+        raise argparse.ArgumentTypeError(f"size must be at least 1 byte, got '{text}'")
+    return size
+
+def _finish_split_output(gdb_path, output_xml_dir_param, index_path, part_writer, compression, current_timestamp_iso):
+    """
+    Moves the completed parts of a LandXMLPartWriter into place, removes parts left over from
+    an earlier run with more of them and the combined XML of an earlier unsplit run, and
+    writes the index last. Returns the parts' total size.
+    """
+    parts = []
+    for part_number, part in enumerate(part_writer.parts, start=1):
+        final_path = combined_part_path(gdb_path, output_xml_dir_param, part_number, compression)
+        os.replace(part['path'], final_path)
+        parts.append(dict(part, path=final_path))
+    stale_part_number = len(parts) + 1
+    while os.path.exists(combined_part_path(gdb_path, output_xml_dir_param, stale_part_number, compression)):
+        os.remove(combined_part_path(gdb_path, output_xml_dir_param, stale_part_number, compression))
+        stale_part_number += 1
+    _remove_other_output_mode(gdb_path, output_xml_dir_param, split=True)
+    write_part_index(index_path, gdb_path, parts, part_writer.max_points, part_writer.max_bytes, current_timestamp_iso)
+    return sum(os.path.getsize(part['path']) for part in parts)
+
+def convert_gdb_to_landxml(gdb_path, output_xml_dir_param, status_callback=print, layer_workers=1, progress_callback=None,
+                           cancel_event=None, extraction_filter=None, vertex_tolerance=None, compression=None,
+                           max_points_per_file=None, max_bytes_per_file=None, profile=False, cprofile=False):
+    """
+    Converts every processable layer of one GDB into a single combined LandXML file, or
+    into numbered parts of one if a limit per file is given.
+
+    Args:
+        gdb_path (str): Path to the input File Geodatabase (.gdb folder).
+        output_xml_dir_param (str): Path to the directory where the XML file will be saved.
+        status_callback (function): Function to call for status updates.
+        layer_workers (int): Number of layers read at the same time, each in its own
+                             process (None = one per CPU core). The output is identical
+                             to reading them one by one.
+        progress_callback (function): Function to call with progress events for this GDB
+                                      (FILE_STARTED to FILE_FINISHED, see progress_events.py),
+                                      or None.
+        cancel_event (threading.Event or multiprocessing.Event): Checked before each layer.
+                                      Once it is set, the GDB is abandoned and no XML is
+                                      written for it. None = cannot be cancelled.
+        extraction_filter (ExtractionFilter): Layers and features to extract, or None for
+                                      every feature of every layer.
+        vertex_tolerance (float): If given, points of all layers whose coordinates snap to
+                                  the same cell of a grid this size are written once, as a
+                                  shared vertex listing the points merged into it (see
+                                  VertexIndex). None = write every vertex of every feature.
+        compression (str): 'gzip' or 'zstd' to write <gdb name>_combined.xml.gz or .xml.zst
+                           through a streaming compressor; None = plain XML.
+        max_points_per_file (int): If given, the CgPoints are split over part files
+                                   <gdb name>_combined_part0001.xml, ... of at most this
+                                   many points, listed in <gdb name>_combined_index.json
+                                   (see LandXMLPartWriter). None = no limit.
+        max_bytes_per_file (int): If given, parts hold at most this many bytes of XML
+                                  (before compression). None = no limit.
+        profile (bool): Time the read, build, serialize and finish stages (wall time, CPU
+                        time and peak memory) and write them to <gdb name>.gdb.profile.json
+                        in the output directory (see profiling.py).
+        cprofile (bool): Also run the conversion under cProfile and dump the statistics
+                         to <gdb name>.gdb.prof in the output directory (implies profile).
+
+    Returns:
+        int: Number of points written to <gdb name>_combined.xml or its parts (0 if no XML
+             was created).
+    """
+    conversion_args = (gdb_path, output_xml_dir_param, status_callback, layer_workers, progress_callback, cancel_event,
+                       extraction_filter, vertex_tolerance, compression, max_points_per_file, max_bytes_per_file)
+    if not (profile or cprofile):
+        return _convert_gdb_to_landxml(*conversion_args)
+    split_output = max_points_per_file is not None or max_bytes_per_file is not None
+    input_profile = InputProfile(gdb_path, combined_xml_path(gdb_path, output_xml_dir_param, compression, split_output),
+                                 'gdb_to_landxml',
+                                 profile_report_path(gdb_path, output_xml_dir_param, CPROFILE_SUFFIX) if cprofile else None)
+    input_profile.details.update(layer_workers=layer_workers, points_written=0)
+    try:
+        with input_profile:
+            points_written = _convert_gdb_to_landxml(*conversion_args, input_profile)
+        input_profile.details['points_written'] = points_written
+    finally:
+        report_path = profile_report_path(gdb_path, output_xml_dir_param)
+        try:
+            input_profile.write_report(report_path)
+            status_callback(f"Profile written to {report_path}")
+        except OSError as e:
+            status_callback(f"Warning: could not write profile {report_path}: {e}")
+    return points_written
+
+def _convert_gdb_to_landxml(gdb_path, output_xml_dir_param, status_callback, layer_workers, progress_callback, cancel_event,
+                            extraction_filter, vertex_tolerance, compression, max_points_per_file, max_bytes_per_file,
+                            profile=None):
+    gdb_base_name = os.path.splitext(os.path.basename(gdb_path))[0]
+    split_output = max_points_per_file is not None or max_bytes_per_file is not None
+    xml_output_path = combined_xml_path(gdb_path, output_xml_dir_param, compression, split_output)
+    conversion_start = time.perf_counter()
+    stage_totals = {f"{stage}_seconds": 0.0 for stage in STAGES}
+
+    def report_layer_event(event):
+        if event.kind == LAYER_FINISHED:
+            for stage_key in stage_totals:
+                stage_totals[stage_key] += event.data[stage_key]
+        if progress_callback is not None:
+            progress_callback(event)
+
+    def report_finished(status, points_written, bytes_written=0):
+        emit_event(progress_callback, FILE_FINISHED, path=gdb_path, output_path=xml_output_path, status=status,
+                   points_written=points_written, bytes_written=bytes_written,
+                   seconds=time.perf_counter() - conversion_start, **stage_totals)
+
+    status_callback(f"--- Processing GDB: {gdb_path} ---")
+    emit_event(progress_callback, FILE_STARTED, path=gdb_path)
+
+    current_datetime = datetime.datetime.now(datetime.timezone.utc)
+    current_date_str = current_datetime.strftime("%Y-%m-%d")
+    current_time_str = current_datetime.strftime("%H:%M:%S")
+    current_timestamp_iso = current_datetime.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+    gdb_total_points_added = 0
+    master_oid_counter = 0 
+
+    fiona = import_fiona(status_callback)
+    try:
+        available_layers = fiona.listlayers(gdb_path)
+        if not available_layers:
+            status_callback(f"No layers found in GDB: {gdb_path}")
+            status_callback("-" * 40)
+            report_finished('empty', 0)
+            return 0
     except Exception as e:
-        status_callback(f"Error reading from layer '{layer_name}' in GDB {gdb_path}: {e}. Skipping layer.")
-        return 0, starting_oid 
-    
-    return points_added_this_layer, current_oid
+        status_callback(f"Error listing layers for GDB {gdb_path}: {e}")
+        status_callback("-" * 40)
+        report_finished('failed', 0)
+        return 0
+
+    status_callback(f"Found layers in {gdb_base_name}: {available_layers}. Processing for combined XML...")
+    if extraction_filter is not None:
+        selected_layers = [layer_name for layer_name in available_layers if extraction_filter.selects_layer(layer_name)]
+        if len(selected_layers) < len(available_layers):
+            status_callback(f"  Layer filter selects {len(selected_layers)} of {len(available_layers)} layers: {selected_layers}")
+        available_layers = selected_layers
+        if not available_layers:
+            status_callback(f"No layers of GDB '{gdb_base_name}' match the layer filter. Combined XML not created.")
+            status_callback("-" * 40)
+            report_finished('empty', 0)
+            return 0
+    emit_event(progress_callback, LAYERS_FOUND, path=gdb_path, layers=list(available_layers))
+
+    # Points are streamed into a temporary file that only replaces the real output once
+    # the document is complete, so a failed run never leaves a truncated XML behind.
+    # Parts are written the same way and only renamed once all of them are complete.
+    partial_xml_path = xml_output_path + ".part"
+    part_writer = None
+    points_written = 0
+    bytes_written = 0
+    status = 'empty'
+    try:
+        if split_output:
+            part_writer = LandXMLPartWriter(
+                lambda header_writer: write_landxml_preamble(header_writer, gdb_base_name, current_date_str, current_time_str,
+                                                             current_timestamp_iso),
+                lambda part_number: combined_part_path(gdb_path, output_xml_dir_param, part_number, compression) + ".part",
+                compression, max_points_per_file, max_bytes_per_file
+            )
+            output = writer = part_writer
+        else:
+            output = open_landxml_for_writing(partial_xml_path, compression, XML_WRITE_BUFFER_SIZE)
+            writer = LandXMLStreamWriter(output)
+        with output:
+            if part_writer is None: # Parts write their own header as they start
+                write_landxml_preamble(writer, gdb_base_name, current_date_str, current_time_str, current_timestamp_iso)
+            vertex_index = VertexIndex(vertex_tolerance) if vertex_tolerance is not None else None
+
+            if layer_workers is None:
+                layer_workers = os.cpu_count() or 1
+            layer_workers = min(layer_workers, len(available_layers))
+            if layer_workers > 1:
+                status_callback(f"  Reading {len(available_layers)} layers with {layer_workers} worker processes.")
+                with tempfile.TemporaryDirectory(prefix=f".{gdb_base_name}_layers_", dir=output_xml_dir_param) as spool_dir:
+                    gdb_total_points_added = _populate_cgpoints_from_layers_in_parallel(
+                        gdb_path, gdb_base_name, available_layers, writer, current_timestamp_iso,
+                        spool_dir, status_callback, layer_workers, report_layer_event, cancel_event, extraction_filter,
+                        vertex_index, profile
+                    )
+            else:
+                for current_layer_name in available_layers:
+                    _raise_if_cancelled(cancel_event)
+                    status_callback(f"  Attempting to process layer: '{current_layer_name}' for GDB '{gdb_base_name}'")
+                    points_from_layer, updated_oid = populate_cgpoints_from_layer(
+                        gdb_path, 
+                        current_layer_name, 
+                        writer, 
+                        master_oid_counter,
+                        current_timestamp_iso,
+                        status_callback,
+                        report_layer_event,
+                        extraction_filter,
+                        vertex_index,
+                        profile
+                    )
+                    gdb_total_points_added += points_from_layer
+                    master_oid_counter = updated_oid
+
+            with stage(profile, 'finish'):
+                if vertex_index is not None and vertex_index.duplicates:
+                    vertex_index.write_members(writer)
+                    status_callback(f"  Merged {vertex_index.duplicates} points into {vertex_index.shared_count} shared vertices "
+                                    f"(tolerance {vertex_index.tolerance}).")
+                writer.close_all()
 
-def run_conversion(input_gdb_dir_param, output_xml_dir_param, status_callback=print):
+        if gdb_total_points_added > 0 and split_output:
+            bytes_written = _finish_split_output(gdb_path, output_xml_dir_param, xml_output_path, part_writer, compression,
+                                                 current_timestamp_iso)
+            status_callback(f"Successfully created {len(part_writer.parts)} combined XML part(s) listed in {xml_output_path} "
+                            f"with {gdb_total_points_added} total points from GDB '{gdb_base_name}'.")
+            points_written = gdb_total_points_added
+            status = 'converted'
+        elif gdb_total_points_added > 0:
+            os.replace(partial_xml_path, xml_output_path)
+            _remove_other_output_mode(gdb_path, output_xml_dir_param, split=False)
+            bytes_written = os.path.getsize(xml_output_path)
+            status_callback(f"Successfully created combined XML: {xml_output_path} with {gdb_total_points_added} total points from GDB '{gdb_base_name}'.")
+            points_written = gdb_total_points_added
+            status = 'converted'
+        else:
+            status_callback(f"No points were added from any layer in GDB '{gdb_base_name}'. Combined XML not created.")
+    except ConversionCancelled:
+        status_callback(f"Conversion of GDB '{gdb_base_name}' cancelled. Combined XML not created.")
+        status = 'cancelled'
+    except Exception as e:
+        status_callback(f"Error writing combined XML file {xml_output_path} for GDB '{gdb_base_name}': {e}")
+        status = 'failed'
+    finally:
+        partial_paths = [part['path'] for part in part_writer.parts] if part_writer is not None else [partial_xml_path]
+        for path in partial_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    status_callback("-" * 40) 
+    report_finished(status, points_written, bytes_written)
+    if profile is not None:
+        profile.details.update(status=status, bytes_written=bytes_written)
+    return points_written
+
+def run_conversion(input_gdb_dir_param, output_xml_dir_param, status_callback=print, max_workers=1, layer_workers=1,
+                   force=False, progress_callback=None, cancel_event=None, extraction_filter=None, vertex_tolerance=None,
+                   compression=None, max_points_per_file=None, max_bytes_per_file=None, profile=False, cprofile=False):
     """
     Main function to process GDBs and convert them to combined LandXML files.
     Args:
         input_gdb_dir_param (str): Path to the directory containing GDB folders.
         output_xml_dir_param (str): Path to the directory where XML files will be saved.
         status_callback (function): Function to call for status updates.
+        max_workers (int): Number of GDBs converted at the same time, each in its own
+                           process. 1 converts them one by one in this process; None
+                           uses one process per CPU core.
+        layer_workers (int): Number of layers of each GDB read at the same time (see
+                             convert_gdb_to_landxml).
+        force (bool): Convert every GDB, even those the output directory's manifest
+                      records as already converted and unchanged since.
+        progress_callback (function): Function to call with ProgressEvent objects (files
+                                      discovered, layers, vertices, bytes written and stage
+                                      times, see progress_events.py), or None.
+        cancel_event (threading.Event or multiprocessing.Event): Once set, no further GDB
+                                      is started and the GDB being converted is abandoned
+                                      before its next layer, without leaving an XML file
+                                      behind. GDBs already running in worker processes
+                                      (max_workers > 1) are finished. None = cannot be
+                                      cancelled.
+        extraction_filter (ExtractionFilter): Layers, bounding box and attribute filter of
+                                      the features to extract from every GDB, or None for
+                                      all features. A GDB converted with other filter
+                                      settings is converted again.
+        vertex_tolerance (float): Write vertices shared by several features or layers once
+                                  (see convert_gdb_to_landxml). None = write every vertex.
+        compression (str): 'gzip' or 'zstd' to write compressed .xml.gz / .xml.zst files
+                           (zstd needs the zstandard package); None = plain XML.
+        max_points_per_file (int): Split each GDB's output into parts of at most this many
+                                   CgPoints, listed in an index file (see
+                                   convert_gdb_to_landxml). None = no limit.
+        max_bytes_per_file (int): Split each GDB's output into parts of at most this many
+                                  bytes of XML. None = no limit.
+        profile (bool): Write a <gdb name>.gdb.profile.json report with the stage times and
+                        peak memory of every GDB converted into output_xml_dir_param.
+        cprofile (bool): Also dump cProfile statistics per GDB (<gdb name>.gdb.prof).
     """
+    run_start = time.perf_counter()
+    if not compression_available(compression):
+        status_callback(f"Error: {compression} compression needs the zstandard package, which is not installed.")
+        return
+    for option_name, limit in (('max_points_per_file', max_points_per_file), ('max_bytes_per_file', max_bytes_per_file)):
+        if limit is not None and limit < 1:
+            status_callback(f"Error: {option_name} must be at least 1, got {limit}.")
+            return
+    split_output = max_points_per_file is not None or max_bytes_per_file is not None
     if not os.path.exists(input_gdb_dir_param):
         os.makedirs(input_gdb_dir_param)
         status_callback(f"Created input directory: {input_gdb_dir_param}. Please place GDB folders there.")
@@ -241,130 +1336,168 @@ def run_conversion(input_gdb_dir_param, output_xml_dir_param, status_callback=pr
         os.makedirs(output_xml_dir_param)
         status_callback(f"Created output directory: {output_xml_dir_param}")
 
-    processed_gdb_to_xml_count = 0
-    found_gdb_folders = False
-
     status_callback(f"Searching for GDB folders in: {input_gdb_dir_param}")
+    gdb_paths = []
     for item_name in os.listdir(input_gdb_dir_param):
         item_path = os.path.join(input_gdb_dir_param, item_name)
         if os.path.isdir(item_path) and item_name.lower().endswith(".gdb"):
-            found_gdb_folders = True
-            gdb_path = item_path
-            gdb_base_name = os.path.splitext(item_name)[0]
-            
-            status_callback(f"--- Processing GDB: {gdb_path} ---")
-
-            landxml_ns = "http://www.landxml.org/schema/LandXML-1.2"
-            xsi_ns = "http://www.w3.org/2001/XMLSchema-instance"
-            ET.register_namespace('', landxml_ns)
-            ET.register_namespace('xsi', xsi_ns)
-
-            current_datetime = datetime.datetime.now(datetime.timezone.utc)
-            current_date_str = current_datetime.strftime("%Y-%m-%d")
-            current_time_str = current_datetime.strftime("%H:%M:%S")
-            current_timestamp_iso = current_datetime.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
-
-            root_attrs = {
-                "date": current_date_str, "time": current_time_str, "version": "1.2",
-                "language": "English", "readOnly": "false",
-                f"{{{xsi_ns}}}schemaLocation": f"{landxml_ns} http://www.landxml.org/schema/LandXML-1.2/LandXML-1.2.xsd"
-            }
-            root = ET.Element(f"{{{landxml_ns}}}LandXML", root_attrs)
-            units_element = ET.SubElement(root, f"{{{landxml_ns}}}Units")
-            ET.SubElement(units_element, f"{{{landxml_ns}}}Metric", {
-                "areaUnit": "squareMeter", "linearUnit": "meter", "volumeUnit": "cubicMeter",
-                "temperatureUnit": "celsius", "pressureUnit": "pascal", "diameterUnit": "meter",
-                "angularUnit": "decimal dd.mm.ss", "directionUnit": "decimal dd.mm.ss"
-            })
-            ET.SubElement(root, f"{{{landxml_ns}}}CoordinateSystem", {
-                "desc": "RD / NAP", "name": "RDNAP", "epsgCode": "28992+5709", 
-                "horizontalDatum": "Amersfoort", "verticalDatum": "NAP", "ellipsoidName": "Bessel 1841",
-                "horizontalCoordinateSystemName": "RD", "zone": "", "falseNorthing": "0", "falseEasting": "0",
-                "latitudeOfNaturalOrigin": "0", "longitudeOfNaturalOrigin": "0", "naturalOriginScaleFactor": "1"
-            })
-            app_element = ET.SubElement(root, f"{{{landxml_ns}}}Application", {
-                "name": "Python GDB to LandXML Converter", "desc": f"Converted from GDB: {gdb_base_name}", 
-                "manufacturer": "Custom Script", "version": "1.1",
-                "manufacturerURL": "", "timeStamp": current_timestamp_iso
-            })
-            ET.SubElement(app_element, f"{{{landxml_ns}}}Author", {
-                "createdBy": "AutomatedProcess", "company": "N/A", 
-                "companyURL": "", "timeStamp": current_timestamp_iso
-            })
-            cgpoints_element = ET.SubElement(root, f"{{{landxml_ns}}}CgPoints")
-            
-            gdb_total_points_added = 0
-            master_oid_counter = 0 
+            gdb_paths.append(item_path)
+    found_gdb_folders = bool(gdb_paths)
 
+    # GDBs converted by an earlier run with the same settings are skipped unless forced.
+    manifest = ConversionManifest(output_xml_dir_param)
+    settings = {'converter': 'gdb_to_landxml'}
+    if extraction_filter is not None and extraction_filter.settings():
+        settings['filter'] = extraction_filter.settings()
+    if vertex_tolerance is not None:
+        settings['vertex_tolerance'] = vertex_tolerance
+    if compression:
+        settings['compression'] = compression
+    if max_points_per_file is not None:
+        settings['max_points_per_file'] = max_points_per_file
+    if max_bytes_per_file is not None:
+        settings['max_bytes_per_file'] = max_bytes_per_file
+    skipped_count = 0
+    gdb_paths_to_convert = []
+    for gdb_path in gdb_paths:
+        xml_output_path = combined_xml_path(gdb_path, output_xml_dir_param, compression, split_output)
+        # The manifest only knows the index of a split output; its parts must all still be there too.
+        if (not force and manifest.is_up_to_date(gdb_path, xml_output_path, settings)
+                and (not split_output or split_output_complete(xml_output_path))):
+            status_callback(f"Skipping unchanged GDB {gdb_path} (already converted to {xml_output_path}).")
+            skipped_count += 1
+        else:
+            gdb_paths_to_convert.append(gdb_path)
+    emit_event(progress_callback, FILES_DISCOVERED, input_dir=input_gdb_dir_param, found=len(gdb_paths),
+               to_convert=len(gdb_paths_to_convert), skipped=skipped_count)
+
+    def record_conversion(gdb_path, points_written):
+        if points_written > 0:
             try:
-                available_layers = fiona.listlayers(gdb_path)
-                if not available_layers:
-                    status_callback(f"No layers found in GDB: {gdb_path}")
-                    status_callback("-" * 40)
-                    continue
-            except Exception as e:
-                status_callback(f"Error listing layers for GDB {gdb_path}: {e}")
-                status_callback("-" * 40)
-                continue
+                manifest.record(gdb_path, combined_xml_path(gdb_path, output_xml_dir_param, compression, split_output), settings, points_written)
+            except OSError:
+                pass # GDB vanished after conversion: it is simply converted again next time.
 
-            status_callback(f"Found layers in {gdb_base_name}: {available_layers}. Processing for combined XML...")
-            
-            for current_layer_name in available_layers:
-                status_callback(f"  Attempting to process layer: '{current_layer_name}' for GDB '{gdb_base_name}'")
-                points_from_layer, updated_oid = populate_cgpoints_from_layer(
-                    gdb_path, 
-                    current_layer_name, 
-                    cgpoints_element, 
-                    master_oid_counter,
-                    current_timestamp_iso,
-                    landxml_ns,
-                    status_callback
-                )
-                gdb_total_points_added += points_from_layer
-                master_oid_counter = updated_oid
-            
-            if gdb_total_points_added > 0:
-                xml_filename = f"{gdb_base_name}_combined.xml"
-                xml_output_path = os.path.join(output_xml_dir_param, xml_filename)
-                try:
-                    xml_string_from_et = ET.tostring(root, encoding='utf-8', method='xml')
-                    dom = minidom.parseString(xml_string_from_et)
-                    pretty_xml_bytes = dom.toprettyxml(indent="  ", encoding='utf-8')
-                    
-                    lines = pretty_xml_bytes.splitlines(True)
-                    if lines and lines[0].startswith(b'<?xml'):
-                        lines[0] = b'<?xml version="1.0" encoding="UTF-8" standalone="no" ?>\n'
-                        final_xml_bytes = b"".join(lines)
-                    else:
-                        final_xml_bytes = b'<?xml version="1.0" encoding="UTF-8" standalone="no" ?>\n' + pretty_xml_bytes
-                        
-                    with open(xml_output_path, 'wb') as f:
-                        f.write(final_xml_bytes)
-                    status_callback(f"Successfully created combined XML: {xml_output_path} with {gdb_total_points_added} total points from GDB '{gdb_base_name}'.")
-                    processed_gdb_to_xml_count += 1
-                except Exception as e:
-                    status_callback(f"Error writing combined XML file {xml_output_path} for GDB '{gdb_base_name}': {e}")
-            else:
-                status_callback(f"No points were added from any layer in GDB '{gdb_base_name}'. Combined XML not created.")
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(gdb_paths_to_convert))
 
-            status_callback("-" * 40) 
+    processed_gdb_to_xml_count = 0
+    finished_gdb_count = 0
+    try:
+        if max_workers > 1:
+            status_callback(f"Converting {len(gdb_paths_to_convert)} GDB(s) with {max_workers} worker processes.")
+            jobs = [(gdb_path, output_xml_dir_param) for gdb_path in gdb_paths_to_convert]
+            if layer_workers != 1:
+                status_callback("Note: layers are read one by one inside each GDB worker process.")
+            worker = functools.partial(convert_gdb_to_landxml, extraction_filter=extraction_filter, vertex_tolerance=vertex_tolerance,
+                                       compression=compression, max_points_per_file=max_points_per_file,
+                                       max_bytes_per_file=max_bytes_per_file, profile=profile, cprofile=cprofile)
+            for (gdb_path, _), points_written, error in run_in_process_pool(worker, jobs, status_callback, max_workers,
+                                                                            progress_callback, cancel_event):
+                finished_gdb_count += 1
+                if error is not None:
+                    status_callback(f"Error: worker process failed while converting GDB {gdb_path}: {error}")
+                    emit_event(progress_callback, FILE_FINISHED, path=gdb_path, output_path=combined_xml_path(gdb_path, output_xml_dir_param, compression, split_output),
+                               status='failed', points_written=0, bytes_written=0, seconds=None,
+                               **{f"{stage}_seconds": None for stage in STAGES})
+                elif points_written > 0:
+                    processed_gdb_to_xml_count += 1
+                    record_conversion(gdb_path, points_written)
+        else:
+            for gdb_path in gdb_paths_to_convert:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                points_written = convert_gdb_to_landxml(gdb_path, output_xml_dir_param, status_callback, layer_workers,
+                                                        progress_callback, cancel_event, extraction_filter, vertex_tolerance,
+                                                        compression, max_points_per_file, max_bytes_per_file, profile, cprofile)
+                if points_written == 0 and cancel_event is not None and cancel_event.is_set():
+                    break # Abandoned part-way, not failed
+                finished_gdb_count += 1
+                if points_written > 0:
+                    processed_gdb_to_xml_count += 1
+                    record_conversion(gdb_path, points_written)
+    finally:
+        manifest.save()
+    cancelled = finished_gdb_count < len(gdb_paths_to_convert) and cancel_event is not None and cancel_event.is_set()
+    emit_event(progress_callback, RUN_FINISHED, converted=processed_gdb_to_xml_count, skipped=skipped_count,
+               failed=finished_gdb_count - processed_gdb_to_xml_count, cancelled=cancelled,
+               seconds=time.perf_counter() - run_start)
 
-    if not found_gdb_folders:
+    if cancelled:
+        status_callback(f"\nConversion cancelled. {processed_gdb_to_xml_count} combined XML file(s) created, "
+                        f"{len(gdb_paths_to_convert) - finished_gdb_count} GDB(s) not converted.")
+    elif not found_gdb_folders:
         status_callback(f"No GDB folders (ending with .gdb) found in '{input_gdb_dir_param}'.")
     elif processed_gdb_to_xml_count > 0:
         status_callback(f"\nFinished processing. {processed_gdb_to_xml_count} combined XML file(s) created and saved to '{output_xml_dir_param}'.")
-    else: 
+    elif skipped_count == 0: 
         status_callback(f"\nFinished processing. GDB folders might have been found, but no combined XML files were successfully created (e.g., no processable layers or points found).")
+    if skipped_count:
+        status_callback(f"{skipped_count} unchanged GDB(s) skipped (use --force to convert them again).")
     status_callback("Conversion process complete.")
 
 
 if __name__ == "__main__":
-    print("Running transform_opposite.py directly for testing...")
-    
     script_dir_main = os.path.dirname(os.path.abspath(__file__))
     default_input_gdb_dir = os.path.join(script_dir_main, "input_gdbs")
     default_output_xml_dir = os.path.join(script_dir_main, "output_xmls")
 
-    print(f"To test, you can call: run_conversion('{default_input_gdb_dir}', '{default_output_xml_dir}')")
-    print("Or, run the gdb_to_xml_gui.py script.")
+    parser = argparse.ArgumentParser(description="Convert every .gdb folder in a directory into a combined LandXML file.")
+    parser.add_argument("input_gdb_dir", nargs="?", default=default_input_gdb_dir,
+                        help=f"Directory containing GDB folders (default: {default_input_gdb_dir})")
+    parser.add_argument("output_xml_dir", nargs="?", default=default_output_xml_dir,
+                        help=f"Directory where XML files are written (default: {default_output_xml_dir})")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of GDBs to convert in parallel worker processes (0 = one per CPU core, default: 1)")
+    parser.add_argument("--layer-jobs", type=int, default=1,
+                        help="Number of layers of a GDB to read in parallel when GDBs are converted one at a time (0 = one per CPU core, default: 1)")
+    parser.add_argument("--force", action="store_true",
+                        help="Convert every GDB, including those unchanged since they were last converted")
+    parser.add_argument("--metrics-file",
+                        help="Append progress and metrics events to this file as JSON lines")
+    parser.add_argument("--bbox", type=float, nargs=4, metavar=("XMIN", "YMIN", "XMAX", "YMAX"),
+                        help="Only extract features intersecting this box (in the GDB's coordinate system)")
+    parser.add_argument("--layers", nargs="+", metavar="PATTERN",
+                        help="Only extract layers whose names match one of these patterns (e.g. 'Survey*', case-insensitive)")
+    parser.add_argument("--exclude-layers", nargs="+", metavar="PATTERN",
+                        help="Skip layers whose names match one of these patterns")
+    parser.add_argument("--where",
+                        help="Only extract features matching this OGR SQL attribute filter, e.g. \"code = 'TREE'\"")
+    parser.add_argument("--dedupe-vertices", type=float, nargs="?", const=DEFAULT_VERTEX_TOLERANCE, metavar="TOLERANCE",
+                        help="Write vertices shared by several features or layers once, merging points within "
+                             f"TOLERANCE of each other (default: {DEFAULT_VERTEX_TOLERANCE})")
+    parser.add_argument("--compress", choices=list(COMPRESSIONS),
+                        help="Write compressed .xml.gz (gzip) or .xml.zst (zstd, needs the zstandard package) files")
+    parser.add_argument("--max-points-per-file", type=int, metavar="N",
+                        help="Split each GDB's XML into numbered parts of at most N CgPoints, listed in <gdb>_combined_index.json")
+    parser.add_argument("--max-bytes-per-file", type=parse_byte_size, metavar="SIZE",
+                        help="Split each GDB's XML into numbered parts of at most SIZE bytes of XML, "
+                             "e.g. 500M or 2G (before compression)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Write the stage times and peak memory of every GDB to <gdb name>.gdb.profile.json in the output directory")
+    parser.add_argument("--cprofile", action="store_true",
+                        help="Also dump cProfile statistics of every GDB to <gdb name>.gdb.prof (implies --profile)")
+    args = parser.parse_args()
+    if args.dedupe_vertices is not None and args.dedupe_vertices < 0:
+        parser.error("--dedupe-vertices tolerance must not be negative")
+    if args.max_points_per_file is not None and args.max_points_per_file < 1:
+        parser.error("--max-points-per-file must be at least 1")
 
+    extraction_filter = None
+    if args.bbox or args.layers or args.exclude_layers or args.where:
+        try:
+            extraction_filter = ExtractionFilter(args.bbox, args.layers, args.exclude_layers, args.where)
+        except ValueError as e:
+            parser.error(str(e))
+
+    metrics_writer = JsonLinesMetricsWriter(args.metrics_file) if args.metrics_file else None
+    try:
+        run_conversion(args.input_gdb_dir, args.output_xml_dir, max_workers=args.jobs or None, layer_workers=args.layer_jobs or None,
+                       force=args.force, progress_callback=metrics_writer, extraction_filter=extraction_filter,
+                       vertex_tolerance=args.dedupe_vertices, compression=args.compress,
+                       max_points_per_file=args.max_points_per_file, max_bytes_per_file=args.max_bytes_per_file,
+                       profile=args.profile, cprofile=args.cprofile)
+    finally:
+        if metrics_writer is not None:
+            metrics_writer.close()
@@ -0,0 +1,392 @@
+import argparse
+import concurrent.futures
+import errno
+import json
+import os
+import threading
+import time
+from compressed_files import is_landxml_file, landxml_base_name
+from conversion_manifest import ConversionManifest, input_stat
+from output_formats import DEFAULT_OUTPUT_FORMAT
+from process_pool import WarmProcessPool
+from proj_lib_setup import import_fiona
+import transform
+import transform_opposite
+
+# --- Watch mode ---
+# Instead of one run over a directory, the watcher keeps converting whatever is dropped into
+# the input directory. An input is queued once it has stopped changing (same size and
+# modification time for settle_seconds), so files still being copied are left alone. The
+# queue is saved in the output directory and picked up again after a restart, and the
+# conversions run in worker processes that keep fiona/GDAL loaded between jobs.
+#
+# Changes are noticed through inotify when the optional inotify_simple package is installed
+# (Linux), otherwise by rescanning the input directory every poll_interval seconds. inotify
+# does not see changes made by other machines on a network share: use polling there.
+
+LANDXML_TO_GDB = 'landxml-to-gdb'
+GDB_TO_LANDXML = 'gdb-to-landxml'
+DIRECTIONS = (LANDXML_TO_GDB, GDB_TO_LANDXML)
+
+# Stored in the output directory next to the conversion manifest.
+QUEUE_FILENAME = ".watch_queue.json"
+
+DEFAULT_SETTLE_SECONDS = 3.0
+DEFAULT_POLL_INTERVAL = 2.0
+# How often settling inputs and running jobs are checked.
+TICK_SECONDS = 0.5
+# With inotify the whole input directory is still rescanned this often, in case events were
+# missed (e.g. the kernel's event queue overflowed).
+INOTIFY_RESCAN_INTERVAL = 60.0
+
+
+class PersistentJobQueue:
+    """
+    Input paths waiting to be converted, in order. The queue is written to a JSON file on
+    every change, so inputs queued (or being converted) when the watcher stopped are
+    converted when it starts again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._paths = []
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._paths = list(json.load(f).get('pending', []))
+        except (OSError, ValueError):
+            pass # Missing or unreadable queue file: start with an empty queue.
+
+    def __len__(self):
+        return len(self._paths)
+
+    def pending(self):
+        return list(self._paths)
+
+    def add(self, input_path):
+        if input_path not in self._paths:
+            self._paths.append(input_path)
+            self._save()
+
+    def remove(self, input_path):
+        if input_path in self._paths:
+            self._paths.remove(input_path)
+            self._save()
+
+    def _save(self):
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump({'pending': self._paths}, f, indent=1)
+        os.replace(temporary_path, self.path)
+
+def load_converter_libraries(direction):
+    """Worker process initializer: imports fiona/GDAL (and loads PROJ) once per worker."""
+    fiona = import_fiona(status_callback=lambda message: None)
+    fiona.crs.CRS.from_user_input('EPSG:28992')
+    if direction == GDB_TO_LANDXML:
+        transform_opposite._columnar_reader_available()
+
+def _convert_landxml(xml_path, gdb_path, layer_name, status_callback=print):
+    result = transform.convert_landxml_file(xml_path, gdb_path, layer_name, status_callback=status_callback)
+    return result['points_written'], result['error']
+
+def _convert_gdb(gdb_path, output_xml_dir, status_callback=print):
+    return transform_opposite.convert_gdb_to_landxml(gdb_path, output_xml_dir, status_callback), None
+
+def _open_inotify():
+    """Returns (inotify_simple module, INotify instance), or (None, None) if inotify is not available."""
+    try:
+        import inotify_simple
+        return inotify_simple, inotify_simple.INotify()
+    except (ImportError, OSError):
+        return None, None
+
+class FolderWatcher:
+    """
+    Watches an input directory and converts every input that appears or changes in it.
+
+    Inputs are LandXML files (.xml, .xml.gz, .xml.zst) anywhere under input_dir
+    (LANDXML_TO_GDB) or .gdb folders directly in it (GDB_TO_LANDXML), written to
+    output_dir as by run_batch / run_conversion. Inputs
+    the output directory's manifest records as converted and unchanged are not converted
+    again, so restarting the watcher only picks up what is new.
+    """
+
+    def __init__(self, direction, input_dir, output_dir, workers=1, layer_name="SurveyPoints",
+                 settle_seconds=DEFAULT_SETTLE_SECONDS, poll_interval=DEFAULT_POLL_INTERVAL, use_inotify=True,
+                 status_callback=print):
+        """
+        Args:
+            direction (str): LANDXML_TO_GDB or GDB_TO_LANDXML.
+            input_dir (str): Directory to watch.
+            output_dir (str): Directory where the converted files are written.
+            workers (int): Number of worker processes, i.e. inputs converted at the same time.
+            layer_name (str): Name of the point layer created in every GDB (LANDXML_TO_GDB).
+            settle_seconds (float): How long an input must stay unchanged before it is queued.
+            poll_interval (float): Seconds between rescans when polling.
+            use_inotify (bool): Use inotify when inotify_simple is installed; False always polls.
+            status_callback (function): Function to call for status updates.
+        """
+        if direction not in DIRECTIONS:
+            raise ValueError(f"Unknown direction {direction!r}, expected one of {DIRECTIONS}")
+        self.direction = direction
+        self.input_dir = os.path.abspath(input_dir)
+        self.output_dir = os.path.abspath(output_dir)
+        self.workers = max(1, workers)
+        self.layer_name = layer_name
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.status_callback = status_callback
+        if direction == LANDXML_TO_GDB:
+            # Watch mode writes the default format; the same settings as transform.run_batch's.
+            self.settings = {'converter': 'landxml_to_gdb', 'layer_name': layer_name, 'output_format': DEFAULT_OUTPUT_FORMAT}
+        else:
+            self.settings = {'converter': 'gdb_to_landxml'}
+        self._stop_event = threading.Event()
+        self._settling = {}   # input path -> [(size, mtime_ns), monotonic time it was first seen like that]
+        self._handled = {}    # input path -> (size, mtime_ns) when it was last queued or found up to date
+        self._running = {}    # Future -> (input path, output path, start time)
+        self._rerun = set()   # Running inputs that changed again and stay queued after their job
+        self._inotify = None
+        self._inotify_flags = 0
+
+    def stop(self):
+        """Makes run() return once the running conversions have finished (thread-safe)."""
+        self._stop_event.set()
+
+    def output_path(self, input_path):
+        if self.direction == LANDXML_TO_GDB:
+            xml_base_name = landxml_base_name(input_path)
+            return os.path.join(self.output_dir, f"{xml_base_name}.gdb")
+        return transform_opposite.combined_xml_path(input_path, self.output_dir)
+
+    def _job(self, input_path, output_path):
+        if self.direction == LANDXML_TO_GDB:
+            return _convert_landxml, (input_path, output_path, self.layer_name)
+        return _convert_gdb, (input_path, self.output_dir)
+
+    def _find_inputs(self):
+        """Returns the current inputs. Hidden names (temporary files of copy tools) are ignored."""
+        input_paths = []
+        if self.direction == LANDXML_TO_GDB:
+            for dir_path, dir_names, file_names in os.walk(self.input_dir):
+                dir_names[:] = [name for name in dir_names if not name.startswith('.')]
+                self._watch_directory(dir_path)
+                input_paths.extend(
+                    os.path.join(dir_path, file_name) for file_name in file_names
+                    if is_landxml_file(file_name) and not file_name.startswith('.')
+                )
+        else:
+            self._watch_directory(self.input_dir)
+            for entry in os.scandir(self.input_dir):
+                if entry.is_dir() and entry.name.lower().endswith(".gdb") and not entry.name.startswith('.'):
+                    self._watch_directory(entry.path)
+                    input_paths.append(entry.path)
+        return input_paths
+
+    def _watch_directory(self, dir_path):
+        if self._inotify is None:
+            return
+        try:
+            self._inotify.add_watch(dir_path, self._inotify_flags)
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                self.status_callback("inotify watch limit reached (fs.inotify.max_user_watches); polling instead.")
+                self._inotify.close()
+                self._inotify = None
+            # Otherwise the directory vanished during the scan.
+
+    def _observe(self, input_path, now):
+        """Checks one input; queues it once it has been unchanged for settle_seconds."""
+        try:
+            stat = input_stat(input_path)
+        except OSError:
+            return # Vanished or unreadable, checked again on the next scan
+        if self._handled.get(input_path) == stat:
+            self._settling.pop(input_path, None)
+            return
+        settling = self._settling.get(input_path)
+        if settling is None or settling[0] != stat or stat[0] == 0:
+            # New or still changing (an empty file or GDB folder is still being created).
+            self._settling[input_path] = [stat, now]
+            return
+        if now - settling[1] < self.settle_seconds:
+            return
+        del self._settling[input_path]
+        self._handled[input_path] = stat
+        if self._manifest.is_up_to_date(input_path, self.output_path(input_path), self.settings):
+            self._manifest.save()
+            return
+        if any(job[0] == input_path for job in self._running.values()):
+            self._rerun.add(input_path)
+        self._queue.add(input_path)
+        self.status_callback(f"Queued {input_path} ({len(self._queue)} waiting or running).")
+
+    def _scan(self):
+        now = time.monotonic()
+        try:
+            input_paths = self._find_inputs()
+        except OSError as e:
+            self.status_callback(f"Could not scan {self.input_dir}: {e}")
+            return
+        for input_path in input_paths:
+            self._observe(input_path, now)
+        # Inputs that disappeared are forgotten, so they are converted again if they return.
+        present = set(input_paths)
+        for known in (self._handled, self._settling):
+            for input_path in [path for path in known if path not in present]:
+                del known[input_path]
+
+    def _check_settling(self):
+        now = time.monotonic()
+        for input_path in list(self._settling):
+            self._observe(input_path, now)
+
+    def _start_jobs(self):
+        busy_inputs = {job[0] for job in self._running.values()}
+        busy_outputs = {job[1] for job in self._running.values()}
+        for input_path in self._queue.pending():
+            if len(self._running) >= self.workers:
+                return
+            output_path = self.output_path(input_path)
+            if input_path in busy_inputs or output_path in busy_outputs:
+                continue # Wait for the job writing the same output
+            if not os.path.exists(input_path):
+                self.status_callback(f"Dropping {input_path} from the queue: it no longer exists.")
+                self._queue.remove(input_path)
+                continue
+            worker, args = self._job(input_path, output_path)
+            future = self._pool.submit(worker, *args)
+            self._running[future] = (input_path, output_path, time.perf_counter())
+            busy_inputs.add(input_path)
+            busy_outputs.add(output_path)
+
+    def _collect_finished_jobs(self):
+        pool_broken = False
+        for future in [future for future in self._running if future.done()]:
+            input_path, output_path, start_time = self._running.pop(future)
+            try:
+                points_written, error = future.result()
+            except Exception as e:
+                points_written, error = 0, f"Worker process failed: {e}"
+                pool_broken = pool_broken or isinstance(e, concurrent.futures.process.BrokenProcessPool)
+            if input_path in self._rerun:
+                self._rerun.discard(input_path) # Changed while converting: stays queued
+            else:
+                self._queue.remove(input_path)
+            if error is None and points_written > 0:
+                try:
+                    self._manifest.record(input_path, output_path, self.settings, points_written)
+                    self._manifest.save()
+                except OSError:
+                    pass # Input vanished after conversion: it is simply converted again next time.
+                self.status_callback(f"Converted {input_path} -> {output_path}: {points_written} points "
+                                     f"in {time.perf_counter() - start_time:.1f} s.")
+            else:
+                self.status_callback(f"Could not convert {input_path}" + (f": {error}" if error else "."))
+        if pool_broken:
+            self.status_callback("A worker process died; restarting the worker processes.")
+            self._pool.close(wait=False)
+            self._pool = self._start_pool()
+
+    def _start_pool(self):
+        return WarmProcessPool(self.workers, self.status_callback, load_converter_libraries, (self.direction,))
+
+    def _wait(self, timeout):
+        """Waits up to timeout seconds; returns whether inotify reported changes."""
+        if self._inotify is None:
+            self._stop_event.wait(timeout)
+            return False
+        # Events that follow within 100 ms are read together, so a file being copied does
+        # not trigger a rescan per write.
+        return bool(self._inotify.read(timeout=int(timeout * 1000), read_delay=100))
+
+    def run(self):
+        """
+        Watches and converts until stop() is called or the process is interrupted (Ctrl+C).
+        Conversions already running are finished before it returns.
+        """
+        for directory in (self.input_dir, self.output_dir):
+            os.makedirs(directory, exist_ok=True)
+        self._manifest = ConversionManifest(self.output_dir)
+        self._queue = PersistentJobQueue(os.path.join(self.output_dir, QUEUE_FILENAME))
+        for input_path in self._queue.pending():
+            try:
+                self._handled[input_path] = input_stat(input_path)
+            except OSError:
+                pass
+        if len(self._queue):
+            self.status_callback(f"Resuming {len(self._queue)} queued input(s) from the previous run.")
+
+        if self.use_inotify:
+            inotify_simple, self._inotify = _open_inotify()
+            if self._inotify is not None:
+                flags = inotify_simple.flags
+                self._inotify_flags = (flags.CREATE | flags.MODIFY | flags.CLOSE_WRITE | flags.MOVED_TO |
+                                       flags.MOVED_FROM | flags.DELETE | flags.ATTRIB)
+        rescan_interval = self.poll_interval if self._inotify is None else INOTIFY_RESCAN_INTERVAL
+
+        self._pool = self._start_pool()
+        self.status_callback(f"Started {self.workers} worker process(es) with fiona/GDAL loaded.")
+        self.status_callback(f"Watching {self.input_dir} ({'inotify' if self._inotify is not None else 'polling'}); "
+                             f"writing to {self.output_dir}. Press Ctrl+C to stop.")
+        try:
+            try:
+                next_scan = 0.0
+                changed = False
+                while not self._stop_event.is_set():
+                    if changed or time.monotonic() >= next_scan:
+                        self._scan()
+                        next_scan = time.monotonic() + rescan_interval
+                    elif self._settling:
+                        self._check_settling()
+                    # Worker messages are drained first so they appear before the job's outcome.
+                    self._pool.drain()
+                    self._collect_finished_jobs()
+                    self._start_jobs()
+                    busy = self._running or self._settling
+                    changed = self._wait(TICK_SECONDS if busy else min(1.0, max(0.0, next_scan - time.monotonic())))
+            except KeyboardInterrupt:
+                self.status_callback(f"Stopping after {len(self._running)} running conversion(s)... "
+                                     "(press Ctrl+C again to stop without waiting)")
+            # Inputs still waiting stay in the saved queue for the next start.
+            while self._running:
+                self._wait(TICK_SECONDS)
+                self._pool.drain()
+                self._collect_finished_jobs()
+        finally:
+            # Running conversions are only abandoned on a second interrupt; their inputs
+            # are still queued.
+            self._pool.close(wait=not self._running)
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None
+        if len(self._queue):
+            self.status_callback(f"{len(self._queue)} queued input(s) are converted on the next start.")
+        self.status_callback("Watcher stopped.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch a directory and convert every LandXML file or GDB dropped into it.")
+    parser.add_argument("direction", choices=DIRECTIONS,
+                        help="landxml-to-gdb: .xml files (in any subdirectory) to GDBs; gdb-to-landxml: .gdb folders to combined XML")
+    parser.add_argument("input_dir", help="Directory to watch")
+    parser.add_argument("output_dir", help="Directory where the converted files are written")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of worker processes converting inputs in parallel (default: 1)")
+    parser.add_argument("--layer-name", default="SurveyPoints",
+                        help="Name of the point layer created in each GDB (default: SurveyPoints)")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help=f"Seconds an input must stay unchanged before it is converted (default: {DEFAULT_SETTLE_SECONDS:g})")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help=f"Seconds between rescans when polling (default: {DEFAULT_POLL_INTERVAL:g})")
+    parser.add_argument("--poll", action="store_true",
+                        help="Always poll, e.g. for network shares where inotify does not see other machines' changes")
+    args = parser.parse_args()
+
+    watcher = FolderWatcher(args.direction, args.input_dir, args.output_dir, workers=args.jobs, layer_name=args.layer_name,
+                            settle_seconds=args.settle, poll_interval=args.poll_interval, use_inotify=not args.poll)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass